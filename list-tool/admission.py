@@ -0,0 +1,349 @@
+"""重いエンドポイントの同時実行数の制限（アドミッション制御）
+
+エクスポート・集計・店舗検索をクラスに分け、クラスごとに同時実行数と待ち行列の長さを制限する。
+枠が空いていなければ待ち行列で ADMISSION_QUEUE_TIMEOUT_MS まで待ち、待ち行列も埋まっている
+（または待ち時間を超えた）場合はすぐに 429 と Retry-After を返す。
+全国のExcelエクスポートなどが接続プール（pool_size）を使い切り、/api/prefectures や /api/login の
+ような軽いリクエストまで待たされるのを防ぐためのもの。対象外のエンドポイントは制限しない。
+
+制限はプロセスごと（gunicornのワーカーごと）。クラスごとの上限の合計は、ワーカーあたりの
+接続プール（pool_size + max_overflow）より小さくして、軽いリクエスト用の接続を残すこと。
+状態は /api/metrics（list_tool_admission_*）で確認できる。
+
+集計・検索（CACHED_CLASSES）はレスポンスキャッシュ（response_cache.cached_json_response）を通るため、
+枠はキャッシュミスで実際に計算するとき（run_admitted）にだけ取る。キャッシュのヒット・304・
+実行中の同じ計算の結果を待つリクエスト（singleflight.py）は枠を使わない。計算を待ちきれずに
+自分で計算する場合は、リクエストの受け付けから数えた残りの待ち時間の範囲で枠を待つ。
+"""
+import asyncio
+import math
+import threading
+import time
+
+# クラス名 → 設定キーの接頭辞
+ADMISSION_CLASSES = {
+    'export': 'ADMISSION_EXPORT',
+    'stats': 'ADMISSION_STATS',
+    'search': 'ADMISSION_SEARCH',
+}
+
+# URLルール → クラス
+ENDPOINT_CLASSES = {
+    '/api/stats': 'stats',
+    '/api/categories': 'stats',
+    '/api/brands': 'stats',
+    '/api/stores/facets': 'stats',
+    '/api/stores': 'search',
+}
+
+# キャッシュミスで計算するときだけ枠を取るクラス（run_admitted）
+CACHED_CLASSES = ('stats', 'search')
+
+# URLルールの接頭辞 → クラス（/api/export/excel・csv・json など）
+PREFIX_CLASSES = (
+    ('/api/export/', 'export'),
+)
+
+_MAX_RETRY_AFTER = 60
+
+# acquire_async で空きを確かめる間隔（最初は短く、待つほど延ばす）
+_ASYNC_POLL_MIN_SECONDS = 0.005
+_ASYNC_POLL_MAX_SECONDS = 0.05
+
+
+def endpoint_class(rule):
+    """URLルールのクラス（制限しないエンドポイントならNone）"""
+    if rule is None:
+        return None
+    admission_class = ENDPOINT_CLASSES.get(rule)
+    if admission_class is not None:
+        return admission_class
+    for prefix, prefix_class in PREFIX_CLASSES:
+        if rule.startswith(prefix):
+            return prefix_class
+    return None
+
+
+class ConcurrencyLimiter:
+    """同時実行数 limit・待ち行列 queue_size のセマフォ（待ち時間の上限つき）"""
+
+    def __init__(self, name, limit, queue_size=0, queue_timeout=1.0):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0
+        self._hold_seconds = None  # 1件あたりの処理時間（指数移動平均）
+
+    def _enter(self, timeout):
+        """空きがあれば枠を取ってTrue、断るならFalse、待ち行列に入ったらNone（_condition を持って呼ぶ）"""
+        if self.active < self.limit and self.waiting == 0:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if self.waiting >= self.queue_size or timeout <= 0:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        self.queued += 1
+        return None
+
+    def acquire(self, timeout=None):
+        """枠を取れたらTrue。待ち行列が埋まっている・待ち時間を超えた場合はFalse
+
+        timeout を指定すると queue_timeout の代わりにその秒数まで待つ（0以下なら待たない）。
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._condition:
+            entered = self._enter(timeout)
+            if entered is not None:
+                return entered
+
+            started = time.perf_counter()
+            deadline = started + timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        return False
+                    self._condition.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+                return True
+            finally:
+                self.waiting -= 1
+                self.wait_seconds += time.perf_counter() - started
+
+    async def acquire_async(self, timeout=None):
+        """acquire の asyncio 版（イベントループを止めず、待つ間スレッドも使わない）
+
+        Flaskのスレッドと枠を共有するため、空きは間隔を延ばしながら確かめる。
+        枠は await を挟まずに取るので、待っている間にキャンセルされても枠は減らない。
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._condition:
+            entered = self._enter(timeout)
+        if entered is not None:
+            return entered
+
+        started = time.perf_counter()
+        deadline = started + timeout
+        delay = _ASYNC_POLL_MIN_SECONDS
+        try:
+            while True:
+                with self._condition:
+                    if self.active < self.limit:
+                        self.active += 1
+                        self.admitted += 1
+                        return True
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        return False
+                await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, _ASYNC_POLL_MAX_SECONDS)
+        finally:
+            with self._condition:
+                self.waiting -= 1
+                self.wait_seconds += time.perf_counter() - started
+
+    def release(self, held_seconds=None):
+        with self._condition:
+            self.active -= 1
+            if held_seconds is not None:
+                self._hold_seconds = held_seconds if self._hold_seconds is None \
+                    else self._hold_seconds * 0.8 + held_seconds * 0.2
+            self._condition.notify()
+
+    def retry_after(self):
+        """Retry-After の秒数（処理時間の平均と待ちの数からの目安。1〜60秒）"""
+        with self._condition:
+            hold = self._hold_seconds or 1.0
+            estimate = hold * (self.waiting + 1) / max(self.limit, 1)
+        return max(1, min(_MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def stats(self):
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'active': self.active,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'wait_seconds': round(self.wait_seconds, 3),
+            }
+
+
+def create_limiters(get):
+    """設定からクラスごとの ConcurrencyLimiter を作る（同時実行数が0以下のクラスは制限しない）
+
+    get(キー, 既定値) で設定値を返す関数を渡す（app.config.get など）。
+    """
+    queue_timeout = get('ADMISSION_QUEUE_TIMEOUT_MS', 1000) / 1000
+    limiters = {}
+    for name, prefix in ADMISSION_CLASSES.items():
+        limit = get(f'{prefix}_CONCURRENCY', 0)
+        if limit and limit > 0:
+            limiters[name] = ConcurrencyLimiter(name, limit, get(f'{prefix}_QUEUE', 0), queue_timeout)
+    return limiters
+
+
+def _metric_samples(limiters):
+    stats = {name: limiter.stats() for name, limiter in limiters.items()}
+
+    def per_class(key):
+        return [((('class', name),), values[key]) for name, values in stats.items()]
+
+    return [
+        ('admission_limit', 'gauge', '同時実行数の上限', per_class('limit')),
+        ('admission_active', 'gauge', '実行中のリクエスト数', per_class('active')),
+        ('admission_waiting', 'gauge', '待ち行列のリクエスト数', per_class('waiting')),
+        ('admission_requests_total', 'counter', '受け付け・待ち・429（待ち行列が満杯 / 待ち時間切れ）の件数', [
+            ((('class', name), ('result', result)), values[key])
+            for name, values in stats.items()
+            for result, key in (('admitted', 'admitted'), ('queued', 'queued'),
+                                ('rejected', 'rejected'), ('timed_out', 'timed_out'))
+        ]),
+        ('admission_wait_seconds_total', 'counter', '待ち行列で待った時間の合計', per_class('wait_seconds')),
+    ]
+
+
+class AdmissionRejected(Exception):
+    """枠を取れなかった（run_admitted から。429で応える）"""
+
+    def __init__(self, limiter):
+        super().__init__(f"{limiter.name}: 同時実行数の上限に達しました")
+        self.limiter = limiter
+
+
+def rejection_payload(limiter):
+    """429 のレスポンスの内容と Retry-After の秒数"""
+    retry_after = limiter.retry_after()
+    return {
+        "error": "サーバーが混雑しています。しばらくしてから再度お試しください",
+        "retry_after": retry_after,
+    }, retry_after
+
+
+# ---------------------------------------------------------------------------
+# Flask
+# ---------------------------------------------------------------------------
+
+def init_admission(app):
+    """対象エンドポイントの同時実行数の制限を登録する（ADMISSION_ENABLED=False なら何もしない）
+
+    429 も計測されるよう、性能計測（metrics.py）より後に呼ぶこと。
+    """
+    if not app.config.get('ADMISSION_ENABLED', True):
+        return None
+    limiters = create_limiters(app.config.get)
+    app.extensions['admission'] = limiters
+    if not limiters:
+        return None
+
+    from flask import g, request
+
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.add_collector(lambda: _metric_samples(limiters))
+
+    @app.before_request
+    def admit_request():
+        rule = request.url_rule.rule if request.url_rule is not None else None
+        limiter = limiters.get(endpoint_class(rule))
+        if limiter is None:
+            return None
+        if limiter.name in CACHED_CLASSES:
+            # 枠は計算するときに取る（run_admitted）
+            g.list_tool_admission_pending = (limiter, time.perf_counter())
+            return None
+        if not limiter.acquire():
+            return rejection_response(limiter)
+        g.list_tool_admission = (limiter, time.perf_counter())
+        return None
+
+    @app.after_request
+    def release_after_response(response):
+        slot = g.pop('list_tool_admission', None)
+        if slot is None:
+            return response
+        limiter, started = slot
+
+        def release():
+            limiter.release(time.perf_counter() - started)
+
+        if response.is_streamed:
+            # エクスポートは送信し終わるまで枠を使う
+            response.call_on_close(release)
+        else:
+            release()
+        return response
+
+    @app.teardown_request
+    def release_on_error(exc):
+        g.pop('list_tool_admission_pending', None)
+        # after_request まで到達しなかった場合
+        slot = g.pop('list_tool_admission', None)
+        if slot is not None:
+            slot[0].release()
+
+    return limiters
+
+
+def rejection_response(limiter):
+    """429 Too Many Requests（Retry-After 付き）"""
+    from flask import jsonify
+
+    payload, retry_after = rejection_payload(limiter)
+    response = jsonify(payload)
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def run_admitted(compute, pending=None):
+    """compute() を枠を取ってから実行する（CACHED_CLASSES のリクエストでなければそのまま実行する）
+
+    pending は (ConcurrencyLimiter, リクエストを受け付けた時刻)。省略するとFlaskのリクエストのものを使う。
+    待ち時間は受け付けからの残り（ADMISSION_QUEUE_TIMEOUT_MS の残り）。枠を取れなければ AdmissionRejected。
+    """
+    if pending is None:
+        from flask import g, has_request_context
+
+        pending = g.get('list_tool_admission_pending') if has_request_context() else None
+    if pending is None:
+        return compute()
+    limiter, accepted_at = pending
+    if not limiter.acquire(timeout=limiter.queue_timeout - (time.perf_counter() - accepted_at)):
+        raise AdmissionRejected(limiter)
+    started = time.perf_counter()
+    try:
+        return compute()
+    finally:
+        limiter.release(time.perf_counter() - started)
+
+
+async def run_admitted_async(compute, pending):
+    """run_admitted の asyncio 版（compute はコルーチン関数）"""
+    if pending is None:
+        return await compute()
+    limiter, accepted_at = pending
+    timeout = limiter.queue_timeout - (time.perf_counter() - accepted_at)
+    if not await limiter.acquire_async(timeout):
+        raise AdmissionRejected(limiter)
+    started = time.perf_counter()
+    try:
+        return await compute()
+    finally:
+        limiter.release(time.perf_counter() - started)
@@ -1,6 +1,6 @@
 """Flaskアプリケーションファクトリ"""
 from flask import Flask, send_from_directory, jsonify, request
-from extensions import db, migrate
+from extensions import db, init_migrate
 from config import config as config_dict
 import os
 import io
@@ -28,17 +28,62 @@ def create_app(config_name='default'):
     
     # 拡張機能を初期化
     db.init_app(app)
-    migrate.init_app(app, db)
+    init_migrate(app)
     
     # データベーステーブルを自動作成（初回のみ）
     with app.app_context():
         try:
+            import models  # noqa: F401  モデルを登録してからcreate_allする
             db.create_all()
+            from brands import ensure_brand_key_column
+            ensure_brand_key_column(db.engine)
+            # ETag/Last-Modified・レスポンスキャッシュ用の世代番号
+            from data_version import initialize
+            with db.engine.begin() as conn:
+                initialize(conn)
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
             logger.warning(f"データベーステーブル作成をスキップ: {e}")
     
+    # レスポンスキャッシュ（stores_versionをキーに含める）
+    from response_cache import init_response_cache
+    init_response_cache(app)
+    
+    # 性能計測（/api/metrics・Server-Timing）。圧縮後のサイズを記録するため圧縮より先に登録する
+    from metrics import init_metrics
+    init_metrics(app)
+    
+    # エクスポート・集計・検索の同時実行数の制限（超えたら429 + Retry-After）。429も計測されるよう計測の後に登録する
+    from admission import init_admission
+    init_admission(app)
+    
+    # 同じキーの計算（stats・categories・cities・facetsなど）の同時実行をまとめる（SINGLE_FLIGHT_REDIS=1 でワーカー間も）
+    from singleflight import init_single_flight
+    init_single_flight(app)
+    
+    # 集計用の列指向スナップショット（STORE_SNAPSHOT_ENABLED=1 のとき。stats・facets・categories・brands）
+    from store_snapshot import init_store_snapshot
+    init_store_snapshot(app)
+    
+    # 遅いクエリの記録（実行計画付き）と /api/admin/slow-queries
+    from slow_query import init_slow_query_log
+    init_slow_query_log(app)
+    
+    # 開発・テスト環境のみ: X-Profile ヘッダーでリクエストをプロファイル（/api/dev/profiles）
+    from profiling import init_profiling
+    init_profiling(app)
+    
+    # バックグラウンドのエクスポートジョブ（/api/export-jobs: 作成・進捗・Range対応のダウンロード）
+    from export_jobs import init_export_jobs
+    init_export_jobs(app)
+    
+    # レスポンス圧縮・ビルド済み静的ファイル
+    from compression import init_compression
+    from assets import init_assets
+    init_compression(app)
+    init_assets(app)
+    
     # ルートを登録
     register_routes(app)
     
@@ -48,64 +93,54 @@ def create_app(config_name='default'):
         from models import Store, User
         return {'db': db, 'Store': Store, 'User': User}
     
-    # Celeryを初期化（Redisが利用可能な場合のみ）
-    try:
-        from tasks import make_celery
-        celery_app = make_celery(app)
-        
-        # Celeryタスクを登録
-        from tasks import register_tasks, register_enrichment_tasks
-        register_tasks(celery_app)
-        register_enrichment_tasks(celery_app)
-    except Exception as e:
-        # Redisが利用できない場合はCeleryを無効化
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.warning(f"Celeryの初期化をスキップしました: {e}")
+    # Celeryは最初に必要になった時点で初期化する（tasks.get_celery）
+    # Redisがない環境でもサーバー起動やワーカーのforkが遅くならないようにするため
     
     return app
 
 
 def register_routes(app):
     """ルートを登録"""
+    from assets import send_page
+    
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     
-    # Webルート
+    # Webルート（build_assets.py でビルド済みなら事前圧縮版を配信）
     @app.route("/")
     def root():
-        return send_from_directory(BASE_DIR, "list-tool.html")
+        return send_page("list-tool.html")
     
     @app.route("/list-tool")
     def list_tool():
-        return send_from_directory(BASE_DIR, "list-tool.html")
+        return send_page("list-tool.html")
     
     @app.route("/login")
     def login():
-        return send_from_directory(BASE_DIR, "login.html")
+        return send_page("login.html")
     
     @app.route("/dashboard")
     def dashboard():
-        return send_from_directory(BASE_DIR, "dashboard.html")
+        return send_page("dashboard.html")
     
     @app.route("/admin-dashboard")
     def admin_dashboard():
-        return send_from_directory(BASE_DIR, "admin-dashboard.html")
+        return send_page("admin-dashboard.html")
     
     @app.route("/products")
     def products():
-        return send_from_directory(BASE_DIR, "products.html")
+        return send_page("products.html")
     
     @app.route("/account-management")
     def account_management():
-        return send_from_directory(BASE_DIR, "account-management.html")
+        return send_page("account-management.html")
     
     @app.route("/barius.html")
     def barius():
-        return send_from_directory(BASE_DIR, "barius.html")
+        return send_page("barius.html")
     
     @app.route("/barius")
     def barius_short():
-        return send_from_directory(BASE_DIR, "barius.html")
+        return send_page("barius.html")
     
     # 静的ファイル（画像）の配信
     @app.route("/<path:filename>")
@@ -123,22 +158,31 @@ def register_routes(app):
     def health():
         return jsonify({"status": "ok"})
     
+    @app.route("/api/cache/stats")
+    def get_cache_stats():
+        """レスポンスキャッシュのヒット率などを返すAPI（チューニング用）"""
+        try:
+            from data_version import get_version
+            
+            cache = app.extensions.get('response_cache')
+            single_flight = app.extensions.get('single_flight')
+            snapshot = app.extensions.get('store_snapshot')
+            return jsonify({
+                "stores_version": get_version(db.session),
+                "cache": cache.stats() if cache is not None else None,
+                "single_flight": single_flight.stats() if single_flight is not None else None,
+                "store_snapshot": snapshot.stats() if snapshot is not None else None,
+            })
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
     @app.route("/api/areas")
     def get_areas():
         """エリアリスト取得API"""
         try:
-            AREAS = ["北海道", "東北", "関東", "中部", "近畿", "中国", "四国", "九州"]
-            AREA_PREFECTURES = {
-                "北海道": ["北海道"],
-                "東北": ["青森", "岩手", "宮城", "秋田", "山形", "福島"],
-                "関東": ["茨城", "栃木", "群馬", "埼玉", "千葉", "東京", "神奈川"],
-                "中部": ["新潟", "富山", "石川", "福井", "山梨", "長野", "岐阜", "静岡", "愛知"],
-                "近畿": ["三重", "滋賀", "京都", "大阪", "兵庫", "奈良", "和歌山"],
-                "中国": ["鳥取", "島根", "岡山", "広島", "山口"],
-                "四国": ["徳島", "香川", "愛媛", "高知"],
-                "九州": ["福岡", "佐賀", "長崎", "熊本", "大分", "宮崎", "鹿児島", "沖縄"]
-            }
-            return jsonify({
+            from regions import AREAS, AREA_PREFECTURES
+            from response_cache import static_json_response
+            return static_json_response({
                 "areas": AREAS,
                 "area_prefectures": AREA_PREFECTURES
             })
@@ -149,52 +193,40 @@ def register_routes(app):
     def get_prefectures():
         """都道府県リスト取得API"""
         try:
-            PREFECTURES = [
-                "北海道", "青森", "岩手", "宮城", "秋田", "山形", "福島",
-                "茨城", "栃木", "群馬", "埼玉", "千葉", "東京", "神奈川",
-                "新潟", "富山", "石川", "福井", "山梨", "長野", "岐阜", "静岡", "愛知",
-                "三重", "滋賀", "京都", "大阪", "兵庫", "奈良", "和歌山",
-                "鳥取", "島根", "岡山", "広島", "山口",
-                "徳島", "香川", "愛媛", "高知",
-                "福岡", "佐賀", "長崎", "熊本", "大分", "宮崎", "鹿児島", "沖縄"
-            ]
-            return jsonify({"prefectures": PREFECTURES})
+            from regions import PREFECTURES
+            from response_cache import static_json_response
+            return static_json_response({"prefectures": PREFECTURES})
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route("/api/cities")
     def get_cities():
-        """指定した都道府県に属する市区町村リスト取得API"""
+        """指定した都道府県に属する市区町村リスト取得API
+
+        prefecture（または prefectures）は複数指定可。cities に和集合、by_prefecture に都道府県ごとの
+        一覧を返す。指定がなければ全市区町村と全都道府県分の一覧を返す。
+        """
         try:
-            from models import Store
-            from sqlalchemy import func
             from sqlalchemy.exc import OperationalError
+            from city_index import lookup_cities
+            from response_cache import cached_json_response
 
-            prefecture = request.args.get("prefecture", "").strip()
-
-            try:
-                query = db.session.query(Store.city).filter(
-                    Store.city.isnot(None),
-                    Store.city != ""
-                )
-
-                # 住所の先頭に都道府県名が含まれている前提でフィルタ
-                if prefecture:
-                    query = query.filter(
-                        Store.address.isnot(None),
-                        Store.address != "",
-                        Store.address.like(f"{prefecture}%"),
-                    )
+            prefectures = sorted({
+                p.strip()
+                for p in request.args.getlist("prefecture") + request.args.getlist("prefectures")
+                if p.strip()
+            })
 
-                cities_rows = query.distinct().all()
-                cities = sorted({row[0] for row in cities_rows if row[0]})
+            def build():
+                try:
+                    return lookup_cities(db.session, prefectures)
+                except OperationalError as e:
+                    # テーブル未作成時は空リストを返す
+                    if "no such table" in str(e).lower():
+                        return {"cities": [], "by_prefecture": {p: [] for p in prefectures}}
+                    raise
 
-                return jsonify({"cities": cities})
-            except OperationalError as e:
-                # テーブル未作成時は空リストを返す
-                if "no such table" in str(e).lower():
-                    return jsonify({"cities": []})
-                raise
+            return cached_json_response("cities", "|".join(prefectures), build)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
@@ -202,481 +234,194 @@ def register_routes(app):
     def get_categories():
         """カテゴリリスト取得API（データベースから実際の値を取得し、純粋なカテゴリー名のみを抽出）"""
         try:
-            from models import Store
             from sqlalchemy.exc import OperationalError
-            import re
-            
-            def extract_category_names(category_value):
-                """カテゴリー値から純粋なカテゴリー名を抽出
-                例: 'あざみ野駅 100m / ドーナツ' -> ['ドーナツ']
-                例: 'あびこ駅 313m / カフェ、スイーツ' -> ['カフェ', 'スイーツ']
-                """
-                if not category_value:
-                    return []
-                
-                # 「/」で分割して、最後の部分（カテゴリー名部分）を取得
-                if '/' in category_value:
-                    parts = category_value.split('/')
-                    category_part = parts[-1].strip()
-                else:
-                    category_part = category_value.strip()
-                
-                # カンマ区切りのカテゴリーを分割
-                categories = [cat.strip() for cat in category_part.split('、') if cat.strip()]
-                
-                # さらにカンマでも分割（「カフェ, スイーツ」形式に対応）
-                result = []
-                for cat in categories:
-                    result.extend([c.strip() for c in cat.split(',') if c.strip()])
-                
-                return result
+            from response_cache import cached_json_response
+            from store_queries import categories_response, categories_statement
+            from store_snapshot import get_snapshot
             
-            try:
-                # データベースから実際のカテゴリー値を取得
-                categories_query = db.session.query(Store.category).distinct().filter(
-                    Store.category.isnot(None),
-                    Store.category != ""
-                ).order_by(Store.category)
-                
-                # すべてのカテゴリー値を取得
-                all_category_values = [row[0] for row in categories_query.all() if row[0]]
-                
-                # 各カテゴリー値から純粋なカテゴリー名を抽出
-                extracted_categories = set()
-                for category_value in all_category_values:
-                    category_names = extract_category_names(category_value)
-                    extracted_categories.update(category_names)
-                
-                # ソートしてリストに変換
-                categories_list = sorted(extracted_categories)
-                
-                return jsonify({
-                    "categories": categories_list,
-                    "category_groups": {}  # グループ化は不要なので空オブジェクト
-                })
-            except OperationalError as e:
-                # テーブル未作成時は空リストを返す
-                if "no such table" in str(e).lower():
-                    return jsonify({
-                        "categories": [],
-                        "category_groups": {}
-                    })
-                raise
+            def build():
+                try:
+                    snapshot = get_snapshot(db.session)
+                    if snapshot is not None:
+                        return snapshot.categories()
+                    category_values = db.session.execute(categories_statement()).scalars().all()
+                    return categories_response(category_values)
+                except OperationalError as e:
+                    # テーブル未作成時は空リストを返す
+                    if "no such table" in str(e).lower():
+                        return categories_response([])
+                    raise
+
+            return cached_json_response("categories", "", build)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
-    @app.route("/api/stats")
-    def get_stats():
-        """統計情報取得API"""
+    @app.route("/api/brands")
+    def get_brands():
+        """チェーン（ブランド）別の店舗数・都道府県集計API"""
         try:
             from models import Store
-            from sqlalchemy import func, and_, or_
+            from sqlalchemy import func, or_
             from sqlalchemy.exc import OperationalError
-            
-            # テーブルが存在するか確認
-            latest_update_str = None
-            try:
-                # 全店舗数
-                total_stores = db.session.query(func.count(func.distinct(Store.store_id))).scalar() or 0
-                
-                # 最終更新日時を取得（最も新しいupdated_at）
-                latest_update = db.session.query(func.max(Store.updated_at)).scalar()
-                if latest_update:
-                    latest_update_str = latest_update.isoformat()
-            except OperationalError as e:
-                # エラー時もlatest_update_strはNoneのまま
-                # テーブルが存在しない場合は0を返す
-                if 'no such table' in str(e).lower():
-                    return jsonify({
-                        'total_stores': 0,
-                        'total_with_opening': 0,
-                        'with_opening_date_count': 0,
-                        'remaining': 0,
-                        'completed': 0,
-                        'completion_rate': 0,
-                        'with_phone': 0,
-                        'with_website': 0,
-                        'fully_completed': 0,
-                        'fully_completed_with_opening': 0,
-                        'latest_update': None,
-                    })
-                raise
-                
-            # 開店日ありの店舗数
-            total_with_opening = db.session.query(
-                func.count(func.distinct(Store.store_id))
-            ).filter(Store.opening_date.isnot(None)).scalar() or 0
+            from regions import prefecture_of
+            from response_cache import cached_json_response
+            from store_snapshot import get_snapshot
 
-            # 補完が必要な件数
-            remaining = db.session.query(func.count(func.distinct(Store.store_id))).filter(
-                and_(
-                    Store.opening_date.isnot(None),
-                    Store.url.isnot(None),
-                    Store.url != "",
-                    or_(
-                        Store.phone.is_(None),
-                        Store.phone == "",
-                        Store.closed_day.is_(None),
-                        Store.closed_day == "",
-                        Store.business_hours.is_(None),
-                        Store.business_hours == "",
-                        Store.transport.is_(None),
-                        Store.transport == "",
-                        Store.official_account.is_(None),
-                        Store.official_account == "",
-                    ),
-                )
-            ).scalar() or 0
+            q = request.args.get("q", "").strip()
+            prefectures = request.args.getlist("prefectures")
+            min_stores = int(request.args.get("min_stores", 2))
+            limit = int(request.args.get("limit", 100))
 
-            # 補完完了件数
-            completed = total_with_opening - remaining if total_with_opening > 0 else 0
-            completion_rate = (completed / total_with_opening * 100) if total_with_opening > 0 else 0
+            def build():
+                try:
+                    snapshot = get_snapshot(db.session)
+                    result = snapshot.brands(q, prefectures, min_stores, limit) if snapshot is not None else None
+                    if result is not None:
+                        return result
 
-            # 電話番号あり
-            with_phone = db.session.query(func.count(func.distinct(Store.store_id))).filter(
-                Store.phone.isnot(None),
-                Store.phone != "",
-            ).scalar() or 0
+                    # brand_keyのインデックスで絞り込み、住所の先頭4文字（都道府県名＋α）ごとに集計
+                    address_head = func.substr(Store.address, 1, 4)
+                    query = db.session.query(
+                        Store.brand_key, address_head, func.count(Store.store_id)
+                    ).filter(Store.brand_key.isnot(None))
 
-            # ウェブサイトあり
-            with_website = db.session.query(func.count(func.distinct(Store.store_id))).filter(
-                Store.website.isnot(None),
-                Store.website != "",
-            ).scalar() or 0
+                    if q:
+                        query = query.filter(Store.brand_key.like(f"{q}%"))
 
-            # 全項目完了
-            fully_completed = db.session.query(func.count(func.distinct(Store.store_id))).filter(
-                and_(
-                    Store.opening_date.isnot(None),
-                    Store.phone.isnot(None),
-                    Store.phone != "",
-                    Store.closed_day.isnot(None),
-                    Store.closed_day != "",
-                    Store.business_hours.isnot(None),
-                    Store.business_hours != "",
-                    Store.transport.isnot(None),
-                    Store.transport != "",
-                )
-            ).scalar() or 0
+                    if prefectures:
+                        query = query.filter(or_(*[Store.address.like(f"{pref}%") for pref in prefectures]))
 
-            # 都市数（重複除く）
-            cities_count = db.session.query(func.count(func.distinct(Store.city))).filter(
-                Store.city.isnot(None),
-                Store.city != "",
-            ).scalar() or 0
+                    rows = query.group_by(Store.brand_key, address_head).all()
+                except OperationalError as e:
+                    if "no such table" in str(e).lower() or "no such column" in str(e).lower():
+                        return {"brands": [], "total": 0}
+                    raise
 
-            # 都道府県・エリア別統計用の定義（先に定義が必要）
-            PREFECTURES = [
-                "北海道",
-                "青森",
-                "岩手",
-                "宮城",
-                "秋田",
-                "山形",
-                "福島",
-                "茨城",
-                "栃木",
-                "群馬",
-                "埼玉",
-                "千葉",
-                "東京",
-                "神奈川",
-                "新潟",
-                "富山",
-                "石川",
-                "福井",
-                "山梨",
-                "長野",
-                "岐阜",
-                "静岡",
-                "愛知",
-                "三重",
-                "滋賀",
-                "京都",
-                "大阪",
-                "兵庫",
-                "奈良",
-                "和歌山",
-                "鳥取",
-                "島根",
-                "岡山",
-                "広島",
-                "山口",
-                "徳島",
-                "香川",
-                "愛媛",
-                "高知",
-                "福岡",
-                "佐賀",
-                "長崎",
-                "熊本",
-                "大分",
-                "宮崎",
-                "鹿児島",
-                "沖縄",
-            ]
-            
-            # 市区町村別店舗数（上位20市区町村）
-            # 住所から市区町村を抽出して集計
-            import re
-            
-            def extract_city_from_address(address):
-                """住所から市区町村を抽出"""
-                if not address:
-                    return None
-                
-                addr = address
-                # 都道府県名を除去
-                for pref in PREFECTURES:
-                    if addr.startswith(pref):
-                        addr = addr[len(pref):].lstrip('都府県')
-                        break
-                
-                # 駅名と距離情報を除去（例: "池袋駅 396m"）
-                addr = re.sub(r'[^都府県市区町村]*駅\s*\d+m\s*/?', '', addr)
-                
-                # カテゴリー情報を除去（例: "/ カテゴリー"）
-                addr = re.sub(r'/\s*[^/]+$', '', addr)
-                
-                # 市区町村パターンを抽出
-                # パターン1: "XX区", "XX市", "XX町", "XX村"（都道府県名の後）
-                match = re.search(r'([^都府県市区町村]+[市区町村])', addr)
-                if match:
-                    city = match.group(1).strip()
-                    # 余分な文字を除去
-                    city = re.sub(r'^\s*[、,]\s*', '', city)
-                    if city and len(city) > 1 and not city.startswith('駅'):
-                        return city
-                
-                # パターン2: "XX郡XX町", "XX郡XX村"
-                match = re.search(r'([^都府県市区町村]+郡[^市区町村]+[町村])', addr)
-                if match:
-                    city = match.group(1).strip()
-                    if city and len(city) > 1:
-                        return city
-                
-                return None
-            
-            # 住所から市区町村を抽出して集計
-            address_rows = db.session.query(Store.address, Store.city).filter(
-                Store.address.isnot(None),
-                Store.address != "",
-            ).all()
-            
-            city_stats = {}
-            for addr, orig_city in address_rows:
-                # まず住所から市区町村を抽出
-                extracted_city = extract_city_from_address(addr)
-                
-                # 抽出できなかった場合は、元のcityフィールドを使用
-                # ただし、都道府県名の場合は除外
-                if not extracted_city:
-                    if orig_city and orig_city not in PREFECTURES:
-                        extracted_city = orig_city
-                    else:
-                        continue
-                
-                if extracted_city:
-                    city_stats[extracted_city] = city_stats.get(extracted_city, 0) + 1
-            
-            # 店舗数の降順でソートして上位20を取得
-            city_stats = dict(sorted(city_stats.items(), key=lambda x: x[1], reverse=True)[:20])
+                brands = {}
+                for brand_key, head, count in rows:
+                    brand = brands.setdefault(brand_key, {"brand": brand_key, "store_count": 0, "prefectures": {}})
+                    brand["store_count"] += count
+                    pref = prefecture_of(head)
+                    if pref:
+                        brand["prefectures"][pref] = brand["prefectures"].get(pref, 0) + count
 
-            # 都道府県・エリア別統計用の定義（既に上で定義済み）
+                results = [b for b in brands.values() if b["store_count"] >= min_stores]
+                results.sort(key=lambda b: (-b["store_count"], b["brand"]))
 
-            AREA_PREFECTURES = {
-                "北海道": ["北海道"],
-                "東北": ["青森", "岩手", "宮城", "秋田", "山形", "福島"],
-                "関東": ["茨城", "栃木", "群馬", "埼玉", "千葉", "東京", "神奈川"],
-                "中部": ["新潟", "富山", "石川", "福井", "山梨", "長野", "岐阜", "静岡", "愛知"],
-                "近畿": ["三重", "滋賀", "京都", "大阪", "兵庫", "奈良", "和歌山"],
-                "中国": ["鳥取", "島根", "岡山", "広島", "山口"],
-                "四国": ["徳島", "香川", "愛媛", "高知"],
-                "九州": ["福岡", "佐賀", "長崎", "熊本", "大分", "宮崎", "鹿児島", "沖縄"],
-            }
+                return {"brands": results[:limit], "total": len(results)}
 
-            # 都道府県を判定して集計（住所と都市名の両方をチェック）
-            prefecture_stats = {p: 0 for p in PREFECTURES}
-            
-            # 都市名から都道府県へのマッピング
-            CITY_TO_PREFECTURE = {
-                "東京": "東京",
-                "神奈川": "神奈川",
-                "千葉": "千葉",
-                "埼玉": "埼玉",
-                "大阪": "大阪",
-                "神戸": "兵庫",
-                "京都": "京都",
-                "横浜": "神奈川",
-                "川崎": "神奈川",
-                "相模原": "神奈川",
-                "さいたま": "埼玉",
-                "川口": "埼玉",
-                "船橋": "千葉",
-                "市川": "千葉",
-                "松山": "愛媛",
-                "高知": "高知",
-                "福島": "福島",
-                "金沢": "石川",
-                "宮崎": "宮崎",
-                "鳥取": "鳥取",
-            }
-            
-            # 店舗データを取得（住所と都市名の両方を使用）
-            store_rows = db.session.query(Store.address, Store.city).filter(
-                db.or_(
-                    Store.address.isnot(None),
-                    Store.city.isnot(None)
-                ),
-                db.or_(
-                    Store.address != "",
-                    Store.city != ""
-                )
-            ).all()
+            key = f"{q}|{','.join(sorted(set(prefectures)))}|{min_stores}|{limit}"
+            return cached_json_response("brands", key, build)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/stats")
+    def get_stats():
+        """統計情報取得API"""
+        try:
+            from sqlalchemy.exc import OperationalError
+            from response_cache import cached_json_response
+            from store_queries import EMPTY_STATS, stats_location_statement, stats_response, stats_scalar_statements
+            from store_snapshot import get_snapshot
             
-            for addr, city in store_rows:
-                matched = False
-                
-                # まず都市名から都道府県を判定
-                if city:
-                    # 都市名が都道府県名と一致する場合
-                    if city in PREFECTURES:
-                        prefecture_stats[city] += 1
-                        matched = True
-                    # 都市名から都道府県をマッピング
-                    elif city in CITY_TO_PREFECTURE:
-                        pref = CITY_TO_PREFECTURE[city]
-                        prefecture_stats[pref] += 1
-                        matched = True
-                
-                # 都市名でマッチしなかった場合、住所から判定
-                if not matched and addr:
-                    for pref in PREFECTURES:
-                        if addr.startswith(pref):
-                            prefecture_stats[pref] += 1
-                            break
-
-            # エリア別に集計
-            area_stats = {}
-            for area, prefs in AREA_PREFECTURES.items():
-                area_stats[area] = sum(prefecture_stats.get(p, 0) for p in prefs)
+            def build():
+                try:
+                    snapshot = get_snapshot(db.session)
+                    if snapshot is not None:
+                        return snapshot.stats()
+                    scalars = {
+                        name: db.session.execute(stmt).scalar()
+                        for name, stmt in stats_scalar_statements().items()
+                    }
+                except OperationalError as e:
+                    # テーブルが存在しない場合は0を返す
+                    if 'no such table' in str(e).lower():
+                        return EMPTY_STATS
+                    raise
 
-            # 取得率
-            phone_rate = (with_phone / total_stores * 100) if total_stores > 0 else 0
-            website_rate = (with_website / total_stores * 100) if total_stores > 0 else 0
+                location_rows = db.session.execute(stats_location_statement()).all()
+                return stats_response(scalars, location_rows)
 
-            return jsonify(
-                {
-                    "total_stores": total_stores,
-                    "total_with_opening": total_with_opening,
-                    "with_opening_date_count": total_with_opening,
-                    "remaining": remaining,
-                    "completed": completed,
-                    "completion_rate": completion_rate,
-                    "with_phone": with_phone,
-                    "with_website": with_website,
-                    "fully_completed": fully_completed,
-                    "fully_completed_with_opening": fully_completed,
-                    "cities": cities_count,
-                    "phone_rate": phone_rate,
-                    "website_rate": website_rate,
-                    "city_stats": city_stats,
-                    "prefecture_stats": prefecture_stats,
-                    "area_stats": area_stats,
-                    "latest_update": latest_update_str,
-                }
-            )
+            return cached_json_response("stats", "", build)
         except Exception as e:
             import traceback
             return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 500
     
     @app.route("/api/stores")
     def get_stores():
-        """店舗データ一覧取得API"""
+        """店舗データ一覧取得API
+
+        fields=name,address,... で返す項目（と読み込む列）を絞れる。layout=columns で列指向のJSON、
+        Accept: application/msgpack でMessagePackを返す。
+        """
         try:
-            from models import Store
-            from sqlalchemy import or_, and_, func
             from sqlalchemy.exc import OperationalError
+            from response_cache import cached_json_response
+            from store_filters import FilterSpec
+            from store_queries import parse_fields, store_count_statement, store_page_response, store_page_statement
             
             page = int(request.args.get("page", 1))
             per_page = int(request.args.get("per_page", 100))
-            search = request.args.get("search", "").strip() or None
-            
+            layout = 'columns' if request.args.get("layout") == 'columns' else 'rows'
             try:
-                query = db.session.query(Store)
-
-                # クエリパラメータ
-                search = request.args.get("search", "").strip() or None
-                search_mode = request.args.get("search_mode", "AND")
-                match_type = request.args.get("match_type", "partial")
-                prefectures = request.args.getlist("prefectures")
-                cities = request.args.getlist("cities")
+                fields = parse_fields(request.args)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            spec = FilterSpec.from_args(request.args)
+            
+            def build():
+                try:
+                    conditions = spec.conditions()
+                    total_count = db.session.execute(store_count_statement(conditions)).scalar()
+                    stores = db.session.execute(store_page_statement(conditions, page, per_page, fields)).scalars().all()
+                    return store_page_response(stores, total_count, page, per_page, fields, layout)
+                except OperationalError as e:
+                    # テーブルが存在しない場合は空のリストを返す
+                    if 'no such table' in str(e).lower():
+                        return store_page_response([], 0, page, per_page, fields, layout)
+                    raise
+            
+            key = f"{spec.cache_key}:{page}:{per_page}:{','.join(fields) if fields else '*'}:{layout}"
+            return cached_json_response("stores", key, build, negotiate=True)
+        except Exception as e:
+            import traceback
+            return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 500
+    
+    @app.route("/api/stores/facets")
+    def get_store_facets():
+        """絞り込み候補ごとの店舗数取得API（都道府県・市区町村・カテゴリ・データソース・デリバリーサービス）
 
-                # キーワード検索（店舗名・住所・カテゴリ）
-                if search:
-                    keywords = [k for k in search.split() if k]
-                    if keywords:
-                        conditions = []
-                        for kw in keywords:
-                            pattern = f"%{kw}%" if match_type == "partial" else kw
-                            conditions.append(
-                                or_(
-                                    Store.name.ilike(pattern),
-                                    Store.address.ilike(pattern),
-                                    Store.category.ilike(pattern),
-                                )
-                            )
-                        if search_mode.upper() == "OR":
-                            query = query.filter(or_(*conditions))
-                        else:
-                            for cond in conditions:
-                                query = query.filter(cond)
+        絞り込みパラメータは /api/stores と同じ。limit は市区町村・カテゴリの上位件数（0で全件）。
+        """
+        try:
+            from sqlalchemy.exc import OperationalError
+            from response_cache import cached_json_response
+            from store_filters import FilterSpec
+            from store_queries import facet_response, facet_statements
+            from store_snapshot import get_snapshot
 
-                # 都道府県フィルター（住所の先頭に都道府県名が含まれている前提）
-                if prefectures:
-                    prefecture_filters = []
-                    for pref in prefectures:
-                        prefecture_filters.append(
-                            and_(
-                                Store.address.isnot(None),
-                                Store.address != "",
-                                Store.address.like(f"{pref}%"),
-                            )
-                        )
-                    query = query.filter(or_(*prefecture_filters))
+            spec = FilterSpec.from_args(request.args)
+            limit = int(request.args.get("limit", 100))
 
-                # 市区町村フィルター
-                if cities:
-                    query = query.filter(
-                        Store.city.isnot(None),
-                        Store.city != "",
-                        Store.city.in_(cities),
-                    )
+            def build():
+                try:
+                    # スナップショットで数えられない条件（キーワード検索など）はSQLで集計する
+                    snapshot = get_snapshot(db.session)
+                    result = snapshot.facets(spec, limit) if snapshot is not None else None
+                    if result is not None:
+                        return result
+                    statements = facet_statements(spec, db.session.get_bind().dialect.name)
+                    return facet_response([(names, db.session.execute(stmt).all()) for names, stmt in statements], limit)
+                except OperationalError as e:
+                    # テーブル未作成時は空の集計を返す
+                    if 'no such table' in str(e).lower():
+                        return facet_response([], limit)
+                    raise
 
-                total_count = query.count()
-                stores = query.order_by(Store.store_id).offset((page - 1) * per_page).limit(per_page).all()
-                
-                return jsonify({
-                    "stores": [store.to_dict() for store in stores],
-                    "total": total_count,
-                    "page": page,
-                    "per_page": per_page,
-                    "total_pages": (total_count + per_page - 1) // per_page if total_count > 0 else 0,
-                })
-            except OperationalError as e:
-                # テーブルが存在しない場合は空のリストを返す
-                if 'no such table' in str(e).lower():
-                    return jsonify({
-                        "stores": [],
-                        "total": 0,
-                        "page": page,
-                        "per_page": per_page,
-                        "total_pages": 0,
-                    })
-                raise
+            return cached_json_response("facets", f"{spec.cache_key}:{limit}", build)
         except Exception as e:
-            import traceback
-            return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 500
+            return jsonify({"error": str(e)}), 500
     
     @app.route("/api/partner/saved-lists")
     def get_saved_lists():
@@ -950,77 +695,17 @@ def register_routes(app):
     def export_excel():
         """ExcelエクスポートAPI"""
         try:
-            from models import Store
             from flask import Response
             from sqlalchemy.exc import OperationalError
+            from store_exports import write_excel
             
             try:
                 query = _build_store_query()
-                if query is None:
-                    try:
-                        from openpyxl import Workbook
-                        wb = Workbook()
-                        ws = wb.active
-                        ws.append(['店舗ID', '店舗名'])
-                        output = io.BytesIO()
-                        wb.save(output)
-                        output.seek(0)
-                        return Response(
-                            output.getvalue(),
-                            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                            headers={'Content-Disposition': 'attachment; filename=stores_export.xlsx'}
-                        )
-                    except ImportError:
-                        return jsonify({"error": "openpyxlライブラリがインストールされていません。"}), 500
-                
                 stores = query.all()
                 
                 try:
-                    from openpyxl import Workbook
-                    from openpyxl.styles import Font, Alignment, PatternFill
-                    from openpyxl.utils import get_column_letter
-                    
-                    wb = Workbook()
-                    ws = wb.active
-                    ws.title = "店舗一覧"
-                    
-                    headers = [
-                        '店舗ID', '店舗名', '電話番号', 'ウェブサイト', '住所', 'カテゴリ',
-                        '評価', '都市', '開店日', '定休日', '交通アクセス', '営業時間',
-                        '公式アカウント', 'データソース'
-                    ]
-                    ws.append(headers)
-                    
-                    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                    header_font = Font(bold=True, color="FFFFFF")
-                    for cell in ws[1]:
-                        cell.fill = header_fill
-                        cell.font = header_font
-                        cell.alignment = Alignment(horizontal="center", vertical="center")
-                    
-                    for store in stores:
-                        ws.append([
-                            store.store_id, store.name, store.phone, store.website,
-                            store.address, store.category, store.rating, store.city,
-                            store.opening_date, store.closed_day, store.transport,
-                            store.business_hours, store.official_account, store.data_source
-                        ])
-                    
-                    for column in ws.columns:
-                        max_length = 0
-                        column_letter = get_column_letter(column[0].column)
-                        for cell in column:
-                            try:
-                                if cell.value:
-                                    max_length = max(max_length, len(str(cell.value)))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        ws.column_dimensions[column_letter].width = adjusted_width
-                    
                     output = io.BytesIO()
-                    wb.save(output)
-                    output.seek(0)
+                    write_excel(stores, output)
                     
                     return Response(
                         output.getvalue(),
@@ -1053,146 +738,26 @@ def register_routes(app):
             return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 500
     
     def _build_store_query():
-        """店舗クエリを構築（フィルターパラメータ対応）"""
+        """店舗クエリを構築（フィルターパラメータ対応、/api/stores と同じ条件）"""
         from models import Store
-        from sqlalchemy import or_, and_
-        from sqlalchemy.exc import OperationalError
+        from store_filters import FilterSpec
         
-        try:
-            query = db.session.query(Store)
-            
-            # クエリパラメータ
-            search = request.args.get("search", "").strip() or None
-            search_mode = request.args.get("search_mode", "AND")
-            match_type = request.args.get("match_type", "partial")
-            prefectures = request.args.getlist("prefectures")
-            cities = request.args.getlist("cities")
-            categories = request.args.getlist("categories")
-            data_sources = request.args.getlist("data_sources")
-            
-            # キーワード検索（店舗名・住所・カテゴリ）
-            if search:
-                keywords = [k for k in search.split() if k]
-                if keywords:
-                    conditions = []
-                    for kw in keywords:
-                        pattern = f"%{kw}%" if match_type == "partial" else kw
-                        conditions.append(
-                            or_(
-                                Store.name.ilike(pattern),
-                                Store.address.ilike(pattern),
-                                Store.category.ilike(pattern),
-                            )
-                        )
-                    if search_mode.upper() == "OR":
-                        query = query.filter(or_(*conditions))
-                    else:
-                        for cond in conditions:
-                            query = query.filter(cond)
-            
-            # 都道府県フィルター
-            if prefectures:
-                prefecture_filters = []
-                for pref in prefectures:
-                    prefecture_filters.append(
-                        and_(
-                            Store.address.isnot(None),
-                            Store.address != "",
-                            Store.address.like(f"{pref}%"),
-                        )
-                    )
-                query = query.filter(or_(*prefecture_filters))
-            
-            # 市区町村フィルター
-            if cities:
-                query = query.filter(
-                    Store.city.isnot(None),
-                    Store.city != "",
-                    Store.city.in_(cities),
-                )
-            
-            # カテゴリフィルター（部分一致検索に対応）
-            if categories:
-                from sqlalchemy import or_
-                # 選択されたカテゴリーがデータベースのカテゴリー値に含まれているかチェック
-                # 例：「居酒屋」を選択した場合、「居酒屋」「松山市 / 居酒屋」などがマッチする
-                category_filters = []
-                for category in categories:
-                    # 完全一致または部分一致（カテゴリー値に選択値が含まれる）
-                    category_filters.append(
-                        or_(
-                            Store.category == category,
-                            Store.category.contains(category)
-                        )
-                    )
-                query = query.filter(
-                    Store.category.isnot(None),
-                    Store.category != "",
-                    or_(*category_filters)
-                )
-            
-            # データソースフィルター
-            if data_sources:
-                query = query.filter(
-                    Store.data_source.isnot(None),
-                    Store.data_source != "",
-                    Store.data_source.in_(data_sources),
-                )
-            
-            return query
-        except OperationalError as e:
-            if 'no such table' in str(e).lower():
-                return None
-            raise
+        return db.session.query(Store).filter(*FilterSpec.from_args(request.args).conditions())
     
     @app.route("/api/export/csv")
     def export_csv():
-        """CSVエクスポートAPI"""
+        """CSVエクスポートAPI（読み込みながら送る）"""
         try:
-            from models import Store
-            from flask import Response
+            from flask import Response, stream_with_context
             import csv
             import io
             from sqlalchemy.exc import OperationalError
+            from store_exports import iter_csv, iter_stores
             
             try:
-                query = _build_store_query()
-                if query is None:
-                    # テーブルが存在しない場合は空のCSVを返す
-                    output = io.StringIO()
-                    writer = csv.writer(output)
-                    writer.writerow(['店舗ID', '店舗名'])
-                    output.seek(0)
-                    return Response(
-                        output.getvalue(),
-                        mimetype='text/csv; charset=utf-8',
-                        headers={'Content-Disposition': 'attachment; filename=stores_export.csv'}
-                    )
-                
-                stores = query.all()
-                
-                output = io.StringIO()
-                writer = csv.writer(output)
-                
-                # ヘッダー
-                writer.writerow([
-                    '店舗ID', '店舗名', '電話番号', 'ウェブサイト', '住所', 'カテゴリ',
-                    '評価', '都市', '開店日', '定休日', '交通アクセス', '営業時間',
-                    '公式アカウント', 'データソース'
-                ])
-                
-                # データ
-                for store in stores:
-                    writer.writerow([
-                        store.store_id, store.name, store.phone, store.website,
-                        store.address, store.category, store.rating, store.city,
-                        store.opening_date, store.closed_day, store.transport,
-                        store.business_hours, store.official_account, store.data_source
-                    ])
-                
-                output.seek(0)
+                stores = iter_stores(_build_store_query())
                 return Response(
-                    output.getvalue(),
+                    stream_with_context(iter_csv(stores)),
                     mimetype='text/csv; charset=utf-8',
                     headers={'Content-Disposition': 'attachment; filename=stores_export.csv'}
                 )
@@ -1215,30 +780,17 @@ def register_routes(app):
     
     @app.route("/api/export/json")
     def export_json():
-        """JSONエクスポートAPI"""
+        """JSONエクスポートAPI（読み込みながら送る）"""
         try:
-            from models import Store
-            from flask import Response
+            from flask import Response, stream_with_context
             import json
             from sqlalchemy.exc import OperationalError
+            from store_exports import iter_json, iter_stores, json_export_query
             
             try:
-                query = _build_store_query()
-                if query is None:
-                    # テーブルが存在しない場合は空のJSONを返す
-                    return Response(
-                        json.dumps({"stores": []}, ensure_ascii=False, indent=2),
-                        mimetype='application/json; charset=utf-8',
-                        headers={'Content-Disposition': 'attachment; filename=stores_export.json'}
-                    )
-                
-                stores = query.all()
-                
-                # 店舗データを辞書形式に変換
-                stores_data = [store.to_dict() for store in stores]
-                
+                stores = iter_stores(json_export_query(_build_store_query()))
                 return Response(
-                    json.dumps({"stores": stores_data}, ensure_ascii=False, indent=2),
+                    stream_with_context(iter_json(stores)),
                     mimetype='application/json; charset=utf-8',
                     headers={'Content-Disposition': 'attachment; filename=stores_export.json'}
                 )
@@ -1254,3 +806,31 @@ def register_routes(app):
         except Exception as e:
             import traceback
             return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 500
+    
+    @app.route("/api/export/parquet")
+    def export_parquet():
+        """ParquetエクスポートAPI（列ごとに圧縮した分析用の形式、行グループごとに送る）"""
+        try:
+            from flask import Response, stream_with_context
+            from sqlalchemy.exc import OperationalError
+            from store_exports import iter_parquet, iter_store_columns, pa
+            
+            if pa is None:
+                return jsonify({"error": "pyarrowライブラリがインストールされていません。"}), 500
+            
+            try:
+                batches = iter_store_columns(_build_store_query())
+            except OperationalError as e:
+                if 'no such table' in str(e).lower():
+                    # テーブルが存在しない場合は列だけの空のParquetを返す
+                    batches = iter([])
+                else:
+                    raise
+            return Response(
+                stream_with_context(iter_parquet(batches)),
+                mimetype='application/vnd.apache.parquet',
+                headers={'Content-Disposition': 'attachment; filename=stores_export.parquet'}
+            )
+        except Exception as e:
+            import traceback
+            return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 500
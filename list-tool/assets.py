@@ -0,0 +1,89 @@
+"""ビルド済み静的ファイルの配信（build_assets.py の出力）
+
+- /assets/<名前.ハッシュ.拡張子>: 内容が変わるとURLが変わるため1年間キャッシュさせる（immutable）
+- 画面（send_page）: ビルド済みがあればそれを、なければ元のHTMLを配信する（ETag付き・毎回再検証）
+- どちらも Accept-Encoding に応じて事前圧縮した .br / .gz をそのまま送る
+"""
+import json
+import logging
+import mimetypes
+import os
+
+from flask import abort, current_app, request, send_from_directory
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
+# 事前圧縮ファイルの拡張子（優先順）
+_PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+class AssetBuild:
+    """manifest.json の内容"""
+
+    def __init__(self, build_dir, manifest):
+        self.build_dir = build_dir
+        self.assets = manifest.get('assets', {})
+        self.pages = set(manifest.get('pages', []))
+        self.asset_files = set(self.assets.values())
+
+
+def load_build(build_dir):
+    """manifest.json を読み込む（ビルドしていなければNone）"""
+    manifest_path = os.path.join(build_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            return AssetBuild(build_dir, json.load(f))
+    except (OSError, ValueError) as e:
+        logger.warning(f"静的ファイルのmanifestを読み込めません（ビルド前のファイルを配信します）: {e}")
+        return None
+
+
+def _send_precompressed(directory, filename, max_age=None):
+    """Accept-Encoding に合う事前圧縮版があればそれを、なければ元のファイルを送る"""
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if mimetype.startswith('text/') or mimetype == 'application/javascript':
+        mimetype += '; charset=utf-8'
+    for encoding, suffix in _PRECOMPRESSED:
+        if request.accept_encodings[encoding] and os.path.exists(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype, max_age=max_age)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def send_page(filename):
+    """画面のHTMLを配信する"""
+    build = current_app.extensions.get('assets')
+    if build is not None and filename in build.pages:
+        response = _send_precompressed(os.path.join(build.build_dir, 'pages'), filename)
+    else:
+        response = send_from_directory(BASE_DIR, filename)
+    # HTMLのURLは固定なので、ブラウザには毎回ETagで再検証させる（変わっていなければ304）
+    response.cache_control.no_cache = True
+    return response
+
+
+def init_assets(app):
+    """ビルド済みの静的ファイルを読み込み、/assets/ のルートを登録する"""
+    build = load_build(app.config.get('ASSET_BUILD_DIR') or os.path.join(BASE_DIR, 'static_build'))
+    app.extensions['assets'] = build
+
+    @app.route("/assets/<path:filename>")
+    def serve_asset(filename):
+        """ハッシュ付きの静的ファイル（build_assets.py の出力）"""
+        if build is None or filename not in build.asset_files:
+            abort(404)
+        response = _send_precompressed(os.path.join(build.build_dir, 'assets'), filename, max_age=ASSET_MAX_AGE)
+        response.cache_control.immutable = True
+        return response
+
+    return build
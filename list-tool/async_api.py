@@ -0,0 +1,406 @@
+"""非同期読み取りAPI（ASGI）
+
+/api/stores・/api/stores/facets・/api/cities・/api/categories・/api/stats を SQLAlchemy の非同期エンジン
+（PostgreSQL: asyncpg / SQLite: aiosqlite）で提供する。待ち時間の長いリクエストが
+スレッドやプール接続を占有しないため、少数のプロセスで多数の同時接続をさばける。
+絞り込み条件（store_filters.py）・クエリの組み立てとレスポンスの整形（store_queries.py）は
+Flaskのルートと共有する。
+
+レスポンスキャッシュ（世代番号付きのキー・ETag/304・MessagePack、response_cache.py）、
+同時実行数の制限（admission.py）、シングルフライト（singleflight.py）、市区町村のインデックス（city_index.py）、
+集計用スナップショット（store_snapshot.py）もFlaskと同じ仕組みを使う。Flaskアプリをマウントしている場合は
+キャッシュ・枠・スナップショットをFlaskアプリと共有する（同じプロセスの上限は両方の合計）。
+市区町村のインデックスとスナップショットの作成・参照は同期のセッションでスレッドで行う（イベントループを止めない）。
+
+それ以外のパス（画面・ログイン・管理・エクスポートなど）は、既定ではFlaskアプリを
+WSGIとしてマウントしてそのまま処理する。
+
+使用方法:
+    pip install starlette uvicorn aiosqlite   # PostgreSQLの場合は asyncpg
+    uvicorn async_api:app --host 0.0.0.0 --port 8000 --workers 2
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import timezone
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags
+
+import slow_query
+import store_queries
+from admission import AdmissionRejected, create_limiters, endpoint_class as admission_class, rejection_payload, run_admitted_async
+from bootstrap import get_config
+from city_index import lookup_cities
+from data_version import get_version_info
+from response_cache import (
+    MSGPACK_MIMETYPE, cache_key_for, create_response_cache, encode_msgpack, is_not_modified, negotiate_encoding,
+)
+from singleflight import create_single_flight
+from store_filters import FilterSpec
+from store_snapshot import create_store_snapshot_manager
+
+# 同期ドライバ → 非同期ドライバ
+_ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+# 非同期エンジンに渡せるエンジンオプション
+_ENGINE_OPTIONS = ('pool_size', 'max_overflow', 'pool_recycle', 'pool_pre_ping', 'pool_timeout')
+
+
+def async_database_url(uri, instance_path):
+    """SQLALCHEMY_DATABASE_URI を非同期ドライバのURLに変換する
+
+    Flask-SQLAlchemyと同じく、SQLiteの相対パスはインスタンスフォルダ基準で解決する。
+    """
+    scheme, sep, rest = uri.partition('://')
+    if not sep:
+        raise ValueError(f"データベースURLを解釈できません: {uri}")
+    driver = _ASYNC_DRIVERS.get(scheme)
+    if driver is None:
+        if '+' in scheme and scheme.split('+')[1] in ('asyncpg', 'aiosqlite'):
+            driver = scheme
+        else:
+            raise ValueError(f"非同期ドライバに対応していないデータベースです: {scheme}")
+
+    if driver.startswith('sqlite') and rest.startswith('/') and rest not in ('/', '/:memory:'):
+        path = rest[1:]
+        if not os.path.isabs(path):
+            rest = '/' + os.path.join(instance_path, path)
+    return f"{driver}://{rest}"
+
+
+def _error(e):
+    return JSONResponse({"error": str(e)}, status_code=500)
+
+
+def _encode(payload, encoding):
+    """(本文, MIMEタイプ)。JSONは JSONResponse と同じ形式"""
+    if encoding == 'msgpack':
+        return encode_msgpack(payload), MSGPACK_MIMETYPE
+    body = json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+    return body.encode('utf-8'), 'application/json'
+
+
+def _validators(etag, last_modified):
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified.replace(tzinfo=timezone.utc))
+    return headers
+
+
+def _rejection(limiter, headers):
+    payload, retry_after = rejection_payload(limiter)
+    return JSONResponse(payload, status_code=429, headers={**headers, 'Retry-After': str(retry_after)})
+
+
+def create_asgi_app(config_name=None, mount_flask=True):
+    """非同期読み取りAPIのASGIアプリを作成"""
+    config_name = config_name or os.getenv('FLASK_ENV', 'local')
+    config_class = get_config(config_name)
+    instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+    def get(key, default):
+        return getattr(config_class, key, default)
+
+    engine_options = {
+        key: value
+        for key, value in getattr(config_class, 'SQLALCHEMY_ENGINE_OPTIONS', {}).items()
+        if key in _ENGINE_OPTIONS
+    }
+    engine = create_async_engine(
+        async_database_url(config_class.SQLALCHEMY_DATABASE_URI, instance_path),
+        **engine_options,
+    )
+    Session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    # 遅いクエリの記録（一覧はFlask側の /api/admin/slow-queries、全件はログファイル）
+    slow_queries = slow_query.from_config(get)
+    if slow_queries is not None:
+        slow_queries.instrument(engine.sync_engine)
+
+    flask_app = None
+    if mount_flask:
+        from app import create_app
+        flask_app = create_app(config_name)
+
+    if flask_app is not None:
+        # マウントしたFlaskアプリとキャッシュ・同時実行数の枠・スナップショットを共有する
+        cache = flask_app.extensions.get('response_cache')
+        single_flight = flask_app.extensions.get('single_flight')
+        limiters = flask_app.extensions.get('admission') or {}
+        snapshots = flask_app.extensions.get('store_snapshot')
+    else:
+        cache = create_response_cache(get)
+        single_flight = create_single_flight(get)
+        limiters = create_limiters(get) if get('ADMISSION_ENABLED', True) else {}
+        snapshots = create_store_snapshot_manager(get)
+
+    # 市区町村のインデックスとスナップショットは同期のセッション（Flask-SQLAlchemy）でスレッドで作成・参照する
+    # （作り直しの間はスレッドのロックで待たせるため、イベントループのスレッドでは実行しない）
+    if flask_app is not None:
+        sync_app = flask_app
+    else:
+        from bootstrap import create_cli_app
+        sync_app = create_cli_app(config_name)
+
+    def in_sync_session(fn, *args):
+        from extensions import db
+
+        with sync_app.app_context():
+            try:
+                return fn(db.session, *args)
+            finally:
+                db.session.remove()
+
+    async def snapshot_result(method, *args):
+        """スナップショットでの集計結果（無効・世代番号が取れない・扱えない条件ならNone＝SQLで集計する）"""
+        if snapshots is None:
+            return None
+
+        def run(session):
+            snapshot = snapshots.get(session)
+            return getattr(snapshot, method)(*args) if snapshot is not None else None
+
+        return await asyncio.to_thread(in_sync_session, run)
+
+    async def cached_response(request, namespace, key, build, negotiate=False):
+        """response_cache.cached_json_response の非同期版（build は辞書を返すコルーチン関数）
+
+        キャッシュのキー・ETagはFlaskのルートと同じ作り方。キャッシュのヒット・304・
+        同じ計算の結果の共有では同時実行数の枠を使わない。
+        """
+        accepted_at = time.perf_counter()
+        limiter = limiters.get(admission_class(request.url.path))
+        pending = (limiter, accepted_at) if limiter is not None else None
+        encoding = 'json'
+        headers = {}
+        if negotiate:
+            encoding = negotiate_encoding(parse_accept_header(request.headers.get('accept'), MIMEAccept))
+            headers['Vary'] = 'Accept'
+
+        async def encoded():
+            async def compute():
+                return _encode(await build(), encoding)
+            # 計算とシリアライズの間だけ同時実行数の枠を使う
+            return await run_admitted_async(compute, pending)
+
+        async with Session() as session:
+            info = await session.run_sync(get_version_info)
+        if info is None:
+            try:
+                body, mimetype = await encoded()
+            except AdmissionRejected as e:
+                return _rejection(e.limiter, headers)
+            return Response(body, media_type=mimetype, headers=headers)
+
+        # JSONの書式（キーの順序・整形）がFlaskと異なるため、キャッシュの名前空間は分ける
+        cache_key, etag = cache_key_for(f"asgi:{namespace}", info, key, encoding)
+        last_modified = info[1]
+        headers.update(_validators(etag, last_modified))
+        if is_not_modified(parse_etags(request.headers.get('if-none-match')),
+                           parse_date(request.headers.get('if-modified-since')), etag, last_modified):
+            if cache is not None:
+                cache.record('not_modified')
+            return Response(status_code=304, headers=headers)
+
+        body = None
+        if cache is not None:
+            body = await asyncio.to_thread(cache.get, cache_key) if cache.remote else cache.get(cache_key)
+        status = 'HIT'
+        if body is None:
+            async def compute():
+                value, _ = await encoded()
+                if cache is not None:
+                    if cache.remote:
+                        await asyncio.to_thread(cache.set, cache_key, value)
+                    else:
+                        cache.set(cache_key, value)
+                return value
+
+            try:
+                if single_flight is not None:
+                    body, shared = await single_flight.do_async(cache_key, compute)
+                else:
+                    body, shared = await compute(), False
+            except AdmissionRejected as e:
+                return _rejection(e.limiter, headers)
+            status = 'SHARED' if shared else 'MISS'
+
+        headers['X-Cache'] = status
+        return Response(body, media_type=MSGPACK_MIMETYPE if encoding == 'msgpack' else 'application/json',
+                        headers=headers)
+
+    async def get_stores(request: Request):
+        """店舗データ一覧取得API（fields= / layout=columns / Accept: application/msgpack に対応）"""
+        try:
+            page = int(request.query_params.get("page", 1))
+            per_page = int(request.query_params.get("per_page", 100))
+            layout = 'columns' if request.query_params.get("layout") == 'columns' else 'rows'
+            try:
+                fields = store_queries.parse_fields(request.query_params)
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+            spec = FilterSpec.from_args(request.query_params)
+
+            async def build():
+                try:
+                    conditions = spec.conditions()
+                    async with Session() as session:
+                        total_count = (await session.execute(store_queries.store_count_statement(conditions))).scalar()
+                        result = await session.execute(
+                            store_queries.store_page_statement(conditions, page, per_page, fields))
+                        stores = result.scalars().all()
+                        return store_queries.store_page_response(stores, total_count, page, per_page, fields, layout)
+                except OperationalError as e:
+                    if 'no such table' in str(e).lower():
+                        return store_queries.store_page_response([], 0, page, per_page, fields, layout)
+                    raise
+
+            key = f"{spec.cache_key}:{page}:{per_page}:{','.join(fields) if fields else '*'}:{layout}"
+            return await cached_response(request, "stores", key, build, negotiate=True)
+        except Exception as e:
+            return _error(e)
+
+    async def get_store_facets(request: Request):
+        """絞り込み候補ごとの店舗数取得API"""
+        try:
+            spec = FilterSpec.from_args(request.query_params)
+            limit = int(request.query_params.get("limit", 100))
+
+            async def build():
+                try:
+                    # スナップショットで数えられない条件（キーワード検索など）はSQLで集計する
+                    result = await snapshot_result('facets', spec, limit)
+                    if result is not None:
+                        return result
+                    async with Session() as session:
+                        results = []
+                        for names, stmt in store_queries.facet_statements(spec, engine.dialect.name):
+                            results.append((names, (await session.execute(stmt)).all()))
+                    return store_queries.facet_response(results, limit)
+                except OperationalError as e:
+                    if 'no such table' in str(e).lower():
+                        return store_queries.facet_response([], limit)
+                    raise
+
+            return await cached_response(request, "facets", f"{spec.cache_key}:{limit}", build)
+        except Exception as e:
+            return _error(e)
+
+    async def get_cities(request: Request):
+        """指定した都道府県に属する市区町村リスト取得API（prefecture は複数指定可）
+
+        Flaskのルートと同じメモリ内インデックス（city_index.py）を使い、世代番号が変わったときだけ作り直す。
+        """
+        try:
+            params = request.query_params
+            prefectures = sorted({
+                p.strip() for p in params.getlist("prefecture") + params.getlist("prefectures") if p.strip()
+            })
+
+            async def build():
+                try:
+                    return await asyncio.to_thread(in_sync_session, lookup_cities, prefectures)
+                except OperationalError as e:
+                    if 'no such table' in str(e).lower():
+                        return {"cities": [], "by_prefecture": {p: [] for p in prefectures}}
+                    raise
+
+            return await cached_response(request, "cities", "|".join(prefectures), build)
+        except Exception as e:
+            return _error(e)
+
+    async def get_categories(request: Request):
+        """カテゴリリスト取得API"""
+        try:
+            async def build():
+                try:
+                    result = await snapshot_result('categories')
+                    if result is not None:
+                        return result
+                    async with Session() as session:
+                        category_values = (await session.execute(store_queries.categories_statement())).scalars().all()
+                    return store_queries.categories_response(category_values)
+                except OperationalError as e:
+                    if 'no such table' in str(e).lower():
+                        return store_queries.categories_response([])
+                    raise
+
+            return await cached_response(request, "categories", "", build)
+        except Exception as e:
+            return _error(e)
+
+    async def get_stats(request: Request):
+        """統計情報取得API"""
+        try:
+            async def build():
+                try:
+                    result = await snapshot_result('stats')
+                    if result is not None:
+                        return result
+                    async with Session() as session:
+                        scalars = {}
+                        for name, stmt in store_queries.stats_scalar_statements().items():
+                            scalars[name] = (await session.execute(stmt)).scalar()
+                        location_rows = (await session.execute(store_queries.stats_location_statement())).all()
+                    return store_queries.stats_response(scalars, location_rows)
+                except OperationalError as e:
+                    if 'no such table' in str(e).lower():
+                        return store_queries.EMPTY_STATS
+                    raise
+
+            return await cached_response(request, "stats", "", build)
+        except Exception as e:
+            return _error(e)
+
+    routes = [
+        Route("/api/stores", get_stores),
+        Route("/api/stores/facets", get_store_facets),
+        Route("/api/cities", get_cities),
+        Route("/api/categories", get_categories),
+        Route("/api/stats", get_stats),
+    ]
+
+    if flask_app is not None:
+        # 上記以外のパスは既存のFlaskアプリで処理する（スレッドプールで実行される）
+        from starlette.middleware.wsgi import WSGIMiddleware
+        routes.append(Mount("/", app=WSGIMiddleware(flask_app)))
+
+    @asynccontextmanager
+    async def lifespan(asgi_app):
+        yield
+        await engine.dispose()
+
+    middleware = []
+    if getattr(config_class, 'COMPRESS_ENABLED', True):
+        # Flask側のレスポンスは圧縮済み（Content-Encoding付き）なのでそのまま通る
+        from starlette.middleware import Middleware
+        from starlette.middleware.gzip import GZipMiddleware
+        middleware.append(Middleware(
+            GZipMiddleware,
+            minimum_size=getattr(config_class, 'COMPRESS_MIN_SIZE', 1024),
+            compresslevel=getattr(config_class, 'COMPRESS_LEVEL', 6),
+        ))
+
+    asgi_app = Starlette(routes=routes, lifespan=lifespan, middleware=middleware)
+    asgi_app.state.engine = engine
+    asgi_app.state.response_cache = cache
+    asgi_app.state.single_flight = single_flight
+    asgi_app.state.admission = limiters
+    asgi_app.state.store_snapshot = snapshots
+    return asgi_app
+
+
+app = create_asgi_app()
@@ -0,0 +1,115 @@
+"""APIの応答時間（pytest-benchmark）
+
+conftest.py の bench_db（生成済みの店舗データ）に対して Flask のテストクライアントで計測する。
+ネットワークやサーバーの影響を除いた、クエリとシリアライズの時間を比べるためのもの。
+
+使用方法:
+    python -m pytest benchmarks/bench_api.py [--bench-rows 100000] [--benchmark-save=<名前>]
+"""
+import pytest
+from sqlalchemy import func, select
+
+STORES_QUERIES = {
+    'default': {},
+    'prefecture': {'prefectures': '東京都'},
+    'search': {'search': 'ラーメン'},
+    'search_or': {'search': '麺屋 中華', 'search_mode': 'OR'},
+    'categories': {'categories': ['居酒屋', '焼き鳥']},
+    'data_source': {'data_sources': 'crm'},
+    'combined': {'prefectures': ['東京都', '大阪府'], 'categories': 'カフェ', 'search': '駅前'},
+    'fields': {'fields': 'name,address,phone'},
+    'columns': {'layout': 'columns'},
+}
+
+
+def _get(client, url, **params):
+    response = client.get(url, query_string=params)
+    try:
+        assert response.status_code == 200, response.get_data(as_text=True)[:500]
+        # ストリーミングのエクスポートも最後まで読む
+        return len(response.get_data())
+    finally:
+        # 閉じるまで同時実行数の枠（admission.py）が解放されない
+        response.close()
+
+
+@pytest.fixture(scope='module')
+def top_brand(bench_db):
+    """最も店舗数の多い brand_key"""
+    from models import Store
+
+    with bench_db.engine.connect() as conn:
+        return conn.execute(
+            select(Store.brand_key)
+            .where(Store.brand_key.isnot(None))
+            .group_by(Store.brand_key)
+            .order_by(func.count().desc())
+            .limit(1)
+        ).scalar()
+
+
+@pytest.mark.parametrize('name', list(STORES_QUERIES))
+def test_stores(benchmark, client, name):
+    benchmark.group = 'api: /api/stores'
+    benchmark(_get, client, '/api/stores', **STORES_QUERIES[name])
+
+
+def test_stores_brand(benchmark, client, top_brand):
+    if top_brand is None:
+        pytest.skip('brand_keyのある店舗がありません')
+    benchmark.group = 'api: /api/stores'
+    benchmark(_get, client, '/api/stores', brands=top_brand)
+
+
+@pytest.mark.parametrize('page', ['middle', 'last'])
+def test_stores_deep_page(benchmark, bench_db, client, page):
+    """OFFSETの深いページ"""
+    per_page = 100
+    pages = max(1, -(-bench_db.rows // per_page))
+    benchmark.group = 'api: /api/stores'
+    benchmark(_get, client, '/api/stores', page=pages // 2 if page == 'middle' else pages, per_page=per_page)
+
+
+@pytest.mark.parametrize('url, params', [
+    ('/api/stats', {}),
+    ('/api/categories', {}),
+    ('/api/prefectures', {}),
+    ('/api/cities', {'prefecture': '東京都'}),
+    ('/api/brands', {}),
+    ('/api/stores/facets', {}),
+    ('/api/stores/facets', {'prefectures': '東京都'}),
+], ids=['stats', 'categories', 'prefectures', 'cities', 'brands', 'facets', 'facets_prefecture'])
+def test_aggregates(benchmark, client, url, params):
+    benchmark.group = 'api: 集計'
+    benchmark(_get, client, url, **params)
+
+
+@pytest.mark.parametrize('params', [{}, {'prefectures': '東京都'}], ids=['all', 'prefecture'])
+@pytest.mark.parametrize('fmt', ['csv', 'json', 'excel', 'parquet'])
+def test_export(benchmark, client, fmt, params):
+    if fmt == 'excel':
+        pytest.importorskip('openpyxl')
+    if fmt == 'parquet':
+        pytest.importorskip('pyarrow')
+    benchmark.group = f"api: /api/export/{fmt}"
+    # 全件エクスポートは重いので回数を絞る
+    benchmark.pedantic(_get, args=(client, f"/api/export/{fmt}"), kwargs=params, rounds=3, warmup_rounds=1)
+
+
+@pytest.mark.parametrize('fmt', ['json', 'parquet'])
+def test_export_load(benchmark, client, fmt):
+    """エクスポートしたファイルを分析側で読み込む時間（JSONはjson.loads、Parquetはpyarrow）"""
+    import io
+    import json
+
+    if fmt == 'parquet':
+        parquet = pytest.importorskip('pyarrow.parquet')
+        load = lambda data: parquet.read_table(io.BytesIO(data)).num_rows
+    else:
+        load = lambda data: len(json.loads(data)['stores'])
+    response = client.get(f"/api/export/{fmt}")
+    data = response.get_data()
+    response.close()
+    benchmark.group = 'api: エクスポートの読み込み'
+    benchmark.extra_info['bytes'] = len(data)
+    benchmark(load, data)
@@ -0,0 +1,121 @@
+"""バッチ処理の所要時間（pytest-benchmark）
+
+bulk_loader.load_stores（新規・更新）、フランチャイズ判定、brand_key の導出、
+import_old_data.import_stores（SQLiteのみ）を、conftest.py の bench_db に対して計測する。
+各計測は終了時にデータを元の状態に戻す（同じDBで繰り返し計測できるようにする）。
+
+使用方法:
+    python -m pytest benchmarks/bench_batch.py [--bench-rows 100000] [--benchmark-save=<名前>]
+"""
+import shutil
+
+import pytest
+from sqlalchemy import delete, update
+
+from dataset import generate_stores
+
+LOAD_ROWS = 5000
+LOAD_PREFIX = 'bench-load'
+
+
+def _delete_loaded(engine):
+    from models import DeliveryService, Store, StoreStatus
+
+    with engine.begin() as conn:
+        for model in (DeliveryService, StoreStatus, Store):
+            conn.execute(delete(model.__table__).where(model.store_id.like(f"{LOAD_PREFIX}-%")))
+
+
+@pytest.fixture
+def load_records(bench_db):
+    records = list(generate_stores(LOAD_ROWS, seed=bench_db.seed + 1, id_prefix=LOAD_PREFIX))
+    yield records
+    _delete_loaded(bench_db.engine)
+
+
+def test_load_stores_insert(benchmark, bench_db, load_records):
+    from bulk_loader import load_stores
+
+    engine = bench_db.engine
+    benchmark.group = 'batch: load_stores'
+    result = benchmark.pedantic(
+        load_stores, args=(engine, load_records), kwargs={'progress': False},
+        setup=lambda: _delete_loaded(engine), rounds=5,
+    )
+    assert result.loaded == LOAD_ROWS
+
+
+def test_load_stores_upsert(benchmark, bench_db, load_records):
+    """既存の店舗の上書き（定期的な再取り込み）"""
+    from bulk_loader import load_stores
+
+    engine = bench_db.engine
+    load_stores(engine, load_records, progress=False)
+    benchmark.group = 'batch: load_stores'
+    result = benchmark.pedantic(
+        load_stores, args=(engine, load_records), kwargs={'progress': False}, rounds=5,
+    )
+    assert result.loaded == LOAD_ROWS
+
+
+def test_tag_franchise_stores(benchmark, bench_db):
+    """全件のフランチャイズ判定（判定結果は生成時と同じなので元に戻る）"""
+    from franchise import tag_franchise_stores
+    from models import Store
+
+    engine = bench_db.engine
+
+    def reset():
+        with engine.begin() as conn:
+            conn.execute(update(Store.__table__).where(Store.is_franchise.is_(True)).values(is_franchise=False))
+
+    benchmark.group = 'batch: 全件処理'
+    scanned, _ = benchmark.pedantic(
+        tag_franchise_stores, args=(engine,), kwargs={'progress': False}, setup=reset, rounds=3,
+    )
+    assert scanned == bench_db.rows
+
+
+def test_assign_brand_keys(benchmark, bench_db):
+    """全件の brand_key の導出（決定的なので元に戻る）"""
+    from brands import assign_brand_keys
+    from models import Store
+
+    engine = bench_db.engine
+
+    def reset():
+        with engine.begin() as conn:
+            conn.execute(update(Store.__table__).values(brand_key=None))
+
+    benchmark.group = 'batch: 全件処理'
+    scanned, _ = benchmark.pedantic(
+        assign_brand_keys, args=(engine,), kwargs={'progress': False}, setup=reset, rounds=3,
+    )
+    assert scanned == bench_db.rows
+
+
+def test_import_old_data(benchmark, bench_db, tmp_path):
+    """生成したDBを移行元として、空のDBへ全件を移行する"""
+    if bench_db.name != 'sqlite':
+        pytest.skip('import_old_data はSQLite専用です')
+
+    from bench_bulk_loader import make_app
+    from extensions import db
+    from import_old_data import import_stores
+
+    old_db = bench_db.url[len('sqlite:///'):]
+    template = tmp_path / 'template.db'
+    new_db = tmp_path / 'new.db'
+    app = make_app(f"sqlite:///{template}")
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+
+    def setup():
+        shutil.copyfile(template, new_db)
+
+    benchmark.group = 'batch: import_old_data'
+    ok = benchmark.pedantic(
+        import_stores, args=(old_db, new_db), kwargs={'backup': False}, setup=setup, rounds=3,
+    )
+    assert ok
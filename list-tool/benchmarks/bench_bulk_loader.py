@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""bulk_loader.load_stores のスループット計測（件/秒）
+
+使用方法:
+    python benchmarks/bench_bulk_loader.py [--rows 50000] [--db-url <url>] [--bad-rate 0.001] [--compare-orm]
+
+--db-url を省略すると一時ディレクトリのSQLiteに対して計測する。
+PostgreSQLを計測する場合は空のテスト用DBを指定すること（storesを書き換える）。
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Store, DeliveryService  # noqa: E402
+from bulk_loader import load_stores  # noqa: E402
+
+SERVICES = ['ubereats', 'wolt', 'demaecan', 'menu']
+
+
+def make_records(rows, bad_rate=0.0, seed=42):
+    """計測用のレコードを生成（bad_rateの割合で不正な行を混ぜる）"""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    records = []
+    for i in range(rows):
+        record = {
+            'store_id': f"bench-{i:08d}",
+            'name': f"ベンチ食堂 {i}号店",
+            'phone': f"03-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+            'address': f"東京都千代田区丸の内{rng.randint(1, 9)}-{rng.randint(1, 30)}",
+            'category': '東京駅 300m / 居酒屋、焼き鳥',
+            'rating': round(rng.uniform(2.5, 4.5), 2),
+            'city': '千代田区',
+            'url': f"https://tabelog.com/tokyo/A1302/A130201/{13000000 + i}/",
+            'opening_date': (base + timedelta(days=rng.randint(0, 365))).strftime('%Y-%m-%d'),
+            'data_source': 'tabelog',
+            'collected_at': base,
+            'updated_at': base,
+            'delivery_services': rng.sample(SERVICES, rng.randint(0, 2)),
+        }
+        if bad_rate and rng.random() < bad_rate:
+            record['rating'] = 'not-a-number'
+        records.append(record)
+    return records
+
+
+def make_app(db_url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = db_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def reset_tables():
+    db.session.query(DeliveryService).delete()
+    db.session.query(Store).delete()
+    db.session.commit()
+
+
+def bench_loader(records, batch_size):
+    started = time.perf_counter()
+    result = load_stores(db.engine, records, batch_size=batch_size, progress=False)
+    elapsed = time.perf_counter() - started
+    return result, elapsed
+
+
+def bench_orm(records, batch_size):
+    """比較用: 旧実装と同じ bulk_save_objects による挿入"""
+    started = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        batch = []
+        for record in records[i:i + batch_size]:
+            values = {k: v for k, v in record.items() if k != 'delivery_services'}
+            if not isinstance(values.get('rating'), float):
+                continue
+            batch.append(Store(**values))
+        db.session.bulk_save_objects(batch)
+        db.session.commit()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='一括ロードのスループット計測')
+    parser.add_argument('--rows', type=int, default=50000, help='ロードする件数')
+    parser.add_argument('--batch-size', type=int, default=5000, help='バッチサイズ')
+    parser.add_argument('--bad-rate', type=float, default=0.001, help='不正な行の割合')
+    parser.add_argument('--db-url', type=str, default=None, help='計測先DB（省略時は一時SQLite）')
+    parser.add_argument('--compare-orm', action='store_true', help='bulk_save_objectsとの比較も行う')
+    args = parser.parse_args()
+
+    tmpdir = None
+    db_url = args.db_url
+    if not db_url:
+        tmpdir = tempfile.mkdtemp(prefix='bench_bulk_loader_')
+        db_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    records = make_records(args.rows, bad_rate=args.bad_rate)
+    app = make_app(db_url)
+
+    with app.app_context():
+        db.create_all()
+        reset_tables()
+
+        result, elapsed = bench_loader(records, args.batch_size)
+        print("=" * 60)
+        print(f"load_stores ({db.engine.dialect.name})")
+        print("=" * 60)
+        print(f"ロード: {result.loaded:,}件 / リジェクト: {result.rejected:,}件")
+        print(f"デリバリーサービス: {result.delivery_services:,}件")
+        print(f"所要時間: {elapsed:.2f}秒 ({result.loaded / elapsed:,.0f}件/秒)")
+
+        if args.compare_orm:
+            reset_tables()
+            orm_elapsed = bench_orm(records, args.batch_size)
+            print("-" * 60)
+            print("bulk_save_objects（旧実装、デリバリーサービスなし）")
+            print(f"所要時間: {orm_elapsed:.2f}秒 ({result.loaded / orm_elapsed:,.0f}件/秒)")
+
+        reset_tables()
+
+
+if __name__ == '__main__':
+    main()
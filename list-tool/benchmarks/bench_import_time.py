@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""起動時間（import時間）のベンチマーク
+
+`python -X importtime` の出力を集計し、対象モジュールのimport時間（累積）と
+重いモジュールの上位を表示する。予算（ミリ秒）を超えた場合は終了コード1で終了する。
+
+使用方法:
+    python benchmarks/bench_import_time.py [--target bootstrap] [--budget-ms 700] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 対象ごとの既定の予算（ミリ秒）
+DEFAULT_BUDGETS = {
+    'bootstrap': 700,
+    'app': 1000,
+}
+
+
+def measure_import(target, python=sys.executable):
+    """target をimportしたときの (合計ミリ秒, [(累積ミリ秒, モジュール名), ...]) を返す"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {target}'],
+        cwd=str(PROJECT_ROOT), env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{target} のimportに失敗しました:\n{proc.stderr[-2000:]}")
+
+    modules = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        # 形式: "import time:    self [us] |  cumulative | imported package"
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        cumulative = int(parts[1])
+        name = parts[2].rstrip()
+        modules.append((cumulative / 1000, name))
+        # インデントなし（トップレベル）のimportの累積を合計する
+        if not name.startswith('  '):
+            total_us += cumulative
+    return total_us / 1000, modules
+
+
+def measure_wall(target, python=sys.executable):
+    """インタプリタ起動を含む実時間（ミリ秒）"""
+    started = time.perf_counter()
+    subprocess.run([python, '-c', f'import {target}'], cwd=str(PROJECT_ROOT), check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="import時間のベンチマーク")
+    parser.add_argument('--target', action='append', help="計測するモジュール（複数指定可、既定: bootstrap, app）")
+    parser.add_argument('--budget-ms', type=float, help="予算（ミリ秒）。指定がなければ対象ごとの既定値")
+    parser.add_argument('--top', type=int, default=15, help="表示する重いモジュールの数")
+    args = parser.parse_args()
+
+    targets = args.target or list(DEFAULT_BUDGETS)
+    over_budget = False
+
+    for target in targets:
+        total_ms, modules = measure_import(target)
+        wall_ms = measure_wall(target)
+        budget = args.budget_ms if args.budget_ms is not None else DEFAULT_BUDGETS.get(target)
+
+        print("=" * 60)
+        print(f"import {target}")
+        print("=" * 60)
+        print(f"   import時間: {total_ms:,.0f}ms / 起動を含む実時間: {wall_ms:,.0f}ms")
+        print(f"\n   重いモジュール（累積）上位{args.top}件:")
+        for ms, name in sorted(modules, reverse=True)[:args.top]:
+            print(f"   {ms:8.1f}ms  {name.strip()}")
+
+        if budget is not None:
+            if total_ms > budget:
+                over_budget = True
+                print(f"\n   ❌ 予算超過: {total_ms:,.0f}ms > {budget:,.0f}ms")
+            else:
+                print(f"\n   ✅ 予算内: {total_ms:,.0f}ms <= {budget:,.0f}ms")
+        print()
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
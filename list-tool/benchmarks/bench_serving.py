@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""開発サーバー（app.run）・gunicorn・非同期API（uvicorn）のスループット比較
+
+一時SQLiteに計測用の店舗データをロードし、同じDBに対して
+  - dev:      app.run()（Flask開発サーバー、debug=False）
+  - gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+  - uvicorn:  uvicorn async_api:app（--workers プロセス）
+をそれぞれ起動して、同時接続数 --concurrency でリクエストを送り、件/秒とレイテンシを表示する。
+
+使用方法:
+    python benchmarks/bench_serving.py [--rows 20000] [--requests 2000] [--concurrency 16]
+        [--workers 4] [--threads 4] [--mode dev --mode gunicorn --mode uvicorn] [--path /api/stores?per_page=50]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_bulk_loader import make_app, make_records  # noqa: E402
+from bulk_loader import load_stores  # noqa: E402
+from extensions import db  # noqa: E402
+
+DEFAULT_PATHS = [
+    '/api/health',
+    '/api/stores?per_page=50',
+    '/api/stores?per_page=50&search=%E9%A3%9F%E5%A0%82',
+    '/api/stats',
+]
+
+
+def prepare_database(db_url, rows):
+    """計測用のDBを作成してデータをロード"""
+    app = make_app(db_url)
+    with app.app_context():
+        db.create_all()
+        load_stores(db.engine, make_records(rows), progress=False)
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'dev':
+        return [
+            sys.executable, '-c',
+            f"from wsgi import app; app.run(host='127.0.0.1', port={port}, debug=False)",
+        ]
+    if mode == 'gunicorn':
+        return [
+            sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+            'wsgi:app',
+        ]
+    if mode == 'uvicorn':
+        return [
+            sys.executable, '-m', 'uvicorn', 'async_api:app',
+            '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers), '--no-access-log',
+        ]
+    raise ValueError(f"未対応のモードです: {mode}")
+
+
+def wait_until_ready(base_url, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("サーバーが起動直後に終了しました")
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/health", timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError("サーバーの起動待ちがタイムアウトしました")
+
+
+def fetch(url):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=120) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, ConnectionError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def run_load(base_url, paths, requests, concurrency):
+    urls = [base_url + paths[i % len(paths)] for i in range(requests)]
+    # ウォームアップ
+    for path in paths:
+        fetch(base_url + path)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fetch, urls))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        'rps': requests / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'errors': errors,
+        'elapsed': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='app.run・gunicorn・uvicorn のスループット比較')
+    parser.add_argument('--rows', type=int, default=20000, help='計測用DBの店舗数')
+    parser.add_argument('--requests', type=int, default=2000, help='送信するリクエスト数')
+    parser.add_argument('--concurrency', type=int, default=16, help='同時接続数')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn/uvicornのワーカー数')
+    parser.add_argument('--threads', type=int, default=4, help='gunicornのワーカーあたりスレッド数')
+    parser.add_argument('--port', type=int, default=5055, help='計測に使うポート')
+    parser.add_argument('--mode', action='append', choices=['dev', 'gunicorn', 'uvicorn'],
+                        help='計測するサーバー（既定: dev と gunicorn）')
+    parser.add_argument('--path', action='append', help='リクエストするパス（複数指定可）')
+    args = parser.parse_args()
+
+    modes = args.mode or ['dev', 'gunicorn']
+    paths = args.path or DEFAULT_PATHS
+
+    tmpdir = tempfile.mkdtemp(prefix='bench_serving_')
+    db_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    print(f"📊 計測用DBを作成中... ({args.rows:,}件)")
+    prepare_database(db_url, args.rows)
+
+    env = dict(os.environ, FLASK_ENV='local', DATABASE_URL=db_url)
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    try:
+        for mode in modes:
+            proc = subprocess.Popen(
+                server_command(mode, args.port, args.workers, args.threads),
+                cwd=str(PROJECT_ROOT), env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_until_ready(base_url, proc)
+                results[mode] = run_load(base_url, paths, args.requests, args.concurrency)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    print("=" * 60)
+    print(f"{args.requests:,}リクエスト / 同時接続 {args.concurrency} / CPU {os.cpu_count()}")
+    print("=" * 60)
+    for mode, r in results.items():
+        label = {
+            'dev': 'app.run',
+            'gunicorn': f"gunicorn ({args.workers}w x {args.threads}t)",
+            'uvicorn': f"uvicorn async ({args.workers}w)",
+        }[mode]
+        print(
+            f"{label:<24} {r['rps']:8.1f} req/s  p50 {r['p50']:7.1f}ms  "
+            f"p95 {r['p95']:7.1f}ms  エラー {r['errors']}"
+        )
+    if 'dev' in results:
+        for mode in ('gunicorn', 'uvicorn'):
+            if mode in results:
+                print(f"\n速度向上率（{mode} / app.run）: {results[mode]['rps'] / results['dev']['rps']:.2f}倍")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""集計用スナップショット（store_snapshot.py）の作成時間と集計の応答時間（pytest-benchmark）
+
+conftest.py の bench_db に対して、スナップショットの作成（初回・作り直し）と、
+STORE_SNAPSHOT_ENABLED=True のアプリでの /api/stats などの応答時間を計測する。
+SQLでの応答時間は bench_api.py の test_aggregates と比べる。
+作成時のおおよそのメモリ使用量は extra_info の memory_bytes に記録する。
+
+使用方法（pip install numpy）:
+    python -m pytest benchmarks/bench_snapshot.py [--bench-rows 100000] [--benchmark-save=<名前>]
+"""
+import pytest
+
+pytest.importorskip('numpy')
+
+
+@pytest.fixture(scope='module')
+def snapshot_app(bench_db):
+    """bench_db.app と同じ設定で、スナップショットを有効にした create_app()"""
+    import config
+    from app import create_app
+
+    bench_db.app  # 計測用の設定を登録させる
+    config_name = f"bench-snapshot:{bench_db.url}"
+    config.config[config_name] = type('BenchSnapshotConfig', (config.config[f"bench:{bench_db.url}"],), {
+        'STORE_SNAPSHOT_ENABLED': True,
+    })
+    return create_app(config_name)
+
+
+def _build(app, previous=None):
+    from extensions import db
+    from store_snapshot import StoreSnapshot
+
+    with app.app_context():
+        return StoreSnapshot.build(db.session, 'bench', previous=previous)
+
+
+@pytest.mark.parametrize('kind', ['full', 'incremental'])
+def test_snapshot_build(benchmark, bench_db, kind):
+    """初回の作成と、前回のスナップショットからの作り直し（抽出結果を使い回す）"""
+    previous = _build(bench_db.app) if kind == 'incremental' else None
+    benchmark.group = 'snapshot: 作成'
+    snapshot = benchmark.pedantic(_build, args=(bench_db.app, previous), rounds=3, warmup_rounds=0)
+    benchmark.extra_info['rows'] = snapshot.rows
+    benchmark.extra_info['memory_bytes'] = snapshot.memory_bytes
+    benchmark.extra_info['reused_values'] = snapshot.reused_values
+
+
+@pytest.mark.parametrize('url, params', [
+    ('/api/stats', {}),
+    ('/api/categories', {}),
+    ('/api/brands', {}),
+    ('/api/brands', {'prefectures': '東京都'}),
+    ('/api/stores/facets', {}),
+    ('/api/stores/facets', {'prefectures': '東京都'}),
+    ('/api/stores/facets', {'categories': ['居酒屋', '焼き鳥'], 'data_sources': 'crm'}),
+], ids=['stats', 'categories', 'brands', 'brands_prefecture', 'facets', 'facets_prefecture', 'facets_combined'])
+def test_snapshot_aggregates(benchmark, snapshot_app, url, params):
+    client = snapshot_app.test_client()
+    # 初回の作成は計測に含めない
+    client.get(url, query_string=params).close()
+    benchmark.group = 'snapshot: 集計'
+
+    def get():
+        response = client.get(url, query_string=params)
+        try:
+            assert response.status_code == 200, response.get_data(as_text=True)[:500]
+            return len(response.get_data())
+        finally:
+            response.close()
+
+    benchmark(get)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""master_lead → StoreRecord 変換の並列化ベンチマーク
+
+直列（workers=1）と並列（プロセスプール）で同じ入力を変換し、
+所要時間と速度向上率を表示する。出力が完全に一致することも検証する。
+
+使用方法:
+    python benchmarks/bench_transform.py [--rows 200000] [--workers 4] [--chunk-size 1000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from master_lead_transform import transform_master_leads  # noqa: E402
+
+
+def make_master_leads(rows, seed=42):
+    """crm-platformのmaster_leadsに近い形のデータを生成"""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    master_leads = []
+    for i in range(rows):
+        created = base + timedelta(minutes=rng.randint(0, 500000))
+        data = {
+            'store_id': f"ml-{i:08d}",
+            'name': f"ベンチ食堂 {i}号店",
+            'address': f"東京都新宿区西新宿{rng.randint(1, 8)}-{rng.randint(1, 30)}",
+            'category': '新宿駅 250m / ラーメン、つけ麺',
+            'rating': str(round(rng.uniform(2.5, 4.5), 2)) if i % 3 else 'N/A',
+            'is_franchise': rng.choice(['true', 'false', True, False]),
+            'location': {'lat': 35.6 + rng.random() / 10, 'lng': 139.6 + rng.random() / 10},
+            'opening_date': created.strftime('%Y-%m-%d'),
+            'collected_at': created.isoformat() + 'Z' if i % 2 else None,
+            'delivery_services': ['ubereats', 'wolt'][:rng.randint(0, 2)],
+            'data_source': 'tabelog',
+        }
+        master_leads.append({
+            'id': f"lead-{i:08d}",
+            'companyName': data['name'],
+            'phone': f"03-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+            'address': None,
+            'source': 'https://tabelog.com/',
+            'data': data,
+            'createdAt': created.isoformat(),
+            'updatedAt': (created + timedelta(days=1)).isoformat(),
+        })
+    return master_leads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='変換ステージの並列化ベンチマーク')
+    parser.add_argument('--rows', type=int, default=200000, help='変換する件数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='ワーカープロセス数')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='1チャンクあたりの件数')
+    args = parser.parse_args()
+
+    master_leads = make_master_leads(args.rows)
+    now = datetime(2026, 1, 1)
+
+    started = time.perf_counter()
+    serial, serial_errors = transform_master_leads(
+        master_leads, workers=1, chunk_size=args.chunk_size, now=now, progress=False
+    )
+    serial_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parallel, parallel_errors = transform_master_leads(
+        master_leads, workers=args.workers, chunk_size=args.chunk_size, now=now, progress=False
+    )
+    parallel_elapsed = time.perf_counter() - started
+
+    identical = serial == parallel and serial_errors == parallel_errors
+
+    print("=" * 60)
+    print(f"変換ベンチマーク: {args.rows:,}件 (chunk_size={args.chunk_size})")
+    print("=" * 60)
+    print(f"直列:           {serial_elapsed:.2f}秒 ({args.rows / serial_elapsed:,.0f}件/秒)")
+    print(f"並列 ({args.workers}workers): {parallel_elapsed:.2f}秒 ({args.rows / parallel_elapsed:,.0f}件/秒)")
+    print(f"速度向上:       {serial_elapsed / parallel_elapsed:.2f}倍")
+    print(f"出力一致:       {'OK' if identical else 'NG'}")
+
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
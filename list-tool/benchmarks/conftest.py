@@ -0,0 +1,149 @@
+"""pytest-benchmark による性能計測スイートの共通設定
+
+benchmarks/dataset.py で生成した店舗データを、SQLite と（指定した場合）PostgreSQL に用意し、
+同じ計測をそれぞれのDBに対して行う。
+
+使用方法（pip install pytest-benchmark）:
+    python -m pytest benchmarks/ [--bench-rows 20000] [--bench-postgres-url postgresql://...]
+        [--bench-db sqlite --bench-db postgresql] [--benchmark-save=<名前>] [--benchmark-compare]
+
+- SQLiteのデータは .pytest_cache に保存し、件数・シードが同じなら次回以降も使い回す
+- PostgreSQLは専用の空のDBを指定すること（件数が違えば stores などを作り直す）
+- レスポンスキャッシュは無効にして計測する（毎回DBに問い合わせる）
+- bench_*.py の test_* 関数を計測対象として収集する（argparse形式のスクリプトは収集されても何もしない）
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+DEFAULT_ROWS = 20000
+DEFAULT_SEED = 42
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('list-tool benchmarks')
+    group.addoption('--bench-rows', type=int, default=DEFAULT_ROWS, help='計測用データの店舗数')
+    group.addoption('--bench-seed', type=int, default=DEFAULT_SEED, help='計測用データの乱数シード')
+    group.addoption('--bench-postgres-url', default=os.getenv('BENCH_POSTGRES_URL'),
+                    help='計測用のPostgreSQL（専用の空のDB。環境変数 BENCH_POSTGRES_URL でも指定可）')
+    group.addoption('--bench-db', action='append', choices=('sqlite', 'postgresql'),
+                    help='計測するDB（既定: sqlite と、URLがあれば postgresql）')
+
+
+def pytest_collect_file(file_path, parent):
+    if file_path.suffix == '.py' and file_path.name.startswith('bench_'):
+        return pytest.Module.from_parent(parent, path=file_path)
+    return None
+
+
+def _targets(config):
+    targets = config.getoption('bench_db')
+    postgres_url = config.getoption('bench_postgres_url')
+    if not targets:
+        targets = ['sqlite'] + (['postgresql'] if postgres_url else [])
+    return targets
+
+
+def pytest_generate_tests(metafunc):
+    if 'bench_db' in metafunc.fixturenames:
+        metafunc.parametrize('bench_db', _targets(metafunc.config), indirect=True, scope='session')
+
+
+class BenchDatabase:
+    """計測対象のDB（生成済みの店舗データ入り）"""
+
+    def __init__(self, name, url, rows, seed):
+        self.name = name
+        self.url = url
+        self.rows = rows
+        self.seed = seed
+        self._app = None
+
+    @property
+    def app(self):
+        """レスポンスキャッシュ・遅いクエリの記録・プロファイラーを無効にした create_app()"""
+        if self._app is None:
+            import config
+            import config_local
+            from app import create_app
+
+            config_name = f"bench:{self.url}"
+            config.config[config_name] = type('BenchConfig', (config_local.LocalConfig,), {
+                'SQLALCHEMY_DATABASE_URI': self.url,
+                'RESPONSE_CACHE_SIZE': 0,
+                'RESPONSE_CACHE_REDIS': False,
+                'SLOW_QUERY_MS': 0,
+                'PROFILING_ENABLED': False,
+            })
+            self._app = create_app(config_name)
+        return self._app
+
+    @property
+    def engine(self):
+        from extensions import db
+        with self.app.app_context():
+            return db.engine
+
+
+def _store_count(url):
+    from sqlalchemy import create_engine, inspect, text
+
+    engine = create_engine(url)
+    try:
+        if 'stores' not in inspect(engine).get_table_names():
+            return None
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT COUNT(*) FROM stores")).scalar()
+    finally:
+        engine.dispose()
+
+
+def _reset_postgres(url):
+    from sqlalchemy import create_engine
+
+    from extensions import db
+    import models  # noqa: F401
+
+    engine = create_engine(url)
+    try:
+        db.metadata.drop_all(engine)
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def bench_db(request):
+    """生成済みデータの入ったDB（sqlite / postgresql でパラメータ化）"""
+    from dataset import build_database
+
+    config = request.config
+    rows = config.getoption('bench_rows')
+    seed = config.getoption('bench_seed')
+
+    if request.param == 'sqlite':
+        cache_dir = Path(config.cache.mkdir('list-tool-bench'))
+        path = cache_dir / f"stores_{rows}_{seed}.db"
+        url = f"sqlite:///{path}"
+        if _store_count(url) != rows:
+            path.unlink(missing_ok=True)
+            build_database(url, rows, seed=seed, progress=False)
+    else:
+        url = config.getoption('bench_postgres_url')
+        if not url:
+            pytest.skip('PostgreSQLのURLが指定されていません（--bench-postgres-url）')
+        if _store_count(url) != rows:
+            _reset_postgres(url)
+            build_database(url, rows, seed=seed, progress=False)
+
+    return BenchDatabase(request.param, url, rows, seed)
+
+
+@pytest.fixture(scope='session')
+def client(bench_db):
+    return bench_db.app.test_client()
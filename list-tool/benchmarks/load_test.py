@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""負荷試験（list-tool.js のアクセスパターンを再現）
+
+閲覧ユーザー（--browsers）とエクスポートするユーザー（--exporters）を仮想ユーザーとしてスレッドで動かし、
+エンドポイントごとの p50/p95/p99・スループット・エラー率を集計する。結果は JSON で
+OUTPUT_DIR/load_tests/ に保存し、--compare で以前の結果と比較できる。
+
+閲覧ユーザー（list-tool.html を開いてから絞り込み・ページ送りを繰り返す）:
+    /api/stats → /api/areas → /api/prefectures → /api/categories → /api/stores（1ページ目）
+    以降は都道府県の選択（/api/cities → /api/stores）、キーワード検索、カテゴリ選択、ページ送りを
+    --think-ms（平均）の間隔でランダムに行う
+エクスポートするユーザー:
+    全国または都道府県を指定した CSV / JSON（--format）のエクスポートを最後まで受信し、少し待って繰り返す
+
+サーバー:
+    --base-url を指定すれば起動済みのサーバーに対して実行する。指定しなければ --db-url（省略時は
+    dataset.py で --rows 件を生成した一時SQLite）で --server（dev / gunicorn）をローカルに起動する。
+
+使用方法:
+    python benchmarks/load_test.py [--browsers 50] [--exporters 2] [--duration 60] [--rows 100000]
+        [--server gunicorn --workers 4 --threads 4] [--base-url http://127.0.0.1:5000]
+        [--name before] [--compare latest]
+"""
+import abc
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_serving import server_command, wait_until_ready  # noqa: E402
+
+SEARCH_WORDS = ['ラーメン', '居酒屋', 'カフェ', '寿司', '焼肉', '駅前', '本店', '中華', 'バー', '食堂']
+EXPORT_FORMATS = ('csv', 'json', 'excel')
+_READ_CHUNK = 64 * 1024
+
+
+def percentile(sorted_values, p):
+    """最近接順位法のパーセンタイル（sorted_values は昇順）"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """エンドポイントごとの応答時間・ステータス・転送量を記録する（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def add(self, endpoint, latency, status, size, cache):
+        with self._lock:
+            entry = self._entries.get(endpoint)
+            if entry is None:
+                entry = self._entries[endpoint] = {'latencies': [], 'statuses': {}, 'bytes': 0, 'cache_hits': 0}
+            entry['latencies'].append(latency)
+            entry['statuses'][str(status)] = entry['statuses'].get(str(status), 0) + 1
+            entry['bytes'] += size
+            if cache == 'HIT':
+                entry['cache_hits'] += 1
+
+    def summary(self, elapsed):
+        """エンドポイントごと（と全体 'ALL'）の集計"""
+        with self._lock:
+            entries = {endpoint: dict(entry, latencies=list(entry['latencies'])) for endpoint, entry in self._entries.items()}
+
+        def summarize(latencies, statuses, size, cache_hits):
+            latencies = sorted(latencies)
+            count = len(latencies)
+            errors = sum(n for status, n in statuses.items() if not status.startswith('2'))
+            return {
+                'count': count,
+                'errors': errors,
+                'error_rate': round(errors / count * 100, 2) if count else 0.0,
+                'rps': round(count / elapsed, 2) if elapsed > 0 else 0.0,
+                'mean_ms': round(sum(latencies) / count * 1000, 1) if count else None,
+                'p50_ms': _ms(percentile(latencies, 50)),
+                'p95_ms': _ms(percentile(latencies, 95)),
+                'p99_ms': _ms(percentile(latencies, 99)),
+                'max_ms': _ms(latencies[-1] if latencies else None),
+                'statuses': dict(sorted(statuses.items())),
+                'bytes': size,
+                'cache_hit_rate': round(cache_hits / count * 100, 1) if count else 0.0,
+            }
+
+        result = {
+            endpoint: summarize(entry['latencies'], entry['statuses'], entry['bytes'], entry['cache_hits'])
+            for endpoint, entry in sorted(entries.items())
+        }
+        statuses = {}
+        for entry in entries.values():
+            for status, n in entry['statuses'].items():
+                statuses[status] = statuses.get(status, 0) + n
+        result['ALL'] = summarize(
+            [latency for entry in entries.values() for latency in entry['latencies']], statuses,
+            sum(entry['bytes'] for entry in entries.values()),
+            sum(entry['cache_hits'] for entry in entries.values()),
+        )
+        return result
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+class VirtualUser(threading.Thread, metaclass=abc.ABCMeta):
+    """仮想ユーザー（deadline まで scenario を繰り返す。scenario はサブクラスで実装する）"""
+
+    def __init__(self, name, base_url, recorder, deadline, seed, think_ms, timeout):
+        super().__init__(name=name, daemon=True)
+        self.base_url = base_url
+        self.recorder = recorder
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.think_ms = think_ms
+        self.timeout = timeout
+
+    def request(self, endpoint, path, params=None, parse=True):
+        """GET して最後まで受信する。parse=True ならJSONをデコードして返す（エクスポートは読み捨てる）"""
+        url = self.base_url + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params, doseq=True)
+        started = time.perf_counter()
+        status = 0
+        size = 0
+        cache = None
+        body = None
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                status = response.status
+                cache = response.headers.get('X-Cache')
+                chunks = [] if parse else None
+                while True:
+                    chunk = response.read(_READ_CHUNK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if chunks is not None:
+                        chunks.append(chunk)
+                if chunks is not None:
+                    body = json.loads(b''.join(chunks))
+        except urllib.error.HTTPError as e:
+            status = e.code
+            size = len(e.read() or b'')
+        except (urllib.error.URLError, ConnectionError, OSError, ValueError):
+            status = 0  # 接続エラー・タイムアウト
+        self.recorder.add(endpoint, time.perf_counter() - started, status, size, cache)
+        return body
+
+    def think(self):
+        if self.think_ms > 0:
+            time.sleep(min(self.rng.expovariate(1000 / self.think_ms), max(0.0, self.deadline - time.time())))
+
+    @property
+    def running(self):
+        return time.time() < self.deadline
+
+    def run(self):
+        try:
+            self.scenario()
+        except Exception as e:
+            print(f"⚠️  {self.name}: {e}")
+
+    @abc.abstractmethod
+    def scenario(self):
+        """deadline まで（self.running の間）リクエストを繰り返す"""
+
+
+class Browser(VirtualUser):
+    """list-tool.html を開いて絞り込み・ページ送りをするユーザー"""
+
+    def scenario(self):
+        # ページを開いたときの読み込み（list-tool.js の初期化と同じ順序）
+        self.request('GET /api/stats', '/api/stats')
+        self.request('GET /api/areas', '/api/areas')
+        prefectures = (self.request('GET /api/prefectures', '/api/prefectures') or {}).get('prefectures') or []
+        categories = (self.request('GET /api/categories', '/api/categories') or {}).get('categories') or []
+        filters = {}
+        page = 1
+        self.search(filters, page)
+
+        while self.running:
+            self.think()
+            if not self.running:
+                break
+            action = self.rng.choices(['prefecture', 'search', 'category', 'next_page', 'reset'], weights=[3, 3, 2, 4, 1])[0]
+            page = 1
+            if action == 'prefecture' and prefectures:
+                selected = self.rng.sample(prefectures, self.rng.choice([1, 1, 1, 2, 3]))
+                filters['prefectures'] = selected
+                self.request('GET /api/cities', '/api/cities', {'prefecture': selected})
+            elif action == 'search':
+                filters['search'] = self.rng.choice(SEARCH_WORDS)
+            elif action == 'category' and categories:
+                filters['categories'] = self.rng.sample(categories, min(len(categories), self.rng.choice([1, 2])))
+            elif action == 'next_page':
+                page = self.current_page + 1
+            elif action == 'reset':
+                filters = {}
+            self.search(filters, page)
+
+    def search(self, filters, page):
+        params = {'page': page, 'per_page': 100, 'search_mode': 'AND', 'match_type': 'partial', **filters}
+        data = self.request('GET /api/stores', '/api/stores', params) or {}
+        total_pages = data.get('total_pages') or 1
+        # 最終ページまで来たら1ページ目に戻る
+        self.current_page = page if page < total_pages else 0
+
+
+class Exporter(VirtualUser):
+    """エクスポートを繰り返すユーザー"""
+
+    def __init__(self, *args, formats=('csv', 'json'), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.formats = formats
+
+    def scenario(self):
+        prefectures = (self.request('GET /api/prefectures', '/api/prefectures') or {}).get('prefectures') or []
+        while self.running:
+            fmt = self.rng.choice(self.formats)
+            params = {}
+            if prefectures and self.rng.random() < 0.7:
+                params['prefectures'] = self.rng.sample(prefectures, self.rng.choice([1, 2, 5]))
+            self.request(f"GET /api/export/{fmt}", f"/api/export/{fmt}", params, parse=False)
+            self.think()
+
+
+def run_scenario(base_url, browsers, exporters, duration, think_ms, export_think_ms, ramp_up, formats, seed, timeout):
+    """仮想ユーザーを起動して duration 秒間負荷をかけ、Recorder.summary() を返す"""
+    recorder = Recorder()
+    started = time.time()
+    deadline = started + ramp_up + duration
+    users = [
+        Browser(f"browser-{i}", base_url, recorder, deadline, seed + i, think_ms, timeout)
+        for i in range(browsers)
+    ] + [
+        Exporter(f"exporter-{i}", base_url, recorder, deadline, seed + 10000 + i, export_think_ms, timeout, formats=formats)
+        for i in range(exporters)
+    ]
+    # ramp_up 秒かけて順番に開始する
+    for i, user in enumerate(users):
+        if ramp_up > 0:
+            time.sleep(max(0.0, started + ramp_up * i / len(users) - time.time()))
+        user.start()
+    for user in users:
+        # 実行中のエクスポートは deadline を過ぎても最後まで待つ
+        user.join(timeout=max(0.0, deadline - time.time()) + timeout)
+    elapsed = time.time() - started
+    return recorder.summary(elapsed), elapsed
+
+
+def results_dir(output_dir=None):
+    path = os.path.join(output_dir or os.getenv('OUTPUT_DIR', 'out'), 'load_tests')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def resolve_result(path_or_latest, directory, exclude=None):
+    """--compare の値（'latest' か ファイルパス）を結果ファイルのパスに変換"""
+    if path_or_latest != 'latest':
+        return path_or_latest
+    candidates = sorted(
+        str(p) for p in Path(directory).glob('*.json') if exclude is None or os.path.abspath(p) != os.path.abspath(exclude)
+    )
+    return candidates[-1] if candidates else None
+
+
+def print_report(result, baseline=None):
+    endpoints = result['endpoints']
+    base = (baseline or {}).get('endpoints', {})
+    print("=" * 110)
+    print(f"{'エンドポイント':<26}{'件数':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'エラー率':>9}{'キャッシュ':>9}")
+    print("-" * 110)
+    for endpoint, r in endpoints.items():
+        print(
+            f"{endpoint:<30}{r['count']:>8,}{r['rps']:>9.1f}"
+            f"{_fmt(r['p50_ms']):>9}{_fmt(r['p95_ms']):>9}{_fmt(r['p99_ms']):>9}{_fmt(r['max_ms']):>9}"
+            f"{r['error_rate']:>8.1f}%{r['cache_hit_rate']:>8.1f}%"
+        )
+        before = base.get(endpoint)
+        if before:
+            print(
+                f"{'  (前回比)':<30}{'':>8}{_delta(r['rps'], before['rps']):>9}"
+                f"{_delta(r['p50_ms'], before['p50_ms']):>9}{_delta(r['p95_ms'], before['p95_ms']):>9}"
+                f"{_delta(r['p99_ms'], before['p99_ms']):>9}{_delta(r['max_ms'], before['max_ms']):>9}"
+                f"{r['error_rate'] - before['error_rate']:>+8.1f}%"
+            )
+    print("=" * 110)
+
+
+def _fmt(ms):
+    return '-' if ms is None else f"{ms:.0f}ms"
+
+
+def _delta(after, before):
+    if not after or not before:
+        return '-'
+    return f"{(after - before) / before * 100:+.0f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='list-tool.js のアクセスパターンによる負荷試験')
+    parser.add_argument('--browsers', type=int, default=50, help='閲覧ユーザー数')
+    parser.add_argument('--exporters', type=int, default=2, help='エクスポートするユーザー数')
+    parser.add_argument('--duration', type=float, default=60, help='計測時間（秒、ランプアップを除く）')
+    parser.add_argument('--ramp-up', type=float, default=5, help='全ユーザーが動き出すまでの秒数')
+    parser.add_argument('--think-ms', type=float, default=1000, help='閲覧ユーザーの操作間隔（平均ms）')
+    parser.add_argument('--export-think-ms', type=float, default=5000, help='エクスポートの間隔（平均ms）')
+    parser.add_argument('--format', action='append', choices=EXPORT_FORMATS, help='エクスポート形式（既定: csv と json）')
+    parser.add_argument('--timeout', type=float, default=600, help='1リクエストのタイムアウト（秒）')
+    parser.add_argument('--seed', type=int, default=42, help='シナリオの乱数シード')
+    parser.add_argument('--base-url', type=str, help='起動済みのサーバー（指定しなければローカルに起動する）')
+    parser.add_argument('--db-url', type=str, help='ローカルに起動するサーバーのDB（省略時は --rows 件を生成）')
+    parser.add_argument('--rows', type=int, default=100000, help='生成する店舗数（--db-url 省略時）')
+    parser.add_argument('--server', choices=['dev', 'gunicorn'], default='gunicorn', help='ローカルに起動するサーバー')
+    parser.add_argument('--workers', type=int, default=4, help='gunicornのワーカー数')
+    parser.add_argument('--threads', type=int, default=4, help='gunicornのワーカーあたりスレッド数')
+    parser.add_argument('--port', type=int, default=5056, help='ローカルに起動するサーバーのポート')
+    parser.add_argument('--no-cache', action='store_true', help='ローカルに起動するサーバーのレスポンスキャッシュを無効にする')
+    parser.add_argument('--name', type=str, default='load_test', help='結果ファイル名に付ける名前')
+    parser.add_argument('--output-dir', type=str, help='結果の保存先（既定: OUTPUT_DIR/load_tests）')
+    parser.add_argument('--compare', type=str, help="比較する以前の結果（ファイルパス または 'latest'）")
+    args = parser.parse_args()
+
+    formats = tuple(args.format or ('csv', 'json'))
+    directory = args.output_dir or results_dir()
+    os.makedirs(directory, exist_ok=True)
+    baseline_path = resolve_result(args.compare, directory) if args.compare else None
+
+    tmpdir = None
+    proc = None
+    base_url = args.base_url
+    try:
+        if base_url is None:
+            db_url = args.db_url
+            if db_url is None:
+                from dataset import build_database
+
+                tmpdir = tempfile.mkdtemp(prefix='load_test_')
+                db_url = f"sqlite:///{os.path.join(tmpdir, 'load_test.db')}"
+                print(f"🏗️  {args.rows:,}件の店舗データを生成中...")
+                build_database(db_url, args.rows, progress=False)
+            env = dict(os.environ, FLASK_ENV='local', DATABASE_URL=db_url)
+            if args.no_cache:
+                env['RESPONSE_CACHE_SIZE'] = '0'
+                env['RESPONSE_CACHE_REDIS'] = '0'
+            base_url = f"http://127.0.0.1:{args.port}"
+            print(f"🚀 {args.server} を起動中... ({base_url})")
+            proc = subprocess.Popen(
+                server_command(args.server, args.port, args.workers, args.threads),
+                cwd=str(PROJECT_ROOT), env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            wait_until_ready(base_url, proc)
+
+        print(
+            f"📊 閲覧 {args.browsers}人 / エクスポート {args.exporters}人で {args.duration:.0f}秒間の負荷をかけます"
+            f"（ランプアップ {args.ramp_up:.0f}秒）"
+        )
+        endpoints, elapsed = run_scenario(
+            base_url, args.browsers, args.exporters, args.duration, args.think_ms, args.export_think_ms,
+            args.ramp_up, formats, args.seed, args.timeout,
+        )
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    result = {
+        'name': args.name,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'elapsed': round(elapsed, 1),
+        'settings': {
+            'browsers': args.browsers, 'exporters': args.exporters, 'duration': args.duration,
+            'ramp_up': args.ramp_up, 'think_ms': args.think_ms, 'export_think_ms': args.export_think_ms,
+            'formats': list(formats), 'seed': args.seed,
+            'server': None if args.base_url else {
+                'type': args.server, 'workers': args.workers, 'threads': args.threads,
+                'db_url': args.db_url or f"generated:{args.rows}", 'response_cache': not args.no_cache,
+            },
+            'base_url': args.base_url, 'cpu_count': os.cpu_count(),
+        },
+        'endpoints': endpoints,
+    }
+
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"📎 比較対象: {baseline_path}（{baseline.get('name')} / {baseline.get('started_at')}）")
+    print_report(result, baseline)
+
+    path = os.path.join(directory, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{args.name}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 結果を保存しました: {path}")
+
+    if args.compare and baseline_path is None:
+        print("⚠️  比較できる以前の結果がありません")
+    return 0 if endpoints['ALL']['error_rate'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
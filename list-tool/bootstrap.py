@@ -0,0 +1,57 @@
+"""バッチスクリプト用の軽量ブートストラップ
+
+create_app() はテーブル作成（db.create_all）・全ルートの登録・Celeryの初期化まで行うが、
+バッチ処理に必要なのはエンジンとセッションだけなので、ここでは設定の読み込みと
+db.init_app()、既存のDBへの brand_key 列の追加（brands.ensure_brand_key_column）のみを行う。
+アプリは設定名ごとにキャッシュし、何度呼んでも作り直さない。
+"""
+from contextlib import contextmanager
+
+from flask import Flask
+
+from brands import ensure_brand_key_column
+from extensions import db
+import config
+import config_local
+
+# ローカル設定を登録
+config.config['local'] = config_local.LocalConfig
+
+_apps = {}
+
+
+def get_config(config_name='local'):
+    """設定クラスを返す（アプリを作らずに設定値だけ読みたい場合用）"""
+    return config.config.get(config_name, config.config['default'])
+
+
+def create_cli_app(config_name='local', create_tables=False):
+    """エンジン＋セッションのみを初期化した最小構成のFlaskアプリを返す"""
+    app = _apps.get(config_name)
+    if app is None:
+        app = Flask(__name__)
+        app.config.from_object(get_config(config_name))
+        db.init_app(app)
+        # 遅いクエリはスクリプト名を呼び出し元としてログファイルに記録する
+        from slow_query import init_slow_query_log
+        init_slow_query_log(app, register_view=False)
+        with app.app_context():
+            # Webアプリ（create_app）で一度も起動していない既存のDBでも Store を読めるよう、列の追加はエンジンごとに必ず行う
+            ensure_brand_key_column(db.engine)
+        _apps[config_name] = app
+
+    if create_tables:
+        with app.app_context():
+            import models  # noqa: F401  モデルを登録してからcreate_allする
+            db.create_all()
+            ensure_brand_key_column(db.engine)
+
+    return app
+
+
+@contextmanager
+def cli_session(config_name='local'):
+    """アプリコンテキスト内のdb.sessionを返すコンテキストマネージャ"""
+    app = create_cli_app(config_name)
+    with app.app_context():
+        yield db.session
@@ -0,0 +1,186 @@
+"""店名からチェーン（ブランド）キーを導出するバッチ処理
+
+1. 店名の末尾から支店名（「羽生店」「2号店」「駅前店」など）を取り除いて基底名にする
+2. 全店舗の基底名をプレフィックス木（トライ）に登録し、ノードごとの店舗数を数える
+3. 各基底名についてトライを根から辿り、店舗数が大きく減らない範囲で最も深い接頭辞を
+   ブランドキーとする（例: すき家羽生 / すき家熊谷 / すき家川越 → すき家）
+4. franchise.py の既知ブランド名に一致する店名はそのブランド名を優先する
+
+導出したキーは stores.brand_key（インデックス付き）に書き込み、/api/brands の集計や
+/api/stores?brands=... の絞り込みに使う。
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from franchise import get_matcher
+
+# ブランドキーとして採用する最小文字数・最小店舗数
+MIN_BRAND_LENGTH = 2
+MIN_BRAND_STORES = 3
+
+# 子ノードの店舗数がこの割合を下回ったら、そこで接頭辞の伸長をやめる
+KEEP_RATIO = 0.5
+
+# 支店名を示す末尾パターン
+_BRANCH_SUFFIX = re.compile(r'(?:[0-9一二三四五六七八九十百]+号店|本店|支店|店)$')
+
+# 末尾から除去する区切り文字・記号
+_TRAILING_NOISE = ' \t・･-－ー_/／|｜()（）[]［］「」'
+
+# 業態を表す一般名詞（これだけではブランドとみなさない）
+GENERIC_WORDS = frozenset({
+    "ラーメン", "らーめん", "中華そば", "そば", "蕎麦", "うどん", "寿司", "鮨", "すし",
+    "焼肉", "焼鳥", "焼き鳥", "やきとり", "居酒屋", "カフェ", "喫茶", "珈琲", "中華",
+    "中華料理", "食堂", "定食", "とんかつ", "天ぷら", "串カツ", "お好み焼き", "たこ焼き",
+    "ピザ", "カレー", "パン", "ベーカリー", "ダイニング", "バー", "ビストロ", "レストラン",
+    "和食", "洋食", "割烹", "料理", "酒場", "餃子",
+})
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """全角英数の統一・連続空白の圧縮"""
+    if not name:
+        return ""
+    name = unicodedata.normalize('NFKC', name)
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+def strip_branch_suffix(name: Optional[str]) -> str:
+    """店名から支店部分を取り除いた基底名を返す
+
+    空白区切りで最後の語が「店」で終わる場合はその語ごと取り除く
+    （例: "スターバックス コーヒー 渋谷店" → "スターバックス コーヒー"）。
+    区切りがない場合は末尾の「店」「号店」などだけを取り除き、地名部分はトライで切り分ける
+    （例: "すき家羽生店" → "すき家羽生"）。
+    """
+    name = normalize_name(name)
+    tokens = name.split(' ')
+    if len(tokens) > 1 and _BRANCH_SUFFIX.search(tokens[-1]):
+        return ' '.join(tokens[:-1]).strip(_TRAILING_NOISE)
+    return _BRANCH_SUFFIX.sub('', name).strip(_TRAILING_NOISE)
+
+
+class _PrefixTrie:
+    """文字単位のトライ（各ノードに通過した基底名の数を持つ）"""
+
+    def __init__(self):
+        self._root = [0, {}]
+
+    def add(self, text: str):
+        node = self._root
+        node[0] += 1
+        for ch in text:
+            node = node[1].setdefault(ch, [0, {}])
+            node[0] += 1
+
+    def brand_prefix(self, text: str, min_length: int, min_stores: int, keep_ratio: float) -> Optional[str]:
+        """text の接頭辞のうち、店舗数を保ったまま伸ばせる最長のものを返す"""
+        node = self._root
+        best = None
+        for i, ch in enumerate(text, 1):
+            child = node[1].get(ch)
+            if child is None or child[0] < min_stores:
+                break
+            if i > min_length and child[0] < node[0] * keep_ratio:
+                break
+            node = child
+            if i >= min_length:
+                best = text[:i]
+        return best
+
+
+def _clean_key(key: Optional[str]) -> Optional[str]:
+    if not key:
+        return None
+    key = key.strip(_TRAILING_NOISE)
+    if len(key) < MIN_BRAND_LENGTH or key in GENERIC_WORDS:
+        return None
+    return key
+
+
+def derive_brand_keys(names: Iterable[Tuple[str, str]], min_stores: int = MIN_BRAND_STORES,
+                      keep_ratio: float = KEEP_RATIO) -> Dict[str, Optional[str]]:
+    """(store_id, name) の列から {store_id: brand_key} を求める"""
+    matcher = get_matcher()
+    trie = _PrefixTrie()
+    entries: List[Tuple[str, str, Optional[str]]] = []
+
+    for store_id, name in names:
+        known = matcher.brand_of(name)
+        base = strip_branch_suffix(name)
+        entries.append((store_id, base, known))
+        if base and not known:
+            trie.add(base)
+
+    keys = {}
+    for store_id, base, known in entries:
+        if known:
+            keys[store_id] = known
+            continue
+        if not base:
+            keys[store_id] = None
+            continue
+        keys[store_id] = _clean_key(trie.brand_prefix(base, MIN_BRAND_LENGTH, min_stores, keep_ratio))
+    return keys
+
+
+def ensure_brand_key_column(engine):
+    """storesテーブルにbrand_key列とインデックスがなければ追加する"""
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    if 'stores' not in inspector.get_table_names():
+        return
+    columns = [col['name'] for col in inspector.get_columns('stores')]
+    with engine.begin() as conn:
+        if 'brand_key' not in columns:
+            conn.execute(text("ALTER TABLE stores ADD COLUMN brand_key VARCHAR(200)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_stores_brand_key ON stores (brand_key)"))
+
+
+def assign_brand_keys(engine, min_stores: int = MIN_BRAND_STORES, batch_size: int = 1000,
+                      progress: bool = True) -> Tuple[int, int]:
+    """全店舗のbrand_keyを導出し、変化した行だけを一括更新する
+
+    戻り値は (走査件数, 更新件数)。
+    """
+    from sqlalchemy import bindparam, select, update
+
+    from data_version import bump_version
+    from models import Store
+
+    stores = Store.__table__
+    current = {}
+    names = []
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(
+            select(stores.c.store_id, stores.c.name, stores.c.brand_key)
+        )
+        for store_id, name, brand_key in result:
+            names.append((store_id, name))
+            current[store_id] = brand_key
+
+    if progress:
+        print(f"   {len(names):,}件の店名からブランドキーを導出中...")
+    keys = derive_brand_keys(names, min_stores=min_stores)
+
+    changes = [
+        {'b_store_id': store_id, 'b_brand_key': key}
+        for store_id, key in keys.items()
+        if current.get(store_id) != key
+    ]
+    stmt = (
+        update(stores)
+        .where(stores.c.store_id == bindparam('b_store_id'))
+        .values(brand_key=bindparam('b_brand_key'))
+    )
+    with engine.begin() as conn:
+        for i in range(0, len(changes), batch_size):
+            conn.execute(stmt, changes[i:i + batch_size])
+            if progress:
+                print(f"   {min(i + batch_size, len(changes)):,}/{len(changes):,}件更新...")
+        if changes:
+            bump_version(conn)
+
+    return len(names), len(changes)
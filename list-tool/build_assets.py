@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""静的ファイルのビルド（事前圧縮・内容ハッシュ付きファイル名）
+
+画面（*.html）と、そこから参照される画像・JS・CSSを ASSET_BUILD_DIR（既定: static_build/）に出力する。
+
+- 画像・JS・CSS: 「名前.内容ハッシュ.拡張子」で assets/ に出力。内容が変わるとURLも変わるため、
+  assets.py は Cache-Control: public, max-age=31536000, immutable で配信する
+- 画面: 参照先（src= / href=）をハッシュ付きのURLに書き換えて pages/ に出力。URLは固定なので
+  ETag付き・毎回再検証（no-cache）で配信する
+- テキスト系（HTML・JS・CSS・SVG）は .gz（と brotli がある場合 .br）も出力する。
+  リクエストごとに圧縮せず、Accept-Encoding に応じてそのまま送る
+
+使用方法:
+    python build_assets.py [--out static_build]
+
+サーバーは起動時に manifest.json を読み込むため、ビルド後はサーバーを再起動すること。
+ビルドしていない場合は従来どおり元のファイルを配信する。
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import shutil
+import sys
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# 画面として配信するHTML（app.py のルートと対応）
+PAGES = (
+    'list-tool.html',
+    'login.html',
+    'dashboard.html',
+    'admin-dashboard.html',
+    'products.html',
+    'account-management.html',
+    'barius.html',
+)
+
+# ハッシュ付きで配信するファイル
+ASSET_SUFFIXES = ('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')
+
+# 事前圧縮するファイル（画像は圧縮済みなので対象外）
+COMPRESSIBLE_SUFFIXES = ('.html', '.js', '.css', '.svg')
+
+_REFERENCE = re.compile(r'''(?P<attr>\b(?:src|href)=)(?P<quote>["'])(?P<path>[^"'#?]+)(?P=quote)''')
+
+
+def fingerprint(path):
+    """「名前.内容ハッシュ.拡張子」"""
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:10]
+    return f"{path.stem}.{digest}{path.suffix}"
+
+
+def write_compressed(path):
+    """path の .gz / .br を出力する（元より小さくならなければ出力しない）"""
+    data = path.read_bytes()
+    written = []
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        path.with_name(path.name + '.gz').write_bytes(gz)
+        written.append(('gzip', len(gz)))
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            path.with_name(path.name + '.br').write_bytes(br)
+            written.append(('br', len(br)))
+    return written
+
+
+def rewrite_references(html, assets):
+    """src= / href= の参照先をハッシュ付きのURLに書き換える"""
+    def replace(match):
+        path = match.group('path')
+        name = path[2:] if path.startswith('./') else path.lstrip('/')
+        if name not in assets:
+            return match.group(0)
+        quote = match.group('quote')
+        return f"{match.group('attr')}{quote}/assets/{assets[name]}{quote}"
+
+    return _REFERENCE.sub(replace, html)
+
+
+def build(out_dir):
+    out_dir = Path(out_dir)
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    (out_dir / 'assets').mkdir(parents=True)
+    (out_dir / 'pages').mkdir(parents=True)
+
+    assets = {}
+    for path in sorted(BASE_DIR.iterdir()):
+        if not path.is_file() or path.suffix.lower() not in ASSET_SUFFIXES:
+            continue
+        name = fingerprint(path)
+        target = out_dir / 'assets' / name
+        shutil.copyfile(path, target)
+        assets[path.name] = name
+        if path.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            write_compressed(target)
+
+    pages = []
+    for page in PAGES:
+        source = BASE_DIR / page
+        if not source.exists():
+            continue
+        target = out_dir / 'pages' / page
+        target.write_text(rewrite_references(source.read_text(encoding='utf-8'), assets), encoding='utf-8')
+        compressed = write_compressed(target)
+        sizes = ', '.join(f"{encoding} {size / 1024:,.0f}KB" for encoding, size in compressed)
+        print(f"  {page}: {source.stat().st_size / 1024:,.0f}KB → {sizes}")
+        pages.append(page)
+
+    manifest = {'assets': assets, 'pages': pages}
+    (out_dir / 'manifest.json').write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+    return manifest
+
+
+def main():
+    sys.path.insert(0, str(BASE_DIR))
+    from bootstrap import get_config
+
+    parser = argparse.ArgumentParser(description='静的ファイルを事前圧縮・ハッシュ付きで出力')
+    parser.add_argument('--out', help='出力先（既定: 設定の ASSET_BUILD_DIR）')
+    parser.add_argument('--config', default='local', help='設定名（既定: local）')
+    args = parser.parse_args()
+
+    out_dir = args.out or get_config(args.config).ASSET_BUILD_DIR
+    print(f"📦 静的ファイルをビルド中... → {out_dir}")
+    if brotli is None:
+        print("⚠️  brotliがインストールされていないため、.br は出力しません（pip install brotli）")
+    manifest = build(out_dir)
+    print(f"✅ 画面 {len(manifest['pages'])}件・ファイル {len(manifest['assets'])}件を出力しました")
+
+
+if __name__ == '__main__':
+    main()
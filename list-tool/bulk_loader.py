@@ -0,0 +1,343 @@
+"""店舗データの一括ロード
+
+PostgreSQLでは一時ステージングテーブルへの COPY（psycopg2 が必要）と集合演算によるマージ、
+SQLiteでは1トランザクション内の executemany（UPSERT）で stores を書き込む。
+デリバリーサービスも同じトランザクションで店舗ごとに置き換える。
+
+不正な行は事前検証でリジェクトし、DBエラーになったバッチはセーブポイント内で
+二分割して問題の行だけを切り出す（1行ずつの再試行はしない）。
+リジェクトされた行は理由付きでJSON Lines形式のファイルに書き出す。
+"""
+import io
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Boolean, DateTime, Float, String, Text
+from sqlalchemy.exc import DBAPIError
+
+from models import Store, DeliveryService
+from franchise import detect_franchise_by_name
+from data_version import bump_version
+
+# storesテーブルのカラム（テーブル定義順）
+STORE_COLUMNS = tuple(column.name for column in Store.__table__.columns)
+
+# ステージングテーブル名（PostgreSQLの一時テーブル）
+_STORES_STAGING = 'stores_staging'
+
+# バッチ処理で導出するカラム（再ロードで上書きしない）
+_DERIVED_COLUMNS = ('brand_key',)
+
+_UPDATE_COLUMNS = tuple(c for c in STORE_COLUMNS if c != 'store_id' and c not in _DERIVED_COLUMNS)
+
+
+class RejectedRow(Exception):
+    """検証に失敗した行"""
+
+
+@dataclass
+class LoadResult:
+    """一括ロードの結果"""
+    loaded: int = 0
+    rejected: int = 0
+    delivery_services: int = 0
+    elapsed: float = 0.0
+    reject_path: Optional[str] = None
+    rejects: List[Dict] = field(default_factory=list, repr=False)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.loaded / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _coerce(column, value):
+    """カラム型に合わせて値を変換する（変換できない場合はRejectedRow）"""
+    if value is None:
+        return None
+
+    column_type = column.type
+    if isinstance(column_type, Boolean):
+        if isinstance(value, str):
+            return value.strip().lower() in ('true', '1', 'yes', 't')
+        return bool(value)
+
+    if isinstance(column_type, Float):
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            raise RejectedRow(f"{column.name}: 数値に変換できません ({value!r})")
+
+    if isinstance(column_type, DateTime):
+        if isinstance(value, datetime):
+            return value
+        try:
+            return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            raise RejectedRow(f"{column.name}: 日時に変換できません ({value!r})")
+
+    if isinstance(value, dict):
+        value = json.dumps(value, ensure_ascii=False)
+    value = str(value)
+
+    if isinstance(column_type, String) and not isinstance(column_type, Text):
+        if column_type.length and len(value) > column_type.length:
+            raise RejectedRow(f"{column.name}: {column_type.length}文字を超えています ({len(value)}文字)")
+    return value
+
+
+def _as_mapping(record) -> Dict:
+    """辞書またはnamedtuple（master_lead_transform.StoreRecord）を辞書として扱う"""
+    if isinstance(record, dict):
+        return record
+    return record._asdict()
+
+
+def prepare_record(record, now: Optional[datetime] = None) -> Tuple[tuple, List[str]]:
+    """レコード（辞書またはStoreRecord）を STORE_COLUMNS 順のタプルとサービス名リストに変換"""
+    now = now or datetime.utcnow()
+    record = _as_mapping(record)
+    values = []
+    for column in Store.__table__.columns:
+        values.append(_coerce(column, record.get(column.name)))
+
+    row = dict(zip(STORE_COLUMNS, values))
+    if not row['store_id']:
+        row['store_id'] = str(uuid.uuid4())
+    if not row['name'] or not row['name'].strip():
+        raise RejectedRow("name: 店舗名が空です")
+    if not row['is_franchise']:
+        row['is_franchise'] = detect_franchise_by_name(row['name'])
+    if row['collected_at'] is None:
+        row['collected_at'] = now
+    if row['updated_at'] is None:
+        row['updated_at'] = now
+
+    services = []
+    for service_name in record.get('delivery_services') or []:
+        if service_name and str(service_name) not in services:
+            services.append(str(service_name))
+    for service_name in services:
+        if len(service_name) > 100:
+            raise RejectedRow(f"delivery_services: 100文字を超えるサービス名があります ({service_name[:20]}…)")
+
+    return tuple(row[c] for c in STORE_COLUMNS), services
+
+
+def _dedupe(prepared: List[Tuple[tuple, List[str], Dict]]):
+    """同一store_idは後勝ちにする（マージと同じ意味論）"""
+    by_id = {}
+    for item in prepared:
+        by_id[item[0][0]] = item
+    return list(by_id.values())
+
+
+# ---------------------------------------------------------------------------
+# SQLite: executemany（INSERT ... ON CONFLICT DO UPDATE）
+# ---------------------------------------------------------------------------
+
+def _sqlite_write(conn, chunk):
+    from sqlalchemy.dialects.sqlite import insert
+
+    stores_table = Store.__table__
+    services_table = DeliveryService.__table__
+
+    stmt = insert(stores_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['store_id'],
+        set_={c: stmt.excluded[c] for c in _UPDATE_COLUMNS},
+    )
+    conn.execute(stmt, [dict(zip(STORE_COLUMNS, row)) for row, _, _ in chunk])
+
+    store_ids = [row[0] for row, _, _ in chunk]
+    conn.execute(services_table.delete().where(services_table.c.store_id.in_(store_ids)))
+
+    now = datetime.utcnow()
+    service_rows = [
+        {
+            'id': uuid.uuid4(),
+            'store_id': row[0],
+            'service_name': service_name,
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for row, services, _ in chunk
+        for service_name in services
+    ]
+    if service_rows:
+        conn.execute(services_table.insert(), service_rows)
+    return len(service_rows)
+
+
+# ---------------------------------------------------------------------------
+# PostgreSQL: COPY → ステージング → INSERT ... SELECT ... ON CONFLICT
+# ---------------------------------------------------------------------------
+
+def _copy_text(value) -> str:
+    """COPY (FORMAT text) 用に値をエスケープ"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _copy_buffer(rows: Iterable[tuple]) -> io.StringIO:
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(_copy_text(v) for v in row))
+        buf.write('\n')
+    buf.seek(0)
+    return buf
+
+
+def _postgres_prepare(conn):
+    conn.exec_driver_sql(
+        f"CREATE TEMP TABLE IF NOT EXISTS {_STORES_STAGING} "
+        f"(LIKE stores INCLUDING DEFAULTS) ON COMMIT DROP"
+    )
+
+
+def _postgres_write(conn, chunk):
+    columns = ', '.join(STORE_COLUMNS)
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        cursor.execute(f"TRUNCATE {_STORES_STAGING}")
+        cursor.copy_expert(
+            f"COPY {_STORES_STAGING} ({columns}) FROM STDIN",
+            _copy_buffer(row for row, _, _ in chunk),
+        )
+        updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in _UPDATE_COLUMNS)
+        cursor.execute(
+            f"INSERT INTO stores ({columns}) SELECT {columns} FROM {_STORES_STAGING} "
+            f"ON CONFLICT (store_id) DO UPDATE SET {updates}"
+        )
+        cursor.execute(
+            f"DELETE FROM delivery_services d USING {_STORES_STAGING} s "
+            f"WHERE d.store_id = s.store_id"
+        )
+
+        now = datetime.utcnow()
+        service_rows = [
+            (uuid.uuid4(), row[0], service_name, True, now, now)
+            for row, services, _ in chunk
+            for service_name in services
+        ]
+        if service_rows:
+            cursor.copy_expert(
+                "COPY delivery_services (id, store_id, service_name, is_active, created_at, updated_at) "
+                "FROM STDIN",
+                _copy_buffer(service_rows),
+            )
+        return len(service_rows)
+    finally:
+        cursor.close()
+
+
+_WRITERS = {
+    'sqlite': (None, _sqlite_write),
+    'postgresql': (_postgres_prepare, _postgres_write),
+}
+
+
+def _write_isolating(conn, writer, chunk, rejects):
+    """セーブポイント内で書き込み、失敗したら二分割して不正な行だけを切り出す"""
+    try:
+        with conn.begin_nested():
+            return len(chunk), writer(conn, chunk)
+    except (DBAPIError, conn.dialect.dbapi.Error) as e:
+        # PostgreSQLの書き込みはドライバーのカーソルを直接使うため、ドライバーの例外のまま届く
+        if len(chunk) == 1:
+            row, _, record = chunk[0]
+            reason = getattr(e, 'orig', None) or e
+            rejects.append(_reject_entry(record, f"DBエラー: {str(reason).strip()}", store_id=row[0]))
+            return 0, 0
+        middle = len(chunk) // 2
+        left = _write_isolating(conn, writer, chunk[:middle], rejects)
+        right = _write_isolating(conn, writer, chunk[middle:], rejects)
+        return left[0] + right[0], left[1] + right[1]
+
+
+def _reject_entry(record, reason, store_id=None):
+    if record is not None:
+        record = _as_mapping(record)
+    return {
+        'store_id': store_id or (record or {}).get('store_id'),
+        'reason': reason,
+        'record': record,
+    }
+
+
+def write_rejects(rejects: List[Dict], reject_path: str):
+    """リジェクトされた行をJSON Linesで書き出す"""
+    with open(reject_path, 'w', encoding='utf-8') as f:
+        for entry in rejects:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str))
+            f.write('\n')
+
+
+def load_stores(engine, records: Iterable, batch_size: int = 5000,
+                reject_path: Optional[str] = None, rejects: Optional[List[Dict]] = None,
+                progress: bool = True) -> LoadResult:
+    """店舗レコードを一括でUPSERTする
+
+    records は STORE_COLUMNS をキーに持つ辞書（任意で 'delivery_services' のリスト）
+    または master_lead_transform.StoreRecord。
+    rejects には変換段階で既に失敗した行を渡せる（リジェクトファイルにまとめて出力される）。
+    """
+    dialect = engine.dialect.name
+    if dialect not in _WRITERS:
+        raise ValueError(f"未対応のデータベースです: {dialect}")
+    if dialect == 'postgresql' and engine.dialect.driver != 'psycopg2':
+        # COPY に psycopg2 の copy_expert を使う
+        raise ValueError(f"PostgreSQLの一括ロードには psycopg2 が必要です（現在のドライバー: {engine.dialect.driver}）")
+    prepare, writer = _WRITERS[dialect]
+
+    result = LoadResult(reject_path=reject_path)
+    rejects = list(rejects or [])
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    prepared = []
+    for record in records:
+        try:
+            row, services = prepare_record(record, now=now)
+            prepared.append((row, services, record))
+        except RejectedRow as e:
+            rejects.append(_reject_entry(record, str(e)))
+    prepared = _dedupe(prepared)
+
+    with engine.begin() as conn:
+        if prepare:
+            prepare(conn)
+        for i in range(0, len(prepared), batch_size):
+            chunk = prepared[i:i + batch_size]
+            loaded, services = _write_isolating(conn, writer, chunk, rejects)
+            result.loaded += loaded
+            result.delivery_services += services
+            if progress:
+                print(f"   {min(i + batch_size, len(prepared))}/{len(prepared)}件ロード完了...")
+        if result.loaded:
+            # 同じトランザクションでstores_versionを上げる（レスポンスキャッシュの無効化）
+            bump_version(conn)
+
+    result.elapsed = time.perf_counter() - started
+    result.rejected = len(rejects)
+    result.rejects = rejects
+    if rejects and reject_path:
+        write_rejects(rejects, reject_path)
+    return result
@@ -0,0 +1,68 @@
+"""都道府県 → 市区町村 のメモリ内インデックス（/api/cities 用）
+
+全都道府県分を1回のGROUP BY（store_queries.cities_by_prefecture_statement）で読み込み、
+データの世代番号（data_version.py）が変わるまでプロセス内で使い回す。
+複数の都道府県を指定されても、インデックスから引くだけでDBには問い合わせない。
+非同期API（async_api.py）からは同期のセッションでスレッドで同じインデックスを使う（作り直しの間は
+スレッドのロックで待たせるため、AsyncSession.run_sync でイベントループのスレッドから呼ばないこと）。
+"""
+import threading
+
+from data_version import get_version_info, version_key
+from regions import PREFECTURES
+from store_queries import cities_by_prefecture_statement, cities_index, cities_response, cities_statement
+
+
+class CityIndex:
+    """世代番号ごとに作り直すインデックス（DBごとに1つ）"""
+
+    def __init__(self):
+        self._entries = {}  # DB URL（ドライバーなし） -> (世代文字列, (by_prefecture, all_cities))
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def get(self, session):
+        """(by_prefecture, all_cities) を返す（世代番号が変わっていれば作り直す）"""
+        info = get_version_info(session)
+        key = version_key(info) if info is not None else None
+        # Flaskと非同期API（async_api.py）で同じインデックスを使うよう、ドライバーを除いたURLで区別する
+        bind_url = session.get_bind().url
+        url = str(bind_url.set(drivername=bind_url.get_backend_name()))
+
+        entry = self._entries.get(url)
+        if key is not None and entry is not None and entry[0] == key:
+            return entry[1]
+
+        # 同時に来たリクエストで何度も作り直さないようにする
+        with self._lock:
+            entry = self._entries.get(url)
+            if key is not None and entry is not None and entry[0] == key:
+                return entry[1]
+            index = cities_index(session.execute(cities_by_prefecture_statement()).all())
+            self.rebuilds += 1
+            # 世代番号が取れない場合（data_versionsテーブルがない等）は保持しない
+            if key is not None:
+                self._entries[url] = (key, index)
+            return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+city_index = CityIndex()
+
+
+def lookup_cities(session, prefectures):
+    """指定した都道府県の市区町村（/api/cities のレスポンス）
+
+    都道府県名以外の文字列（「東京都」など）は従来どおり住所の前方一致で個別に検索する。
+    """
+    by_prefecture, all_cities = city_index.get(session)
+    others = [pref for pref in prefectures if pref not in PREFECTURES]
+    if others:
+        by_prefecture = dict(by_prefecture)
+        for pref in others:
+            rows = session.execute(cities_statement(pref)).all()
+            by_prefecture[pref] = tuple(sorted({row[0] for row in rows if row[0]}))
+    return cities_response(by_prefecture, all_cities, prefectures)
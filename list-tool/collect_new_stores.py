@@ -14,13 +14,9 @@ from bs4 import BeautifulSoup
 # プロジェクトルートをパスに追加
 sys.path.insert(0, str(Path(__file__).parent))
 
-from app import create_app
+from bootstrap import create_cli_app
 from extensions import db
 from models import Store
-import config_local
-import config
-
-config.config['local'] = config_local.LocalConfig
 
 # リクエストヘッダー
 HEADERS = {
@@ -47,27 +43,28 @@ def normalize_phone(raw: str) -> str:
 
 
 def check_store_exists(name: str, address: str = None, url: str = None) -> Optional[Store]:
-    """既存の店舗をチェック（重複防止）"""
-    app = create_app('local')
-    with app.app_context():
-        # 店舗名で検索
-        store = db.session.query(Store).filter(Store.name == name).first()
+    """既存の店舗をチェック（重複防止）
+
+    呼び出し元のアプリコンテキストのセッションで検索する。
+    """
+    # 店舗名で検索
+    store = db.session.query(Store).filter(Store.name == name).first()
+    if store:
+        return store
+    
+    # URLで検索
+    if url:
+        store = db.session.query(Store).filter(Store.url == url).first()
         if store:
             return store
-        
-        # URLで検索
-        if url:
-            store = db.session.query(Store).filter(Store.url == url).first()
-            if store:
-                return store
-        
-        # 住所で検索（部分一致）
-        if address:
-            store = db.session.query(Store).filter(Store.address.like(f'%{address}%')).first()
-            if store:
-                return store
-        
-        return None
+    
+    # 住所で検索（部分一致）
+    if address:
+        store = db.session.query(Store).filter(Store.address.like(f'%{address}%')).first()
+        if store:
+            return store
+    
+    return None
 
 
 def create_store_from_data(data: Dict) -> Store:
@@ -141,7 +138,7 @@ def collect_from_gnavi(area: str = "tokyo", limit: int = 100) -> List[Dict]:
 
 def save_stores(stores: List[Dict], source: str = "manual") -> Dict:
     """収集した店舗データをデータベースに保存"""
-    app = create_app('local')
+    app = create_cli_app('local')
     
     with app.app_context():
         saved = 0
@@ -194,7 +191,7 @@ def collect_batch(sources: List[str] = None, areas: List[str] = None, limit_per_
     if areas is None:
         areas = ['tokyo']  # デフォルトは東京のみ
     
-    app = create_app('local')
+    app = create_cli_app('local')
     
     with app.app_context():
         total_saved = 0
@@ -0,0 +1,151 @@
+"""レスポンスの圧縮（gzip / brotli）
+
+- 通常のレスポンス: COMPRESS_MIN_SIZE バイト以上のテキスト系（JSON・HTML・CSV・JS・CSS）を圧縮する。
+  ETag付きのレスポンス（response_cache.py の世代番号付きJSONなど）は圧縮結果をLRUで保持し、
+  同じ内容を何度も圧縮しない。
+- ストリーミングのレスポンス（CSV/JSONエクスポート）: チャンクごとに圧縮しながら送る。
+- 送信済みのファイル（send_file）や Content-Encoding 付きのレスポンス（assets.py の事前圧縮版）は対象外。
+
+brotli はライブラリ（pip install brotli）があり、クライアントが br を受け付ける場合に使う。
+"""
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 圧縮するContent-Type（text/* はすべて対象）
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/msgpack',
+    'application/xml',
+    'image/svg+xml',
+}
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def choose_encoding(request):
+    """Accept-Encoding から使う圧縮形式を選ぶ（'br' / 'gzip' / None）"""
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level=6, brotli_quality=5):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compress_stream(chunks, encoding, level, brotli_quality):
+    """チャンクの列を圧縮しながら返す"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    # wbits=31: gzip形式（ヘッダー・CRC付き）
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _CompressedCache:
+    """(ETag, 圧縮形式) → 圧縮済みのバイト列（LRU）"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def init_compression(app):
+    """after_request でレスポンスを圧縮する（COMPRESS_ENABLED=False なら何もしない）"""
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    level = app.config.get('COMPRESS_LEVEL', 6)
+    brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 5)
+    cache = _CompressedCache(app.config.get('COMPRESS_CACHE_SIZE', 256))
+
+    @app.after_request
+    def compress_response(response):
+        from flask import request
+
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not is_compressible(response.mimetype)
+        ):
+            return response
+
+        encoding = choose_encoding(request)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, level, brotli_quality)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        body = cache.get((etag, encoding)) if etag else None
+        if body is None:
+            body = compress(data, encoding, level, brotli_quality)
+            if etag:
+                cache.set((etag, encoding), body)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag and not weak:
+            # 圧縮後は元の内容とバイト列が異なるため弱いETagにする（If-None-Matchは弱い比較で判定する）
+            response.set_etag(etag, weak=True)
+        return response
+
+    return compress_response
@@ -36,5 +36,66 @@ class LocalConfig:
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'logs/app.log')
     
+    # 本番サーバー（gunicorn.conf.py）の設定
+    # スレッド数はワーカーあたりの接続プール（pool_size + max_overflow）以下にすること
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', '4'))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '300'))  # 大きなエクスポートでもワーカーを殺さない
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '60'))
+    
+    # APIレスポンスキャッシュ（response_cache.py）
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '1024'))  # 0で無効
+    RESPONSE_CACHE_REDIS = os.getenv('RESPONSE_CACHE_REDIS', '0').lower() in ('1', 'true', 'yes')
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+    
+    # レスポンス圧縮（compression.py）・ビルド済み静的ファイル（build_assets.py / assets.py）
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))  # これより小さいレスポンスは圧縮しない
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))  # gzip
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '5'))
+    COMPRESS_CACHE_SIZE = int(os.getenv('COMPRESS_CACHE_SIZE', '256'))  # ETag付きレスポンスの圧縮結果
+    ASSET_BUILD_DIR = os.getenv('ASSET_BUILD_DIR', str(Path(__file__).parent / 'static_build'))
+    
+    # 性能計測（metrics.py）: /api/metrics と Server-Timing ヘッダー
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    
+    # 遅いクエリの記録（slow_query.py）: SLOW_QUERY_MS 以上のSQLを実行計画付きで記録（0で無効）
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+    SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', '1').lower() in ('1', 'true', 'yes')
+    SLOW_QUERY_KEEP = int(os.getenv('SLOW_QUERY_KEEP', '200'))  # /api/admin/slow-queries で見られる件数（プロセスごと）
+    SLOW_QUERY_LOG_FILE = os.getenv('SLOW_QUERY_LOG_FILE', 'logs/slow_queries.log')
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    SLOW_QUERY_LOG_BACKUP_COUNT = int(os.getenv('SLOW_QUERY_LOG_BACKUP_COUNT', '5'))
+    
+    # プロファイラー（profiling.py）: X-Profile ヘッダーでリクエストを計測（DEBUG/TESTING の設定のみ）
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '1'))
+    
+    # 同時実行数の制限（admission.py）: 上限を超えたら待ち行列で待ち、満杯なら429（プロセスごと）
+    # 上限の合計はワーカーあたりのスレッド数・接続プールより小さくして、軽いリクエストの分を残すこと
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    ADMISSION_QUEUE_TIMEOUT_MS = float(os.getenv('ADMISSION_QUEUE_TIMEOUT_MS', '2000'))  # 待ち行列で待つ上限
+    ADMISSION_EXPORT_CONCURRENCY = int(os.getenv('ADMISSION_EXPORT_CONCURRENCY', '2'))  # 0で制限しない
+    ADMISSION_EXPORT_QUEUE = int(os.getenv('ADMISSION_EXPORT_QUEUE', '2'))
+    ADMISSION_STATS_CONCURRENCY = int(os.getenv('ADMISSION_STATS_CONCURRENCY', '4'))
+    ADMISSION_STATS_QUEUE = int(os.getenv('ADMISSION_STATS_QUEUE', '8'))
+    ADMISSION_SEARCH_CONCURRENCY = int(os.getenv('ADMISSION_SEARCH_CONCURRENCY', '8'))
+    ADMISSION_SEARCH_QUEUE = int(os.getenv('ADMISSION_SEARCH_QUEUE', '16'))
+    
+    # 同じ計算の同時実行をまとめる（singleflight.py）: 実行中の同じキーの計算の結果を待って共有する
+    SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    SINGLE_FLIGHT_REDIS = os.getenv('SINGLE_FLIGHT_REDIS', '0').lower() in ('1', 'true', 'yes')  # ワーカー間もまとめる
+    SINGLE_FLIGHT_WAIT_MS = int(os.getenv('SINGLE_FLIGHT_WAIT_MS', '30000'))  # これを超えたら自分で計算する
+    SINGLE_FLIGHT_LOCK_TIMEOUT_MS = int(os.getenv('SINGLE_FLIGHT_LOCK_TIMEOUT_MS', '60000'))  # Redisのロックの有効期限
+    
+    # バックグラウンドのエクスポートジョブ（export_jobs.py）: /api/export-jobs
+    EXPORT_JOBS_ENABLED = os.getenv('EXPORT_JOBS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    EXPORT_JOB_DIR = os.getenv('EXPORT_JOB_DIR', '')  # 空なら OUTPUT_DIR/exports（ワーカー間で共有できる場所にすること）
+    EXPORT_JOB_WORKERS = int(os.getenv('EXPORT_JOB_WORKERS', '2'))  # プロセスあたりの同時作成数
+    EXPORT_JOB_TTL = int(os.getenv('EXPORT_JOB_TTL', '3600'))  # 完成したファイルを残す秒数
+    
+    # 集計用の列指向スナップショット（プロセス内・NumPy、stats・facets・categories・brands を配列で集計）
+    STORE_SNAPSHOT_ENABLED = os.getenv('STORE_SNAPSHOT_ENABLED', '0').lower() in ('1', 'true', 'yes')
+    
     DEBUG = True
     TESTING = False
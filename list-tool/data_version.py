@@ -0,0 +1,107 @@
+"""データの世代番号（stores_version）
+
+店舗データを書き込む処理はすべて、同じトランザクション内で data_versions の
+世代番号を+1する。レスポンスキャッシュ（response_cache.py）はこの番号をキーに含めるため、
+書き込みがコミットされた時点で古いキャッシュは参照されなくなる（期限切れを待たない）。
+
+- ORM経由の変更: models.py の after_flush イベントで自動的に+1
+- 一括処理（bulk_loader / franchise / brands / import_old_data など）: bump_version() を明示的に呼ぶ
+"""
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from models import DataVersion
+
+STORES = 'stores'
+
+_table = DataVersion.__table__
+
+# テーブル作成・初期行の挿入を済ませた (DB URL, name)
+_initialized = set()
+
+
+def initialize(conn, name=STORES):
+    """テーブルと初期行（世代0）を用意する（作成済みなら何もしない）"""
+    key = (str(conn.engine.url), name)
+    if key in _initialized:
+        return
+    _table.create(conn, checkfirst=True)
+    if conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    conn.execute(
+        dialect_insert(_table)
+        .values(name=name, version=0, updated_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=['name'])
+    )
+    _initialized.add(key)
+
+
+def bump_version(conn, name=STORES):
+    """世代番号を+1する（呼び出し元のトランザクション内で実行される）"""
+    initialize(conn, name)
+    conn.execute(
+        update(_table)
+        .where(_table.c.name == name)
+        .values(version=_table.c.version + 1, updated_at=datetime.utcnow())
+    )
+
+
+def _select_version(conn, name, *columns):
+    try:
+        return conn.execute(select(*columns).where(_table.c.name == name)).first()
+    except (OperationalError, ProgrammingError) as e:
+        if 'no such table' in str(e).lower() or 'does not exist' in str(e).lower():
+            # PostgreSQLではエラー後のトランザクションが使えなくなるため戻しておく
+            conn.rollback()
+            return False
+        raise
+
+
+def get_version(conn, name=STORES):
+    """現在の世代番号（テーブルがなければNone）
+
+    conn は Connection または Session。
+    """
+    row = _select_version(conn, name, _table.c.version)
+    if row is False:
+        return None
+    return row[0] if row else 0
+
+
+def get_version_info(conn, name=STORES):
+    """(世代番号, 最終更新日時) を返す（テーブルがなければNone）"""
+    row = _select_version(conn, name, _table.c.version, _table.c.updated_at)
+    if row is False:
+        return None
+    if not row:
+        return 0, None
+    return row[0], row[1]
+
+
+def version_key(info):
+    """キャッシュキー・ETag用の世代文字列
+
+    番号に最終更新時刻を加えることで、DBをバックアップから戻して番号が巻き戻った場合でも
+    戻す前の同じ番号のキャッシュ（Redisに残っているもの）とは一致しない。
+    """
+    version, updated_at = info
+    return f"{version}.{updated_at:%Y%m%d%H%M%S%f}" if updated_at else str(version)
+
+
+# sqlite3モジュールを直接使う処理（import_old_data.py）用
+SQLITE3_BUMP_STATEMENTS = (
+    "CREATE TABLE IF NOT EXISTS data_versions ("
+    "name VARCHAR(50) NOT NULL PRIMARY KEY, version INTEGER NOT NULL, updated_at DATETIME)",
+    "INSERT OR IGNORE INTO data_versions (name, version, updated_at) VALUES (:name, 0, CURRENT_TIMESTAMP)",
+    "UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = :name",
+)
+
+
+def bump_version_sqlite3(conn, name=STORES):
+    """sqlite3.Connection で世代番号を+1する"""
+    for statement in SQLITE3_BUMP_STATEMENTS:
+        conn.execute(statement, {'name': name})
@@ -8,33 +8,28 @@ from datetime import datetime
 # プロジェクトルートをパスに追加
 sys.path.insert(0, str(Path(__file__).parent))
 
-from app import create_app
+from bootstrap import create_cli_app
+from profiling import add_profile_argument, profiled, set_script_profile
 from extensions import db
 from models import Store
 from sqlalchemy import func, and_, or_
-import config_local
-import config
-
-config.config['local'] = config_local.LocalConfig
 
 
 def get_stores_to_enrich(limit=100):
-    """補完が必要な店舗を取得"""
-    app = create_app('local')
-    with app.app_context():
-        stores = db.session.query(Store).filter(
-            and_(
-                Store.opening_date.isnot(None),
-                Store.url.isnot(None), Store.url != '',
-                or_(
-                    Store.phone.is_(None), Store.phone == '',
-                    Store.closed_day.is_(None), Store.closed_day == '',
-                    Store.business_hours.is_(None), Store.business_hours == '',
-                    Store.transport.is_(None), Store.transport == ''
-                )
+    """補完が必要な店舗を取得（呼び出し元のアプリコンテキストのセッションを使う）"""
+    stores = db.session.query(Store).filter(
+        and_(
+            Store.opening_date.isnot(None),
+            Store.url.isnot(None), Store.url != '',
+            or_(
+                Store.phone.is_(None), Store.phone == '',
+                Store.closed_day.is_(None), Store.closed_day == '',
+                Store.business_hours.is_(None), Store.business_hours == '',
+                Store.transport.is_(None), Store.transport == ''
             )
-        ).limit(limit).all()
-        return stores
+        )
+    ).limit(limit).all()
+    return stores
 
 
 def enrich_store_details(store):
@@ -66,9 +61,10 @@ def enrich_store_details(store):
         return False
 
 
+@profiled()
 def enrich_batch(limit=100, delay=1.0):
     """バッチで補完処理を実行"""
-    app = create_app('local')
+    app = create_cli_app('local')
     
     with app.app_context():
         # 補完が必要な件数を取得
@@ -161,8 +157,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='店舗データの補完処理')
     parser.add_argument('--limit', type=int, default=100, help='1回あたりの処理件数')
     parser.add_argument('--delay', type=float, default=1.0, help='処理間隔（秒）')
+    add_profile_argument(parser)
     
     args = parser.parse_args()
+    set_script_profile(args.profile)
     
     enrich_batch(limit=args.limit, delay=args.delay)
 
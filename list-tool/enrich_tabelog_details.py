@@ -13,14 +13,11 @@ from bs4 import BeautifulSoup
 # プロジェクトルートをパスに追加
 sys.path.insert(0, str(Path(__file__).parent))
 
-from app import create_app
+from bootstrap import create_cli_app, get_config
+from profiling import add_profile_argument, profiled, set_script_profile
 from extensions import db
 from models import Store
 from sqlalchemy import func, and_, or_
-import config_local
-import config
-
-config.config['local'] = config_local.LocalConfig
 
 # リクエストヘッダー
 HEADERS = {
@@ -123,10 +120,8 @@ def extract_from_tabelog(soup: BeautifulSoup) -> Dict[str, str]:
 def send_slack_notification(message: str, webhook_url: str = None):
     """Slackに通知を送信"""
     if not webhook_url:
-        # 設定から取得
-        app = create_app('local')
-        with app.app_context():
-            webhook_url = app.config.get('SLACK_WEBHOOK_URL', '')
+        # 設定から取得（アプリは作らない）
+        webhook_url = getattr(get_config('local'), 'SLACK_WEBHOOK_URL', '')
     
     if not webhook_url:
         return False
@@ -192,12 +187,13 @@ def enrich_store_from_tabelog(store: Store) -> bool:
         return False
 
 
+@profiled()
 def enrich_batch(limit=100, delay=2.0, max_rounds=None, prefecture: Optional[str] = None):
     """バッチで補完処理を実行
 
     prefecture が指定された場合は、住所の先頭がその都道府県名の店舗に限定して補完を行う。
     """
-    app = create_app('local')
+    app = create_cli_app('local')
     
     with app.app_context():
         # Slack Webhook URLを取得
@@ -465,8 +461,10 @@ if __name__ == "__main__":
         default=None,
         help="対象とする都道府県名（例: 福岡）。指定しない場合は全国が対象。",
     )
+    add_profile_argument(parser)
 
     args = parser.parse_args()
+    set_script_profile(args.profile)
 
     enrich_batch(
         limit=args.limit,
@@ -1,11 +1,15 @@
 """
-全店舗データをJSON形式でエクスポートするスクリプト
+全店舗データをJSON形式（またはParquet形式）でエクスポートするスクリプト
 
 使用方法:
-    python export_all_stores_json.py [--output <output-file>] [--config local|default]
+    python export_all_stores_json.py [--output <output-file>] [--config local|default] [--format json|parquet]
 
 例:
     python export_all_stores_json.py --output stores_export.json --config local
+    python export_all_stores_json.py --format parquet
+
+Parquetは列ごとに圧縮した分析用の形式で、JSONより大幅に小さく、pandas.read_parquet で
+すぐに読み込める（prefecture・city・category・data_source はcategory型になる）。pyarrowが必要。
 """
 
 import sys
@@ -18,14 +22,9 @@ from pathlib import Path
 # プロジェクトルートをパスに追加
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import create_app
+from bootstrap import create_cli_app
 from extensions import db
 from models import Store
-import config_local
-import config
-
-# 設定を登録
-config.config['local'] = config_local.LocalConfig
 
 
 def export_all_stores(app, output_file):
@@ -76,6 +75,46 @@ def export_all_stores(app, output_file):
             sys.exit(1)
 
 
+def export_all_stores_parquet(app, output_file):
+    """全店舗データをParquet形式でエクスポート（行グループごとに読み込み・書き出し）"""
+    from store_exports import PARQUET_ROW_GROUP_SIZE, iter_parquet, iter_store_columns, pa
+    
+    if pa is None:
+        print("❌ pyarrowライブラリがインストールされていません（pip install pyarrow）")
+        sys.exit(1)
+    
+    with app.app_context():
+        print(f"📊 データベースから店舗データを取得中（{PARQUET_ROW_GROUP_SIZE}件ずつ）...")
+        
+        try:
+            total = db.session.query(Store).count()
+            written = 0
+            
+            def report(rows):
+                nonlocal written
+                written += rows
+                print(f"   {written}/{total}件書き出し完了...")
+            
+            with open(output_file, 'wb') as f:
+                batches = iter_store_columns(db.session.query(Store).order_by(Store.store_id))
+                for chunk in iter_parquet(batches, on_batch=report):
+                    f.write(chunk)
+            
+            file_size = os.path.getsize(output_file)
+            print("✅ エクスポートが完了しました")
+            print(f"   - ファイル: {output_file}")
+            print(f"   - 総店舗数: {written}件")
+            print(f"   - ファイルサイズ: {file_size / 1024 / 1024:.2f}MB")
+            
+            return output_file
+            
+        except Exception as e:
+            print(f"❌ エラーが発生しました: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='全店舗データをJSON形式でエクスポート'
@@ -83,8 +122,8 @@ def main():
     parser.add_argument(
         '--output',
         type=str,
-        default='stores_export.json',
-        help='出力ファイル名 (デフォルト: stores_export.json)'
+        default=None,
+        help='出力ファイル名 (デフォルト: stores_export.json / stores_export.parquet)'
     )
     parser.add_argument(
         '--config',
@@ -93,16 +132,23 @@ def main():
         choices=['local', 'default', 'development', 'production'],
         help='使用する設定 (デフォルト: local)'
     )
+    parser.add_argument(
+        '--format',
+        type=str,
+        default='json',
+        choices=['json', 'parquet'],
+        help='出力形式 (デフォルト: json。parquet は分析用の列形式、pyarrowが必要)'
+    )
     
     args = parser.parse_args()
     
     # 出力ファイルのパスを解決
-    output_file = Path(args.output)
+    output_file = Path(args.output or f"stores_export.{args.format}")
     if not output_file.is_absolute():
         output_file = Path(__file__).parent / output_file
     
     print("=" * 60)
-    print("店舗データ JSONエクスポート")
+    print(f"店舗データ {'Parquet' if args.format == 'parquet' else 'JSON'}エクスポート")
     print("=" * 60)
     print(f"設定: {args.config}")
     print(f"出力ファイル: {output_file}")
@@ -110,10 +156,13 @@ def main():
     print("")
     
     # アプリケーションを作成
-    app = create_app(args.config)
+    app = create_cli_app(args.config)
     
     try:
-        export_all_stores(app, str(output_file))
+        if args.format == 'parquet':
+            export_all_stores_parquet(app, str(output_file))
+        else:
+            export_all_stores(app, str(output_file))
         
         print("")
         print("=" * 60)
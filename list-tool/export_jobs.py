@@ -0,0 +1,402 @@
+"""バックグラウンドのエクスポートジョブ（作成 → 進捗の確認 → ダウンロード）
+
+/api/export/csv などはリクエストの中でファイル全体を作るため、大きなエクスポートはプロキシやngrokの
+タイムアウトに掛かり、やり直すと最初からになる。ジョブAPIではファイルをスレッドプールで作成し、
+クライアントは進捗（書き出した件数・残り時間の目安）を確認してから、完成したファイルを
+Range 付きでダウンロードする（途中で切れても続きから再開できる）。
+
+- ジョブIDは「形式・絞り込み条件（FilterSpec.cache_key）・stores_version」から決まるため、
+  同じ条件のエクスポートが同時に要求されても1つのジョブにまとまる（データが更新されれば別のジョブになる）。
+  世代番号が取れない（data_versionsテーブルがない）場合はデータの更新が分からないため、まとめない
+- ジョブの状態は EXPORT_JOB_DIR の <ID>.json に保存する。同じホストのgunicornワーカー間で共有され、
+  どのワーカーでも進捗の確認とダウンロードができる
+- 完成したファイルは EXPORT_JOB_TTL 秒後に削除する。作成中のワーカーが落ちて状態が更新されなくなった
+  ジョブは失敗として扱い、同じ条件で作り直せる（スレッドプールの空きを待っている間も、作成を受け付けた
+  ワーカーが状態ファイルを更新する）
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 形式 → (拡張子, MIMEタイプ)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'json': ('json', 'application/json; charset=utf-8'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# 状態ファイルを更新する間隔
+_HEARTBEAT_SECONDS = 1.0
+# これ以上状態が更新されない作成中のジョブは、作成していたワーカーが落ちたとみなす
+_STALE_SECONDS = 120
+
+
+def job_id_for(fmt, filter_key, version_key):
+    return hashlib.sha1(f"{fmt}:{version_key}:{filter_key}".encode('utf-8')).hexdigest()[:24]
+
+
+def _now():
+    return time.time()
+
+
+class ExportJobManager:
+    """エクスポートジョブの作成・状態の読み書き・期限切れファイルの削除"""
+
+    def __init__(self, app, directory, workers=2, ttl=3600):
+        self.app = app
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export-job')
+        self._lock = threading.Lock()
+
+    # -- ファイル ------------------------------------------------------------
+
+    def _meta_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def file_path(self, job):
+        return os.path.join(self.directory, f"{job['id']}.{EXPORT_FORMATS[job['format']][0]}")
+
+    def _part_path(self, job):
+        # 作成途中のファイルは世代ごとに分ける（作り直した新しい世代と同じファイルに書かない）
+        return f"{self.file_path(job)}.{int(job['created_at'] * 1000000)}.part"
+
+    def load(self, job_id):
+        """ジョブの状態（なければNone）。作成中のまま更新が止まったジョブは failed にする"""
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._meta_path(job_id), encoding='utf-8') as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if job['status'] in ('queued', 'running') and _now() - job['updated_at'] > _STALE_SECONDS:
+            job['status'] = 'failed'
+            job['error'] = 'エクスポートを作成していたプロセスが停止しました'
+        return job
+
+    def _save(self, job):
+        job['updated_at'] = _now()
+        path = self._meta_path(job['id'])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _owns(self, job):
+        """状態ファイルがこの世代（created_at）のジョブのものか（片付けられて作り直されていればFalse）"""
+        try:
+            with open(self._meta_path(job['id']), encoding='utf-8') as f:
+                return json.load(f)['created_at'] == job['created_at']
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _tombstone_path(self, job):
+        # 作成日時でジョブの世代（同じIDで作り直した回）を区別する
+        return os.path.join(self.directory, f"{job['id']}.{int(job['created_at'] * 1000000)}.retired")
+
+    def _retire(self, job):
+        """load() で読んだ世代のジョブを片付ける。片付けたのが自分ならTrue
+
+        同じ世代の片付けは、その世代の墓標ファイルを排他的に作れた1つのプロセスだけが行う。
+        他のワーカーが片付けて作り直した新しい状態ファイルを、古い状態を読んだワーカーが消さないようにするため。
+        状態ファイルは墓標に移し（os.replace）、墓標は cleanup() が ttl 秒後に消す。
+        """
+        tombstone = self._tombstone_path(job)
+        try:
+            os.close(os.open(tombstone, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        try:
+            os.replace(self._meta_path(job['id']), tombstone)
+        except FileNotFoundError:
+            pass
+        for path in (self.file_path(job), self._part_path(job)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def cleanup(self):
+        """期限切れのジョブ（完成後 ttl 秒・失敗後 ttl 秒）のファイルを削除する。削除した件数を返す"""
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.retired'):
+                try:
+                    if _now() - entry.stat().st_mtime > self.ttl:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            if not entry.name.endswith('.json'):
+                continue
+            job = self.load(entry.name[:-len('.json')])
+            if job is None or job['status'] in ('queued', 'running'):
+                continue
+            if _now() - (job.get('finished_at') or job['updated_at']) > self.ttl and self._retire(job):
+                removed += 1
+        return removed
+
+    # -- ジョブ --------------------------------------------------------------
+
+    def submit(self, fmt, spec, version_key):
+        """ジョブを作成してバックグラウンドで開始する。戻り値は (ジョブ, 新規に作成したか)
+
+        同じ条件・同じ世代のジョブが作成中・完成済みならそれを返す。
+        version_key がNone（世代番号が取れない）ならまとめずに新しいジョブを作る。
+        """
+        if version_key is None:
+            version_key = f"unversioned:{uuid.uuid4().hex}"
+        job_id = job_id_for(fmt, spec.cache_key, version_key)
+        self.cleanup()
+        with self._lock:
+            job = self.load(job_id)
+            if job is not None and job['status'] in ('queued', 'running', 'done'):
+                return job, False
+            # 失敗したジョブは片付けてから作り直す。他のワーカーが先に片付けていれば、その作り直したジョブを返す
+            if job is not None and not self._retire(job):
+                return self._wait_for_meta(job_id, retired=job), False
+            # 他のワーカーと同時に作成しないよう、状態ファイルを排他的に作る
+            if not self._claim(job_id):
+                return self._wait_for_meta(job_id), False
+
+            now = _now()
+            job = {
+                'id': job_id,
+                'format': fmt,
+                'filters': asdict(spec),
+                'status': 'queued',
+                'rows_written': 0,
+                'total_rows': None,
+                'size': None,
+                'error': None,
+                'created_at': now,
+                'started_at': None,
+                'finished_at': None,
+                'updated_at': now,
+            }
+            self._save(job)
+        # 空きを待っている間も状態ファイルを更新し、停止したワーカーのジョブと区別する
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, stop), daemon=True)
+        heartbeat.start()
+        self._executor.submit(self._run, job, spec, heartbeat, stop)
+        return job, True
+
+    def _claim(self, job_id):
+        try:
+            os.close(os.open(self._meta_path(job_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            return False
+
+    def _wait_for_meta(self, job_id, timeout=2.0, retired=None):
+        """他のワーカーが作成中の状態ファイルを読む（書き込みが終わるまで少し待つ）
+
+        retired を渡すと、片付けられる前のその世代の状態は読み飛ばす。
+        """
+        deadline = _now() + timeout
+        while _now() < deadline:
+            job = self.load(job_id)
+            if job is not None and (retired is None or job['created_at'] != retired['created_at']):
+                return job
+            time.sleep(0.05)
+        raise RuntimeError(f"エクスポートジョブ {job_id} の状態を読み込めません")
+
+    def _heartbeat(self, job, stop):
+        """待機中・作成中は状態ファイルを定期的に更新する（Excelの保存など件数が増えない間も）"""
+        while not stop.wait(_HEARTBEAT_SECONDS):
+            if not self._owns(job):
+                return
+            self._save(job)
+
+    def _run(self, job, spec, heartbeat, stop):
+        from extensions import db
+        from models import Store
+        from store_exports import (
+            iter_csv, iter_json, iter_parquet, iter_store_columns, iter_stores, json_export_query, write_excel,
+        )
+
+        path = self.file_path(job)
+        part_path = self._part_path(job)
+        owned = True
+        with self.app.app_context():
+            try:
+                if not self._owns(job):
+                    # 待っている間に片付けられて作り直された（新しい世代のジョブに任せる）
+                    owned = False
+                    return
+                job['status'] = 'running'
+                job['started_at'] = _now()
+                self._save(job)
+                query = db.session.query(Store).filter(*spec.conditions())
+                job['total_rows'] = query.order_by(None).count()
+
+                if job['format'] == 'parquet':
+                    with open(part_path, 'wb') as f:
+                        for chunk in iter_parquet(iter_store_columns(query), on_batch=self._row_counter(job)):
+                            f.write(chunk)
+                else:
+                    if job['format'] == 'json':
+                        query = json_export_query(query)
+                    stores = self._count_rows(job, iter_stores(query))
+                    if job['format'] == 'excel':
+                        with open(part_path, 'wb') as f:
+                            write_excel(stores, f)
+                    else:
+                        chunks = iter_csv(stores) if job['format'] == 'csv' else iter_json(stores)
+                        with open(part_path, 'w', encoding='utf-8', newline='') as f:
+                            for chunk in chunks:
+                                f.write(chunk)
+                # 作成中に片付けられて作り直された場合は、完成したファイルを置かない
+                if not self._owns(job):
+                    owned = False
+                    try:
+                        os.remove(part_path)
+                    except FileNotFoundError:
+                        pass
+                    return
+                os.replace(part_path, path)
+
+                job['status'] = 'done'
+                job['size'] = os.path.getsize(path)
+            except Exception as e:
+                logger.exception(f"エクスポートジョブ {job['id']} に失敗しました")
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                try:
+                    os.remove(part_path)
+                except FileNotFoundError:
+                    pass
+            finally:
+                stop.set()
+                heartbeat.join()
+                if owned:
+                    job['finished_at'] = _now()
+                    self._save(job)
+                else:
+                    logger.info(f"エクスポートジョブ {job['id']} は作り直されたため、古い世代の作成を中止しました")
+
+    @staticmethod
+    def _count_rows(job, stores):
+        """書き出した件数を数える（状態ファイルへの保存は _heartbeat）"""
+        for store in stores:
+            yield store
+            job['rows_written'] += 1
+
+    @staticmethod
+    def _row_counter(job):
+        """Parquetの行グループを書き出すたびに件数を加える（iter_parquet の on_batch）"""
+        def add(rows):
+            job['rows_written'] += rows
+        return add
+
+    def describe(self, job):
+        """APIで返す形（進捗・残り時間の目安・ダウンロードURL）"""
+        data = {key: job[key] for key in ('id', 'format', 'filters', 'status', 'rows_written', 'total_rows',
+                                          'size', 'error')}
+        for key in ('created_at', 'started_at', 'finished_at'):
+            data[key] = datetime.fromtimestamp(job[key]).isoformat(timespec='seconds') if job[key] else None
+
+        total = job['total_rows']
+        written = job['rows_written']
+        data['progress'] = 1.0 if job['status'] == 'done' else (
+            round(written / total, 4) if total else 0.0)
+        data['eta_seconds'] = None
+        if job['status'] == 'running' and job['started_at'] and written and total:
+            rate = written / max(_now() - job['started_at'], 1e-6)
+            data['eta_seconds'] = round((total - written) / rate, 1)
+        if job['status'] == 'done':
+            data['download_url'] = f"/api/export-jobs/{job['id']}/download"
+            data['expires_at'] = datetime.fromtimestamp(job['finished_at'] + self.ttl).isoformat(timespec='seconds')
+        return data
+
+
+# ---------------------------------------------------------------------------
+# Flask
+# ---------------------------------------------------------------------------
+
+def init_export_jobs(app):
+    """/api/export-jobs（作成・状態・ダウンロード）を登録する（EXPORT_JOBS_ENABLED=False なら何もしない）"""
+    if not app.config.get('EXPORT_JOBS_ENABLED', True):
+        return None
+
+    from flask import abort, jsonify, request, send_file, url_for
+
+    directory = app.config.get('EXPORT_JOB_DIR') or os.path.join(app.config.get('OUTPUT_DIR', 'out'), 'exports')
+    manager = ExportJobManager(
+        app, os.path.abspath(directory),
+        workers=app.config.get('EXPORT_JOB_WORKERS', 2),
+        ttl=app.config.get('EXPORT_JOB_TTL', 3600),
+    )
+    app.extensions['export_jobs'] = manager
+
+    @app.route("/api/export-jobs", methods=['POST'])
+    def create_export_job():
+        """エクスポートジョブの作成（format と /api/stores と同じ絞り込み条件をクエリかフォームで指定）"""
+        try:
+            from data_version import get_version_info, version_key
+            from extensions import db
+            from store_filters import FilterSpec
+
+            fmt = request.values.get('format', 'csv')
+            if fmt not in EXPORT_FORMATS:
+                return jsonify({"error": f"formatは {', '.join(EXPORT_FORMATS)} のいずれかを指定してください"}), 400
+            if fmt == 'excel':
+                try:
+                    import openpyxl  # noqa: F401
+                except ImportError:
+                    return jsonify({"error": "openpyxlライブラリがインストールされていません。"}), 500
+            if fmt == 'parquet':
+                from store_exports import pa
+                if pa is None:
+                    return jsonify({"error": "pyarrowライブラリがインストールされていません。"}), 500
+
+            info = get_version_info(db.session)
+            job, created = manager.submit(fmt, FilterSpec.from_args(request.values),
+                                          version_key(info) if info is not None else None)
+            response = jsonify(manager.describe(job))
+            response.status_code = 202 if created else 200
+            response.headers['Location'] = url_for('get_export_job', job_id=job['id'])
+            return response
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/export-jobs/<job_id>")
+    def get_export_job(job_id):
+        """ジョブの状態（status: queued / running / done / failed、書き出した件数・残り時間の目安）"""
+        job = manager.load(job_id)
+        if job is None:
+            return jsonify({"error": "ジョブが見つかりません（期限切れの可能性があります）"}), 404
+        return jsonify(manager.describe(job))
+
+    @app.route("/api/export-jobs/<job_id>/download")
+    def download_export_job(job_id):
+        """完成したファイル（Range 指定で途中から再開できる）"""
+        job = manager.load(job_id)
+        if job is None:
+            abort(404)
+        if job['status'] != 'done':
+            return jsonify({"error": "エクスポートはまだ完了していません", "status": job['status']}), 409
+        path = manager.file_path(job)
+        if not os.path.isfile(path):
+            abort(404)
+        extension, mimetype = EXPORT_FORMATS[job['format']]
+        return send_file(
+            path, mimetype=mimetype, as_attachment=True, download_name=f"stores_export.{extension}",
+            conditional=True, etag=job['id'],
+        )
+
+    return manager
@@ -1,7 +1,11 @@
 """Flask拡張機能の初期化"""
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 
 # 循環参照を避けるため、extensions.pyでdbインスタンスを初期化
 db = SQLAlchemy()
-migrate = Migrate()
+
+
+def init_migrate(app):
+    """Flask-Migrateを初期化（alembicのimportが重いため、create_app()からのみ呼び出す）"""
+    from flask_migrate import Migrate
+    return Migrate(app, db)
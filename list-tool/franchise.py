@@ -0,0 +1,241 @@
+"""フランチャイズ（チェーン店）判定
+
+既知のチェーンブランド名と「支店」「号店」などのキーワードを1つのAho-Corasickオートマトンに
+まとめ、店名を1回走査するだけで判定する。判定ロジックは以下の順で適用する。
+
+1. 「本店」を含む店名はフランチャイズではない
+2. 既知ブランド名・キーワード（支店/号店/チェーン）を含む店名はフランチャイズ。
+   短いブランド名（3文字以下）は別の語の一部でない場合だけ数える（「ガストロノミー」のガスト、
+   「松屋銀座 レストラン街」の松屋は数えない）。店名の先頭か区切り文字の後から始まり、
+   直後が店名の末尾・区切り文字・「店」で終わる支店名（例: 松屋 羽生店・松屋羽生店）であること
+3. 末尾が「店」で終わる店名もフランチャイズ候補とみなす（例: ○○羽生店）
+
+既存データへの反映は tag_franchise_stores() でstore_idのキーセット順にストリーミング処理し、
+バッチごとに UPDATE ... WHERE store_id IN (...) を発行する。
+新規挿入時は models.py のイベント、bulk_loader、import_old_data から自動で判定される。
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# フランチャイズを示すキーワード
+FRANCHISE_KEYWORDS = ("支店", "号店", "チェーン")
+
+# 除外キーワード（本店は直営の1号店とみなす）
+EXCLUDE_KEYWORDS = ("本店",)
+
+# これ以下の長さのブランド名は、別の語の一部でない場合だけ一致とみなす
+SHORT_BRAND_LENGTH = 3
+
+# ブランド名の前後の区切りとみなす文字
+_SEPARATORS = frozenset(" \u3000・/／|｜()（）[]［］「」『』【】<>〈〉-－―~〜:：,、.。")
+
+# 既知のチェーンブランド名（表記ゆれは別エントリとして登録する）
+KNOWN_CHAIN_BRANDS = (
+    # ファストフード
+    "マクドナルド", "モスバーガー", "ケンタッキー", "ロッテリア", "バーガーキング",
+    "フレッシュネスバーガー", "サブウェイ", "ファーストキッチン",
+    # 牛丼・定食
+    "すき家", "吉野家", "松屋", "なか卯", "やよい軒", "大戸屋", "松のや",
+    # ラーメン・うどん・そば
+    "丸亀製麺", "はなまるうどん", "日高屋", "幸楽苑", "天下一品", "一蘭", "一風堂",
+    "スガキヤ", "リンガーハット", "富士そば", "ゆで太郎", "来来亭", "魁力屋",
+    # 寿司
+    "スシロー", "くら寿司", "はま寿司", "かっぱ寿司", "魚べい", "元気寿司",
+    # ファミリーレストラン
+    "ガスト", "サイゼリヤ", "ジョナサン", "バーミヤン", "デニーズ", "ロイヤルホスト",
+    "ココス", "ジョイフル", "びっくりドンキー", "ステーキガスト", "夢庵",
+    # カレー・中華・焼肉
+    "CoCo壱番屋", "ココイチ", "餃子の王将", "大阪王将", "牛角", "焼肉きんぐ",
+    "安楽亭", "叙々苑",
+    # 居酒屋
+    "鳥貴族", "磯丸水産", "白木屋", "魚民", "笑笑", "和民", "塚田農場", "串カツ田中",
+    "やきとり大吉", "世界の山ちゃん", "かまどか",
+    # カフェ・ドーナツ
+    "スターバックス", "ドトール", "タリーズ", "コメダ珈琲", "エクセルシオール",
+    "サンマルクカフェ", "ミスタードーナツ", "星乃珈琲", "上島珈琲",
+    # ピザ・弁当
+    "ドミノ・ピザ", "ピザハット", "ピザーラ", "ほっともっと", "ほっかほっか亭",
+    "オリジン弁当", "キッチンオリジン",
+)
+
+
+class AhoCorasick:
+    """複数パターンを1回の走査で検出するAho-Corasickオートマトン"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[str, ...]] = [()]
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        if pattern not in self._output[state]:
+            self._output[state] = self._output[state] + (pattern,)
+
+    def _build(self):
+        # ルート直下の状態の失敗遷移はルート（0）のまま
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter(self, text: str):
+        """(終了位置, パターン) を出現順に返す"""
+        state = 0
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern in output[state]:
+                yield i, pattern
+
+
+class FranchiseMatcher:
+    """ブランド名・キーワード・除外語をまとめてコンパイルした判定器"""
+
+    def __init__(self, brands: Iterable[str] = KNOWN_CHAIN_BRANDS,
+                 keywords: Iterable[str] = FRANCHISE_KEYWORDS,
+                 excludes: Iterable[str] = EXCLUDE_KEYWORDS):
+        self.brands = frozenset(brands)
+        self.keywords = frozenset(keywords)
+        self.excludes = frozenset(excludes)
+        self._automaton = AhoCorasick(list(self.brands) + list(self.keywords) + list(self.excludes))
+
+    def match(self, name: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """(フランチャイズか, 一致したブランド名) を返す"""
+        if not name:
+            return False, None
+
+        brand = None
+        keyword = False
+        for end, pattern in self._automaton.iter(name):
+            if pattern in self.excludes:
+                return False, None
+            if pattern in self.brands:
+                if len(pattern) <= SHORT_BRAND_LENGTH and not _is_bounded(name, end + 1 - len(pattern), end + 1):
+                    continue
+                # 最も長いブランド名を採用する（例: ステーキガスト > ガスト）
+                if brand is None or len(pattern) > len(brand):
+                    brand = pattern
+            else:
+                keyword = True
+
+        if brand or keyword:
+            return True, brand
+
+        # 末尾が「店」で終わるものもフランチャイズ候補とみなす
+        return name.endswith("店"), None
+
+    def is_franchise(self, name: Optional[str]) -> bool:
+        return self.match(name)[0]
+
+    def brand_of(self, name: Optional[str]) -> Optional[str]:
+        return self.match(name)[1]
+
+
+def _is_bounded(name: str, start: int, end: int) -> bool:
+    """name[start:end] が別の語の一部でないか（前は先頭か区切り、後ろは末尾・区切り・「〇〇店」）"""
+    if start > 0 and name[start - 1] not in _SEPARATORS:
+        return False
+    if end == len(name) or name[end] in _SEPARATORS:
+        return True
+    # 続く語（次の区切りまで）が「店」で終わる支店名なら一致とみなす（例: 松屋羽生店）
+    stop = end
+    while stop < len(name) and name[stop] not in _SEPARATORS:
+        stop += 1
+    return name[stop - 1] == "店"
+
+
+_default_matcher: Optional[FranchiseMatcher] = None
+
+
+def get_matcher() -> FranchiseMatcher:
+    """既定の判定器（初回呼び出し時にコンパイル）"""
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = FranchiseMatcher()
+    return _default_matcher
+
+
+def detect_franchise_by_name(name: str) -> bool:
+    """店名からフランチャイズらしさを判定する"""
+    return get_matcher().is_franchise(name)
+
+
+def tag_franchise_stores(connection, batch_size: int = 1000, limit: Optional[int] = None,
+                         progress: bool = True) -> Tuple[int, int]:
+    """is_franchiseが未設定/Falseの店舗をストリーミングで判定し、一括UPDATEする
+
+    store_idのキーセット順に batch_size 件ずつ (store_id, name) だけを読み、
+    フランチャイズと判定されたIDを UPDATE stores SET is_franchise = true WHERE store_id IN (...)
+    でまとめて更新する。バッチごとにコミットする。
+    connection は SQLAlchemy の Engine。戻り値は (走査件数, 更新件数)。
+    """
+    from sqlalchemy import or_, select, update
+
+    from data_version import bump_version
+    from models import Store
+
+    stores = Store.__table__
+    matcher = get_matcher()
+    scanned = 0
+    updated = 0
+    last_id = None
+
+    while True:
+        size = batch_size if limit is None else min(batch_size, limit - scanned)
+        if size <= 0:
+            break
+
+        query = (
+            select(stores.c.store_id, stores.c.name)
+            .where(or_(stores.c.is_franchise.is_(None), stores.c.is_franchise.is_(False)))
+            .order_by(stores.c.store_id)
+            .limit(size)
+        )
+        if last_id is not None:
+            query = query.where(stores.c.store_id > last_id)
+
+        with connection.begin() as conn:
+            rows = conn.execute(query).all()
+            if not rows:
+                break
+
+            franchise_ids = [store_id for store_id, name in rows if matcher.is_franchise(name)]
+            if franchise_ids:
+                conn.execute(
+                    update(stores)
+                    .where(stores.c.store_id.in_(franchise_ids))
+                    .values(is_franchise=True)
+                )
+                bump_version(conn)
+
+        scanned += len(rows)
+        updated += len(franchise_ids)
+        last_id = rows[-1][0]
+        if progress:
+            print(f"   {scanned:,}件判定済み (フランチャイズ: {updated:,}件)")
+
+    return scanned, updated
@@ -0,0 +1,45 @@
+"""gunicorn設定（本番用マルチワーカー起動）
+
+使用方法:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+ワーカー数・スレッド数・タイムアウトは config.py（WEB_CONCURRENCY など）から読む。
+preload_app でマスタープロセスが一度だけ create_app() を実行してからforkするため、
+マスターで作られたSQLAlchemyの接続プールを post_fork で破棄し、
+各ワーカーが自分の接続を張り直すようにする（接続をプロセス間で共有しない）。
+"""
+import os
+
+from bootstrap import get_config
+
+_config = get_config(os.getenv('FLASK_ENV', 'local'))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = _config.WEB_CONCURRENCY
+threads = _config.WEB_THREADS
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# エクスポートなど長いリクエストを考慮したタイムアウト
+timeout = _config.WEB_TIMEOUT
+graceful_timeout = _config.WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+
+# メモリリーク対策として一定リクエストごとにワーカーを入れ替える
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '1000'))
+max_requests_jitter = 100
+
+preload_app = True
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = _config.LOG_LEVEL.lower()
+
+
+def post_fork(server, worker):
+    """forkしたワーカーで、マスターから引き継いだ接続プールを破棄する"""
+    from extensions import db
+    from wsgi import app
+
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: 親プロセスの接続は閉じずに参照だけ捨てる
+            engine.dispose(close=False)
@@ -1,136 +1,273 @@
 #!/usr/bin/env python3
-"""古いデータベースから新しいデータベースにデータをインポートするスクリプト"""
+"""古いデータベースから新しいデータベースにデータをインポートするスクリプト
+
+古いDBを ATTACH し、共通カラムについて INSERT ... SELECT をSQLiteエンジン内で実行する。
+rowid範囲ごとにコミットしてチェックポイントを保存するため、中断しても --resume で再開できる。
+完了後は件数とチェックサムで移行結果を検証する。
+
+使用方法:
+    python import_old_data.py [--old-db <path>] [--new-db <path>] [--chunk-size 50000] [--resume] [--profile]
+"""
+import json
+import shutil
 import sqlite3
 import sys
-import os
+import time
+import zlib
 from pathlib import Path
 
+from data_version import bump_version_sqlite3
+from franchise import detect_franchise_by_name
+from profiling import add_profile_argument, profiled, set_script_profile
+
 # パス設定
 OLD_DB_PATH = Path.home() / "Desktop" / "名称未設定フォルダ" / "out" / "restaurants.db"
 NEW_DB_PATH = Path(__file__).parent / "instance" / "restaurants_local.db"
 
-def import_stores():
+
+def _table_columns(conn, schema):
+    """指定スキーマのstoresテーブルのカラム情報を {name: (notnull, default)} で返す"""
+    rows = conn.execute(f"PRAGMA {schema}.table_info(stores)").fetchall()
+    return {row[1]: (bool(row[3]), row[4]) for row in rows}
+
+
+def _checkpoint_path(new_db_path):
+    return Path(new_db_path).with_suffix('.import_checkpoint.json')
+
+
+def _load_checkpoint(new_db_path, old_db_path):
+    """同じ移行元のチェックポイントがあれば最後にコミットしたrowidを返す"""
+    path = _checkpoint_path(new_db_path)
+    if not path.exists():
+        return None
+    try:
+        checkpoint = json.loads(path.read_text(encoding='utf-8'))
+    except (ValueError, OSError):
+        return None
+    if checkpoint.get('old_db') != str(old_db_path):
+        return None
+    return checkpoint.get('last_rowid')
+
+
+def _save_checkpoint(new_db_path, old_db_path, last_rowid):
+    _checkpoint_path(new_db_path).write_text(
+        json.dumps({'old_db': str(old_db_path), 'last_rowid': last_rowid}),
+        encoding='utf-8',
+    )
+
+
+def _row_crc32(*values):
+    """行の値からCRC32を計算（SQLiteのユーザー定義関数として使用）"""
+    return zlib.crc32(repr(values).encode('utf-8'))
+
+
+def verify_import(conn, columns, where_required=''):
+    """移行結果を件数とチェックサムで検証する
+
+    移行元で同じstore_idが複数ある場合は、後から書き込まれた（rowidが大きい）行を正とする。
+    where_required は移行時と同じ除外条件（" AND col IS NOT NULL" の連結）。
+    is_franchise は移行時に再判定されるためチェックサムの対象外とする。
+    """
+    conn.create_function('row_crc32', -1, _row_crc32, deterministic=True)
+    columns_str = ', '.join(c for c in columns if c != 'is_franchise')
+
+    if 'store_id' not in columns:
+        old_count = conn.execute("SELECT COUNT(*) FROM old.stores").fetchone()[0]
+        return {'old_count': old_count, 'verified': None}
+
+    latest_old = "SELECT MAX(rowid) FROM old.stores GROUP BY store_id"
+    old_count, old_checksum = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(row_crc32({columns_str})), 0) "
+        f"FROM old.stores WHERE rowid IN ({latest_old}){where_required}"
+    ).fetchone()
+    new_count, new_checksum = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(row_crc32({columns_str})), 0) "
+        f"FROM main.stores WHERE store_id IN (SELECT store_id FROM old.stores WHERE 1{where_required})"
+    ).fetchone()
+
+    return {
+        'old_count': old_count,
+        'new_count': new_count,
+        'old_checksum': old_checksum,
+        'new_checksum': new_checksum,
+        'verified': old_count == new_count and old_checksum == new_checksum,
+    }
+
+
+@profiled()
+def import_stores(old_db_path=OLD_DB_PATH, new_db_path=NEW_DB_PATH, chunk_size=50000,
+                  resume=False, backup=True, verify=True):
     """店舗データをインポート"""
     print("=" * 60)
     print("データインポート開始")
     print("=" * 60)
-    
-    if not OLD_DB_PATH.exists():
-        print(f"❌ 古いデータベースが見つかりません: {OLD_DB_PATH}")
+
+    old_db_path = Path(old_db_path)
+    new_db_path = Path(new_db_path)
+
+    if not old_db_path.exists():
+        print(f"❌ 古いデータベースが見つかりません: {old_db_path}")
         return False
-    
-    if not NEW_DB_PATH.exists():
-        print(f"❌ 新しいデータベースが見つかりません: {NEW_DB_PATH}")
+
+    if not new_db_path.exists():
+        print(f"❌ 新しいデータベースが見つかりません: {new_db_path}")
         return False
-    
-    # バックアップを作成
-    backup_path = NEW_DB_PATH.with_suffix('.db.backup')
-    print(f"📦 バックアップを作成中: {backup_path}")
-    import shutil
-    shutil.copy2(NEW_DB_PATH, backup_path)
-    print("✅ バックアップ完了")
-    
-    # 古いデータベースに接続
-    old_conn = sqlite3.connect(str(OLD_DB_PATH))
-    old_cursor = old_conn.cursor()
-    
-    # 新しいデータベースに接続
-    new_conn = sqlite3.connect(str(NEW_DB_PATH))
-    new_cursor = new_conn.cursor()
-    
+
+    start_rowid = _load_checkpoint(new_db_path, old_db_path) if resume else None
+
+    # バックアップを作成（再開時は最初の実行で作成済み）
+    if backup and start_rowid is None:
+        backup_path = new_db_path.with_suffix('.db.backup')
+        print(f"📦 バックアップを作成中: {backup_path}")
+        shutil.copy2(new_db_path, backup_path)
+        print("✅ バックアップ完了")
+
+    conn = sqlite3.connect(str(new_db_path))
+
     try:
-        # 古いデータベースから店舗データを取得
-        print("\n📊 古いデータベースからデータを読み込み中...")
-        old_cursor.execute("SELECT COUNT(*) FROM stores")
-        old_count = old_cursor.fetchone()[0]
-        print(f"   古いデータベースの店舗数: {old_count:,}件")
-        
-        # 新しいデータベースの現在の件数を確認
-        new_cursor.execute("SELECT COUNT(*) FROM stores")
-        new_count = new_cursor.fetchone()[0]
+        conn.execute("ATTACH DATABASE ? AS old", (str(old_db_path),))
+
+        old_count = conn.execute("SELECT COUNT(*) FROM old.stores").fetchone()[0]
+        print(f"\n📊 古いデータベースの店舗数: {old_count:,}件")
+
+        new_count = conn.execute("SELECT COUNT(*) FROM main.stores").fetchone()[0]
         print(f"   新しいデータベースの現在の店舗数: {new_count:,}件")
-        
+
         if old_count == 0:
             print("⚠️  古いデータベースにデータがありません")
             return False
-        
-        # 古いデータベースのカラムを確認
-        old_cursor.execute("PRAGMA table_info(stores)")
-        old_columns = {row[1]: row[0] for row in old_cursor.fetchall()}
+
+        old_columns = _table_columns(conn, 'old')
+        new_columns = _table_columns(conn, 'main')
         print(f"\n📋 古いデータベースのカラム: {', '.join(old_columns.keys())}")
-        
-        # 新しいデータベースのカラムを確認
-        new_cursor.execute("PRAGMA table_info(stores)")
-        new_columns = {row[1]: row[0] for row in new_cursor.fetchall()}
         print(f"📋 新しいデータベースのカラム: {', '.join(new_columns.keys())}")
-        
+
         # 共通カラムを取得
-        common_columns = set(old_columns.keys()) & set(new_columns.keys())
-        print(f"\n✅ 共通カラム: {', '.join(sorted(common_columns))}")
-        
-        # データを取得（共通カラムのみ）
-        columns_str = ', '.join(sorted(common_columns))
-        old_cursor.execute(f"SELECT {columns_str} FROM stores")
-        
-        # データを挿入
-        print(f"\n📥 データをインポート中...")
+        common_columns = sorted(set(old_columns) & set(new_columns))
+        print(f"\n✅ 共通カラム: {', '.join(common_columns)}")
+        columns_str = ', '.join(common_columns)
+
+        # 新しいDBでNOT NULL（デフォルトなし）のカラムがNULLの行は挿入できないので除外する
+        required = [
+            c for c in common_columns
+            if new_columns[c][0] and new_columns[c][1] is None
+        ]
+        where_required = ''.join(f" AND {c} IS NOT NULL" for c in required)
+
+        min_rowid, max_rowid = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM old.stores").fetchone()
+        if start_rowid is not None:
+            print(f"\n⏯️  rowid {start_rowid:,} の続きから再開します")
+            lower = start_rowid
+        else:
+            lower = min_rowid - 1
+
+        print(f"\n📥 データをインポート中...（{chunk_size:,}件ごとにコミット）")
+        insert_sql = (
+            f"INSERT OR REPLACE INTO main.stores ({columns_str}) "
+            f"SELECT {columns_str} FROM old.stores "
+            f"WHERE rowid > ? AND rowid <= ?{where_required} ORDER BY rowid"
+        )
+        # 移行した行のフランチャイズ判定もエンジン内で行う（判定関数をUDFとして登録）
+        tag_sql = None
+        if 'is_franchise' in new_columns and 'store_id' in common_columns:
+            conn.create_function('is_franchise_name', 1, detect_franchise_by_name, deterministic=True)
+            tag_sql = (
+                "UPDATE main.stores SET is_franchise = 1 "
+                "WHERE store_id IN (SELECT store_id FROM old.stores WHERE rowid > ? AND rowid <= ?) "
+                "AND COALESCE(is_franchise, 0) = 0 AND is_franchise_name(name)"
+            )
+
         inserted = 0
-        skipped = 0
-        
-        for row in old_cursor.fetchall():
-            try:
-                # カラム名と値のマッピング
-                values = dict(zip(sorted(common_columns), row))
-                
-                # INSERT文を構築
-                placeholders = ', '.join(['?' for _ in common_columns])
-                insert_sql = f"""
-                    INSERT OR REPLACE INTO stores ({columns_str})
-                    VALUES ({placeholders})
-                """
-                
-                # 値の順序を整える
-                ordered_values = [values[col] for col in sorted(common_columns)]
-                
-                new_cursor.execute(insert_sql, ordered_values)
-                inserted += 1
-                
-                if inserted % 1000 == 0:
-                    print(f"   進捗: {inserted:,}件 / {old_count:,}件")
-                    new_conn.commit()
-                    
-            except Exception as e:
-                skipped += 1
-                if skipped <= 5:  # 最初の5件のエラーのみ表示
-                    print(f"   ⚠️  スキップ: {e}")
-        
-        # コミット
-        new_conn.commit()
-        
-        print(f"\n✅ インポート完了!")
+        franchise_tagged = 0
+        started = time.perf_counter()
+
+        while lower < max_rowid:
+            upper = min(lower + chunk_size, max_rowid)
+            with conn:
+                changed = conn.execute(insert_sql, (lower, upper)).rowcount
+                inserted += changed
+                if tag_sql:
+                    tagged = conn.execute(tag_sql, (lower, upper)).rowcount
+                    franchise_tagged += tagged
+                    changed += tagged
+                if changed:
+                    # 同じトランザクションでstores_versionを上げる（レスポンスキャッシュの無効化）
+                    bump_version_sqlite3(conn)
+            _save_checkpoint(new_db_path, old_db_path, upper)
+            lower = upper
+
+            done = upper - min_rowid + 1
+            total = max_rowid - min_rowid + 1
+            elapsed = time.perf_counter() - started
+            print(
+                f"   進捗: rowid {upper:,}/{max_rowid:,} ({done / total * 100:.1f}%) "
+                f"- {inserted:,}件 ({inserted / elapsed if elapsed > 0 else 0:,.0f}件/秒)"
+            )
+
+        skipped = conn.execute(
+            f"SELECT COUNT(*) FROM old.stores WHERE NOT (1{where_required})"
+        ).fetchone()[0]
+
+        print(f"\n✅ インポート完了! ({time.perf_counter() - started:.1f}秒)")
         print(f"   インポート成功: {inserted:,}件")
+        if tag_sql:
+            print(f"   フランチャイズ判定: {franchise_tagged:,}件")
         if skipped > 0:
-            print(f"   スキップ: {skipped:,}件")
-        
+            print(f"   スキップ（必須カラムがNULL）: {skipped:,}件")
+
         # 最終確認
-        new_cursor.execute("SELECT COUNT(*) FROM stores")
-        final_count = new_cursor.fetchone()[0]
+        final_count = conn.execute("SELECT COUNT(*) FROM main.stores").fetchone()[0]
         print(f"\n📊 新しいデータベースの最終店舗数: {final_count:,}件")
-        
+
+        if verify:
+            print("\n🔍 件数とチェックサムで検証中...")
+            result = verify_import(conn, common_columns, where_required)
+            if result['verified'] is None:
+                print("   ⚠️  store_idが共通カラムにないため、件数のみ確認しました")
+            else:
+                print(f"   移行元: {result['old_count']:,}件 (checksum {result['old_checksum']})")
+                print(f"   移行先: {result['new_count']:,}件 (checksum {result['new_checksum']})")
+                if result['verified']:
+                    print("   ✅ 検証OK")
+                else:
+                    print("   ❌ 件数またはチェックサムが一致しません")
+                    return False
+
+        _checkpoint_path(new_db_path).unlink(missing_ok=True)
         return True
-        
+
     except Exception as e:
         print(f"\n❌ エラーが発生しました: {e}")
+        print("   --resume を付けて再実行すると、最後にコミットした位置から再開できます")
         import traceback
         traceback.print_exc()
-        new_conn.rollback()
+        conn.rollback()
         return False
-        
+
     finally:
-        old_conn.close()
-        new_conn.close()
+        conn.close()
+
 
 if __name__ == "__main__":
-    success = import_stores()
-    sys.exit(0 if success else 1)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="古いデータベースから店舗データをインポート")
+    parser.add_argument("--old-db", type=str, default=str(OLD_DB_PATH), help="移行元のSQLiteデータベース")
+    parser.add_argument("--new-db", type=str, default=str(NEW_DB_PATH), help="移行先のSQLiteデータベース")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="1回のコミットで処理するrowid範囲")
+    parser.add_argument("--resume", action="store_true", help="前回中断した位置から再開する")
+    parser.add_argument("--no-backup", action="store_true", help="移行先のバックアップを作成しない")
+    parser.add_argument("--no-verify", action="store_true", help="件数・チェックサムの検証を省略する")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    set_script_profile(args.profile)
 
+    success = import_stores(
+        old_db_path=args.old_db,
+        new_db_path=args.new_db,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+        backup=not args.no_backup,
+        verify=not args.no_verify,
+    )
+    sys.exit(0 if success else 1)
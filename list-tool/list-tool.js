@@ -890,16 +890,16 @@ currentFilters.cities = [];
 return;
     }
     allCitiesData = [];
-    for (const pref of currentFilters.prefectures) {
-try {
-    const response = await fetch(`${STORE_API_BASE}/api/cities?prefecture=${encodeURIComponent(pref)}`);
-    const data = await response.json();
-    allCitiesData.push(...data.cities);
-} catch (error) {
-    console.error(`市区町村取得エラー (${pref}):`, error);
-}
+    // 選択した都道府県をまとめて1回で取得（cities は和集合・ソート済み）
+    const params = new URLSearchParams();
+    currentFilters.prefectures.forEach(pref => params.append('prefecture', pref));
+    try {
+const response = await fetch(`${STORE_API_BASE}/api/cities?${params.toString()}`);
+const data = await response.json();
+allCitiesData = data.cities || [];
+    } catch (error) {
+console.error('市区町村取得エラー:', error);
     }
-    allCitiesData = [...new Set(allCitiesData)].sort();
     citySearchInput.style.display = 'block';
     filterAndDisplayCities();
     updateSelectedCitiesDisplay();
@@ -3159,6 +3159,11 @@ if (!response.ok) {
         progressBar.style.width = '100%';
         progressText.textContent = `エラー: ${response.status}`;
     }
+    if (response.status === 429) {
+        // 同時に実行できるエクスポート数の上限（admission.py）
+        const retryAfter = response.headers.get('Retry-After') || '数';
+        throw new Error(`サーバーが混雑しています。${retryAfter}秒ほど待ってから再度お試しください。`);
+    }
     throw new Error(`HTTP error! status: ${response.status}`);
 }
 
@@ -3377,6 +3382,11 @@ if (!response.ok) {
         progressBar.style.width = '100%';
         progressText.textContent = `エラー: ${response.status}`;
     }
+    if (response.status === 429) {
+        // 同時に実行できるエクスポート数の上限（admission.py）
+        const retryAfter = response.headers.get('Retry-After') || '数';
+        throw new Error(`サーバーが混雑しています。${retryAfter}秒ほど待ってから再度お試しください。`);
+    }
     throw new Error(`HTTP error! status: ${response.status}`);
 }
 
@@ -0,0 +1,221 @@
+"""master_leads → stores の変換処理
+
+Flask/SQLAlchemyに依存しないため、プロセスプールのワーカーでも軽量にimportできる。
+変換結果はORMオブジェクトではなく、ピクル化しやすいタプル（StoreRecord）で返す。
+"""
+import json
+import os
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# storesテーブルのカラム順（brand_keyなどバッチで導出するカラムを除く）＋デリバリーサービス
+RECORD_FIELDS = (
+    'store_id', 'name', 'phone', 'website', 'address', 'category', 'rating',
+    'city', 'place_id', 'url', 'is_franchise', 'location', 'opening_date',
+    'closed_day', 'transport', 'business_hours', 'official_account',
+    'data_source', 'collected_at', 'updated_at', 'delivery_services',
+)
+
+StoreRecord = namedtuple('StoreRecord', RECORD_FIELDS)
+
+
+def convert_master_lead_to_record(master_lead, now=None):
+    """master_leadデータをstoresテーブルのレコード（辞書）に変換
+
+    now は日時が取得できない場合のフォールバック値（省略時は現在時刻）。
+    """
+    now = now or datetime.utcnow()
+    data = master_lead.get('data', {})
+    
+    # store_id: data.store_idを優先、なければidを使用
+    store_id = data.get('store_id') or master_lead.get('id')
+    if not store_id:
+        store_id = str(uuid.uuid4())
+    
+    # 店舗名: companyNameまたはdata.nameまたはdata.店舗名を優先
+    name = master_lead.get('companyName') or data.get('name') or data.get('店舗名') or '店舗名不明'
+    
+    # 電話番号: phoneまたはdata.phoneまたはdata.電話番号
+    phone = master_lead.get('phone') or data.get('phone') or data.get('電話番号') or None
+    
+    # ウェブサイト
+    website = data.get('website') or None
+    
+    # 住所: addressまたはdata.addressまたはdata.住所またはdata.詳細住所
+    address = master_lead.get('address') or data.get('address') or data.get('住所') or data.get('詳細住所') or None
+    
+    # カテゴリ
+    category = data.get('category') or None
+    
+    # 評価
+    rating = data.get('rating')
+    if rating is not None:
+        try:
+            rating = float(rating)
+        except (ValueError, TypeError):
+            rating = None
+    else:
+        rating = None
+    
+    # 都市
+    city = data.get('city') or None
+    
+    # place_id
+    place_id = data.get('place_id') or None
+    
+    # URL: data.urlまたはsource
+    url = data.get('url') or master_lead.get('source') or None
+    
+    # フランチャイズ
+    is_franchise = data.get('is_franchise', False)
+    if isinstance(is_franchise, str):
+        is_franchise = is_franchise.lower() in ('true', '1', 'yes')
+    
+    # 位置情報
+    location = None
+    if data.get('location'):
+        if isinstance(data['location'], dict):
+            lat = data['location'].get('lat')
+            lng = data['location'].get('lng')
+            if lat and lng:
+                location = json.dumps({'lat': lat, 'lng': lng})
+        elif isinstance(data['location'], str):
+            location = data['location']
+    
+    # 開店日
+    opening_date = data.get('opening_date') or None
+    
+    # 定休日
+    closed_day = data.get('closed_day') or None
+    
+    # 交通手段
+    transport = data.get('transport') or None
+    
+    # 営業時間
+    business_hours = data.get('business_hours') or None
+    
+    # 公式アカウント
+    official_account = data.get('official_account') or None
+    
+    # データソース
+    data_source = data.get('data_source') or master_lead.get('source', 'crm-master-lead')
+    
+    # 収集日時
+    collected_at = None
+    if data.get('collected_at'):
+        try:
+            collected_at = datetime.fromisoformat(data['collected_at'].replace('Z', '+00:00'))
+        except (ValueError, AttributeError):
+            pass
+    if not collected_at and master_lead.get('createdAt'):
+        try:
+            collected_at = datetime.fromisoformat(master_lead['createdAt'].replace('Z', '+00:00'))
+        except (ValueError, AttributeError):
+            pass
+    if not collected_at:
+        collected_at = now
+    
+    # 更新日時
+    updated_at = None
+    if master_lead.get('updatedAt'):
+        try:
+            updated_at = datetime.fromisoformat(master_lead['updatedAt'].replace('Z', '+00:00'))
+        except (ValueError, AttributeError):
+            pass
+    if not updated_at:
+        updated_at = now
+    
+    # デリバリーサービス情報
+    delivery_services = data.get('delivery_services', [])
+    if not isinstance(delivery_services, list):
+        delivery_services = []
+
+    return {
+        'store_id': store_id,
+        'name': name,
+        'phone': phone,
+        'website': website,
+        'address': address,
+        'category': category,
+        'rating': rating,
+        'city': city,
+        'place_id': place_id,
+        'url': url,
+        'is_franchise': is_franchise,
+        'location': location,
+        'opening_date': opening_date,
+        'closed_day': closed_day,
+        'transport': transport,
+        'business_hours': business_hours,
+        'official_account': official_account,
+        'data_source': data_source,
+        'collected_at': collected_at,
+        'updated_at': updated_at,
+        'delivery_services': [str(s) for s in delivery_services if s],
+    }
+
+
+def convert_master_lead_to_tuple(master_lead, now=None):
+    """master_leadデータをStoreRecord（タプル）に変換"""
+    record = convert_master_lead_to_record(master_lead, now=now)
+    record['delivery_services'] = tuple(record['delivery_services'])
+    return StoreRecord(**record)
+
+
+def _transform_chunk(args):
+    """ワーカー側: チャンク単位で変換し、(変換結果, 失敗) を返す"""
+    master_leads, now = args
+    records = []
+    errors = []
+    for master_lead in master_leads:
+        try:
+            records.append(convert_master_lead_to_tuple(master_lead, now=now))
+        except Exception as e:
+            errors.append({
+                'store_id': master_lead.get('id'),
+                'reason': f"変換に失敗: {str(e)}",
+                'record': master_lead,
+            })
+    return records, errors
+
+
+def transform_master_leads(master_leads, workers=None, chunk_size=1000, now=None, progress=True):
+    """master_leadsをまとめてStoreRecordに変換する
+
+    workers が2以上ならプロセスプールで並列に変換する（None はCPU数）。
+    出力順は入力順と同じで、並列・直列どちらでも同じ結果になる。
+    戻り値は (records, errors)。
+    """
+    now = now or datetime.utcnow()
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    chunks = [
+        (master_leads[i:i + chunk_size], now)
+        for i in range(0, len(master_leads), chunk_size)
+    ]
+
+    records = []
+    errors = []
+    if workers <= 1 or len(chunks) <= 1:
+        results = map(_transform_chunk, chunks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_transform_chunk, chunks)
+
+    try:
+        done = 0
+        for chunk_records, chunk_errors in results:
+            records.extend(chunk_records)
+            errors.extend(chunk_errors)
+            done += len(chunk_records) + len(chunk_errors)
+            if progress:
+                print(f"   {done}/{len(master_leads)}件変換完了...")
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return records, errors
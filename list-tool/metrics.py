@@ -0,0 +1,322 @@
+"""リクエストごとの性能計測と /api/metrics（Prometheusのテキスト形式）
+
+リクエストごとに以下を記録し、エンドポイント（URLルール）別のヒストグラムに集計する。
+    - 処理時間
+    - SQLの実行回数・合計時間（SQLAlchemyの before/after_cursor_execute）
+    - ORMで読み込んだ行数（N+1や読みすぎの検出用）
+    - レスポンスのバイト数（圧縮後）
+    - 接続プールからの取得待ち時間
+同じ値はレスポンスヘッダー Server-Timing でも返すため、ブラウザの開発者ツールで確認できる。
+
+集計はプロセスごと（gunicornのワーカーごと）。他のモジュールは add_collector() で
+/api/metrics に独自の値を追加できる（レスポンスキャッシュのヒット数など）。
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+BYTE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024)
+
+_PREFIX = 'list_tool_'
+
+# 実行中のリクエストの計測値（リクエストを処理しているスレッドで参照する）
+_current = ContextVar('list_tool_request_stats', default=None)
+
+
+class RequestStats:
+    """1リクエスト分の計測値"""
+
+    __slots__ = ('started', 'sql_count', 'sql_seconds', 'rows', 'pool_wait_seconds', 'response_bytes')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.pool_wait_seconds = 0.0
+        self.response_bytes = 0
+
+    def server_timing(self):
+        """Server-Timing ヘッダーの値"""
+        total = (time.perf_counter() - self.started) * 1000
+        return (
+            f'db;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_count} queries, {self.rows} rows", '
+            f'pool;dur={self.pool_wait_seconds * 1000:.1f}, '
+            f'app;dur={total:.1f}'
+        )
+
+
+def current_stats():
+    """実行中のリクエストの計測値（リクエスト外ならNone）"""
+    return _current.get()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+class Histogram:
+    """ラベルごとのヒストグラム（Prometheusのhistogram型）"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}  # ラベル → [各バケットの件数..., 合計, 件数]
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_labels(labels + (('le', repr(float(bound))),))} {count}")
+            lines.append(f"{self.name}_bucket{_labels(labels + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """ラベルごとのカウンター"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._series = {}
+
+    def inc(self, labels, value=1):
+        self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{_labels(labels)} {value}")
+        return lines
+
+
+class Metrics:
+    """プロセス内の集計値"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = Counter(_PREFIX + 'http_requests_total', 'リクエスト数')
+        self.latency = Histogram(_PREFIX + 'http_request_duration_seconds', 'リクエストの処理時間', LATENCY_BUCKETS)
+        self.sql_count = Histogram(_PREFIX + 'http_request_sql_statements', 'リクエストあたりのSQL実行回数', COUNT_BUCKETS)
+        self.sql_seconds = Histogram(_PREFIX + 'http_request_sql_seconds', 'リクエストあたりのSQL実行時間', LATENCY_BUCKETS)
+        self.rows = Histogram(_PREFIX + 'http_request_orm_rows', 'リクエストあたりのORM読み込み行数', ROW_BUCKETS)
+        self.response_bytes = Histogram(_PREFIX + 'http_response_bytes', 'レスポンスのバイト数（圧縮後）', BYTE_BUCKETS)
+        self.pool_wait = Histogram(_PREFIX + 'db_pool_checkout_wait_seconds', '接続プールからの取得待ち時間', LATENCY_BUCKETS)
+        self._collectors = []
+
+    def record_request(self, endpoint, method, status, stats, elapsed):
+        labels = (('endpoint', endpoint), ('method', method))
+        with self._lock:
+            self.requests.inc(labels + (('status', str(status)),))
+            self.latency.observe(labels, elapsed)
+            self.sql_count.observe(labels, stats.sql_count)
+            self.sql_seconds.observe(labels, stats.sql_seconds)
+            self.rows.observe(labels, stats.rows)
+            self.response_bytes.observe(labels, stats.response_bytes)
+
+    def record_pool_wait(self, seconds):
+        with self._lock:
+            self.pool_wait.observe((), seconds)
+
+    def add_collector(self, collector):
+        """collector() は (名前, 型, 説明, [(ラベルのタプル, 値), ...]) のリストを返す関数"""
+        self._collectors.append(collector)
+
+    def render(self):
+        """Prometheusのテキスト形式"""
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.sql_count, self.sql_seconds,
+                           self.rows, self.response_bytes, self.pool_wait):
+                lines.extend(metric.render())
+        lines.append(f"# TYPE {_PREFIX}process_start_time_seconds gauge")
+        lines.append(f"{_PREFIX}process_start_time_seconds {self.started_at:.3f}")
+        for collector in self._collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {_PREFIX}{name} {help_text}")
+                lines.append(f"# TYPE {_PREFIX}{name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{_PREFIX}{name}{_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+# ---------------------------------------------------------------------------
+# SQLAlchemyのイベント
+# ---------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('list_tool_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = conn.info.get('list_tool_query_started')
+    if started:
+        stats.sql_seconds += time.perf_counter() - started.pop()
+    stats.sql_count += 1
+
+
+def _loaded_as_persistent(session, instance):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += 1
+
+
+def _instrument_pool(pool, metrics):
+    """プールからの接続取得（_do_get）にかかった時間を計る
+
+    SQLAlchemyには取得開始のイベントがないため、プールのメソッドを包む。
+    engine.dispose() でプールが作り直された場合は engine_disposed で包み直す。
+    """
+    if getattr(pool, '_list_tool_instrumented', False):
+        return
+    do_get = pool._do_get
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            waited = time.perf_counter() - started
+            metrics.record_pool_wait(waited)
+            stats = _current.get()
+            if stats is not None:
+                stats.pool_wait_seconds += waited
+
+    pool._do_get = timed_do_get
+    pool._list_tool_instrumented = True
+
+
+def instrument_engine(engine, metrics):
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'engine_disposed', lambda e: _instrument_pool(e.pool, metrics))
+    _instrument_pool(engine.pool, metrics)
+
+
+class _CountingIterable:
+    """ストリーミングのレスポンスの送信バイト数を数える"""
+
+    def __init__(self, iterable, stats):
+        self._iterable = iterable
+        self._stats = stats
+
+    def __iter__(self):
+        for chunk in self._iterable:
+            self._stats.response_bytes += len(chunk)
+            yield chunk
+
+
+def _pool_samples(pool):
+    """接続プールの状態（QueuePool以外は取れる値だけ）"""
+    samples = []
+    for name, method, help_text in (
+        ('db_pool_size', 'size', 'プールの接続数の上限（pool_size）'),
+        ('db_pool_checked_out', 'checkedout', '使用中の接続数'),
+        ('db_pool_overflow', 'overflow', 'pool_sizeを超えて作られた接続数'),
+    ):
+        if hasattr(pool, method):
+            samples.append((name, 'gauge', help_text, [((), getattr(pool, method)())]))
+    return samples
+
+
+def _response_cache_samples(cache):
+    stats = cache.stats()
+    events = ('hits', 'redis_hits', 'misses', 'not_modified', 'sets', 'evictions', 'redis_errors')
+    return [
+        ('response_cache_events_total', 'counter', 'レスポンスキャッシュのヒット・ミスなど',
+         [((('event', name),), stats.get(name, 0)) for name in events]),
+        ('response_cache_entries', 'gauge', 'レスポンスキャッシュ（プロセス内）の件数', [((), stats['entries'])]),
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Flask
+# ---------------------------------------------------------------------------
+
+def init_metrics(app):
+    """計測のフックと /api/metrics を登録する（METRICS_ENABLED=False なら何もしない）
+
+    after_request の中では最後に実行されるよう、圧縮（compression.py）より前に呼ぶこと。
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return None
+
+    from flask import request
+
+    from extensions import db
+
+    metrics = Metrics()
+    app.extensions['metrics'] = metrics
+
+    with app.app_context():
+        instrument_engine(db.engine, metrics)
+    event.listen(Session, 'loaded_as_persistent', _loaded_as_persistent)
+
+    metrics.add_collector(lambda: _pool_samples(db.engine.pool))
+    cache = app.extensions.get('response_cache')
+    if cache is not None:
+        metrics.add_collector(lambda: _response_cache_samples(cache))
+
+    @app.before_request
+    def start_request_stats():
+        _current.set(RequestStats())
+
+    @app.after_request
+    def record_request_stats(response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        response.headers['Server-Timing'] = stats.server_timing()
+
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        method = request.method
+        status = response.status_code
+        if response.is_streamed:
+            # エクスポートなどは送信し終わった時点で記録する
+            response.response = _CountingIterable(response.response, stats)
+        else:
+            stats.response_bytes = response.calculate_content_length() or 0
+
+        def finish():
+            _current.set(None)
+            metrics.record_request(endpoint, method, status, stats, time.perf_counter() - stats.started)
+
+        response.call_on_close(finish)
+        return response
+
+    @app.route("/api/metrics")
+    def get_metrics():
+        """Prometheus形式の計測値"""
+        return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    return metrics
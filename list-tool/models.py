@@ -1,8 +1,8 @@
 """SQLAlchemyモデル定義"""
 from datetime import datetime
-from sqlalchemy import Column, String, Float, Boolean, DateTime, Text, ForeignKey, Index
+from sqlalchemy import Column, String, Float, Boolean, DateTime, Integer, Text, ForeignKey, Index, event
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Session, relationship
 import uuid
 import json
 
@@ -31,6 +31,8 @@ class Store(db.Model):
     place_id = Column(String(255), index=True)
     url = Column(Text)
     is_franchise = Column(Boolean, default=False, index=True)
+    # 店名から導出したチェーンのキー（brands.pyのバッチで設定）
+    brand_key = Column(String(200), index=True)
     
     # 地理空間情報
     if _has_postgis:
@@ -70,6 +72,7 @@ class Store(db.Model):
             'place_id': self.place_id,
             'url': self.url,
             'is_franchise': self.is_franchise,
+            'brand_key': self.brand_key,
             'location_lat': self.location_lat,
             'location_lng': self.location_lng,
             'opening_date': self.opening_date,
@@ -112,6 +115,14 @@ class Store(db.Model):
                 return None
 
 
+@event.listens_for(Store, 'before_insert')
+def _tag_franchise_on_insert(mapper, connection, target):
+    """ORM経由で挿入される店舗にフランチャイズ判定を反映する"""
+    if not target.is_franchise:
+        from franchise import detect_franchise_by_name
+        target.is_franchise = detect_franchise_by_name(target.name)
+
+
 class DeliveryService(db.Model):
     """デリバリーサービス情報テーブル"""
     __tablename__ = 'delivery_services'
@@ -165,3 +176,22 @@ class StoreStatus(db.Model):
     
     store = relationship('Store', back_populates='store_statuses')
     # Userとのリレーションは外部キーなしで定義（rep_idは文字列として保存）
+
+
+class DataVersion(db.Model):
+    """データの世代番号（更新のたびに+1。レスポンスキャッシュのキーに使う）"""
+    __tablename__ = 'data_versions'
+    
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_stores_version_on_flush(session, flush_context):
+    """店舗・デリバリーサービスの変更をフラッシュしたら、同じトランザクションで世代番号を上げる"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Store, DeliveryService)):
+            from data_version import bump_version
+            bump_version(session.connection())
+            return
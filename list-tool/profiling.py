@@ -0,0 +1,314 @@
+"""開発・テスト環境用のプロファイラー（APIリクエスト・バッチスクリプト）
+
+計測方法は2種類:
+    - sampling: 一定間隔（PROFILE_INTERVAL_MS）でスタックを記録する。標準ライブラリのみで動き、
+      speedscope（https://www.speedscope.app）で開けるJSON（*.speedscope.json）を出力する
+    - cprofile: cProfileで全関数呼び出しを記録する（正確だが遅くなる）。*.prof（snakeviz などで表示）と
+      累積時間の上位をまとめた *.txt を出力する
+
+APIリクエスト:
+    X-Profile: sampling（または ?_profile=sampling）を付けると、そのリクエストを計測して
+    OUTPUT_DIR/profiles/ に保存し、ファイル名をレスポンスヘッダー X-Profile-File で返す。
+    保存したファイルは /api/dev/profiles から取得できる。
+    DEBUG または TESTING の設定で、PROFILING_ENABLED が有効な場合のみ登録される（本番では無効）。
+
+バッチスクリプト:
+    @profiled() を付けた関数は、--profile（set_script_profile）または環境変数 PROFILE=sampling|cprofile
+    を指定したときだけ計測される。指定しなければ何もしない。
+"""
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+PROFILE_MODES = ('sampling', 'cprofile')
+
+DEFAULT_INTERVAL_MS = 1.0
+
+_SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+def normalize_mode(value):
+    """'1' / 'sampling' / 'cprofile' などを計測方法に変換する（無効な値はNone）"""
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value in ('1', 'true', 'yes', 'on'):
+        return 'sampling'
+    return value if value in PROFILE_MODES else None
+
+
+class SamplingProfiler:
+    """別スレッドから sys._current_frames() でスタックを一定間隔で記録する
+
+    thread_id を指定するとそのスレッドのみ、None なら（プロファイラー以外の）全スレッドを記録する。
+    """
+
+    def __init__(self, interval_ms=DEFAULT_INTERVAL_MS, thread_id=None):
+        self.interval = interval_ms / 1000
+        self.thread_id = thread_id
+        self._frames = []
+        self._frame_index = {}
+        self._samples = {}  # スレッドID → ([スタック], [重み(ms)])
+        self._thread_names = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='list-tool-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def _frame(self, code):
+        key = (getattr(code, 'co_qualname', code.co_name), code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self._frames)
+            self._frames.append({'name': key[0], 'file': key[1], 'line': key[2]})
+        return index
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = (now - last) * 1000
+            last = now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.thread_id is not None and thread_id != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                if thread_id not in self._samples:
+                    # 計測後には終了しているスレッドもあるため、初めて見つけた時点で名前を控える
+                    self._samples[thread_id] = ([], [])
+                    self._thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                stacks, weights = self._samples[thread_id]
+                stacks.append(stack)
+                weights.append(weight)
+
+    def speedscope(self, name):
+        """speedscopeのファイル形式（sampled）の辞書"""
+        profiles = []
+        for thread_id, (stacks, weights) in self._samples.items():
+            profiles.append({
+                'type': 'sampled',
+                'name': f"{name} ({self._thread_names.get(thread_id, thread_id)})" if self.thread_id is None else name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(weights), 3),
+                'samples': stacks,
+                'weights': [round(weight, 3) for weight in weights],
+            })
+        return {
+            '$schema': _SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'list-tool profiling.py',
+            'activeProfileIndex': 0,
+            'shared': {'frames': self._frames},
+            'profiles': profiles,
+        }
+
+    def save(self, path, name):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.speedscope(name), f, ensure_ascii=False)
+        return [path]
+
+
+class DeterministicProfiler:
+    """cProfile（開始したスレッドのみ）"""
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._profile.enable()
+        return self
+
+    def stop(self):
+        self._profile.disable()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def save(self, path, name, top=50):
+        """path（*.prof）と、累積時間の上位 top 件のテキスト（*.txt）を保存する"""
+        self._profile.dump_stats(path)
+        text_path = os.path.splitext(path)[0] + '.txt'
+        output = io.StringIO()
+        output.write(f"{name}: {self.elapsed * 1000:.1f}ms\n\n")
+        pstats.Stats(self._profile, stream=output).sort_stats('cumulative').print_stats(top)
+        with open(text_path, 'w', encoding='utf-8') as f:
+            f.write(output.getvalue())
+        return [path, text_path]
+
+
+def create_profiler(mode, interval_ms=DEFAULT_INTERVAL_MS, thread_id=None):
+    if mode == 'cprofile':
+        return DeterministicProfiler()
+    return SamplingProfiler(interval_ms, thread_id=thread_id)
+
+
+def profile_filename(name, mode):
+    """保存するファイル名（日時_名前.拡張子）"""
+    slug = re.sub(r'[^0-9A-Za-z_.-]+', '_', name).strip('_') or 'profile'
+    suffix = '.prof' if mode == 'cprofile' else '.speedscope.json'
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{slug}{suffix}"
+
+
+def profiles_dir(output_dir=None):
+    path = os.path.join(output_dir or os.getenv('OUTPUT_DIR', 'out'), 'profiles')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# バッチスクリプト
+# ---------------------------------------------------------------------------
+
+_script_mode = None
+
+
+def set_script_profile(mode):
+    """--profile の値を設定する（@profiled() を付けた関数が計測される）"""
+    global _script_mode
+    _script_mode = normalize_mode(mode)
+
+
+def add_profile_argument(parser):
+    """argparse に --profile [sampling|cprofile] を追加する"""
+    parser.add_argument(
+        '--profile', nargs='?', const='sampling', choices=PROFILE_MODES, default=None,
+        help='処理を計測して OUTPUT_DIR/profiles/ に保存する（既定: sampling）',
+    )
+
+
+def profiled(name=None, interval_ms=DEFAULT_INTERVAL_MS, output_dir=None):
+    """バッチ処理の関数を計測するデコレーター
+
+    --profile（set_script_profile）または環境変数 PROFILE が指定されたときだけ計測する。
+    sampling は全スレッド（ワーカースレッドを含む）を記録する。
+    """
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            mode = _script_mode or normalize_mode(os.getenv('PROFILE'))
+            if mode is None:
+                return func(*args, **kwargs)
+            profiler = create_profiler(mode, interval_ms).start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.stop()
+                path = os.path.join(profiles_dir(output_dir), profile_filename(label, mode))
+                for saved in profiler.save(path, label):
+                    print(f"📈 プロファイルを保存しました: {saved}")
+
+        return wrapper
+
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Flask
+# ---------------------------------------------------------------------------
+
+def init_profiling(app):
+    """X-Profile ヘッダー（?_profile=）によるリクエストの計測と /api/dev/profiles を登録する
+
+    DEBUG か TESTING の設定で、PROFILING_ENABLED が有効な場合のみ。
+    """
+    if not app.config.get('PROFILING_ENABLED') or not (app.debug or app.testing):
+        return None
+
+    from flask import abort, g, jsonify, request, send_from_directory
+
+    directory = os.path.abspath(profiles_dir(app.config.get('OUTPUT_DIR')))
+    interval_ms = app.config.get('PROFILE_INTERVAL_MS', DEFAULT_INTERVAL_MS)
+
+    @app.before_request
+    def start_profiling():
+        mode = normalize_mode(request.headers.get('X-Profile') or request.args.get('_profile'))
+        if mode is None or request.path.startswith('/api/dev/profiles'):
+            return
+        name = f"{request.method} {request.path}"
+        try:
+            profiler = create_profiler(mode, interval_ms, thread_id=threading.get_ident()).start()
+        except ValueError:
+            # cProfileは同時に1つしか動かせない（別のリクエストを計測中）
+            return
+        g.list_tool_profile = (profiler, name, profile_filename(name, mode))
+
+    @app.after_request
+    def finish_profiling(response):
+        profile = g.pop('list_tool_profile', None)
+        if profile is None:
+            return response
+        profiler, name, filename = profile
+        response.headers['X-Profile-File'] = filename
+
+        def save():
+            profiler.stop()
+            profiler.save(os.path.join(directory, filename), name)
+
+        if response.is_streamed:
+            # エクスポートなどは送信し終わるまで計測する
+            response.call_on_close(save)
+        else:
+            save()
+        return response
+
+    @app.teardown_request
+    def abandon_profiling(exc):
+        # after_request まで到達しなかった場合（例外など）は保存せずに止める
+        profile = g.pop('list_tool_profile', None)
+        if profile is not None:
+            profile[0].stop()
+
+    @app.route("/api/dev/profiles")
+    def list_profiles():
+        """保存したプロファイルの一覧（新しい順）"""
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append({
+                    "name": entry.name,
+                    "size": stat.st_size,
+                    "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+                })
+        entries.sort(key=lambda entry: entry["created_at"], reverse=True)
+        return jsonify({"directory": directory, "profiles": entries})
+
+    @app.route("/api/dev/profiles/<path:filename>")
+    def download_profile(filename):
+        """保存したプロファイル（speedscope.app に読み込ませる）"""
+        if not os.path.isfile(os.path.join(directory, filename)):
+            abort(404)
+        return send_from_directory(directory, filename, as_attachment=True)
+
+    return directory
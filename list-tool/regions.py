@@ -0,0 +1,103 @@
+"""都道府県・エリアの定義"""
+
+import re
+
+PREFECTURES = [
+    "北海道", "青森", "岩手", "宮城", "秋田", "山形", "福島",
+    "茨城", "栃木", "群馬", "埼玉", "千葉", "東京", "神奈川",
+    "新潟", "富山", "石川", "福井", "山梨", "長野", "岐阜", "静岡", "愛知",
+    "三重", "滋賀", "京都", "大阪", "兵庫", "奈良", "和歌山",
+    "鳥取", "島根", "岡山", "広島", "山口",
+    "徳島", "香川", "愛媛", "高知",
+    "福岡", "佐賀", "長崎", "熊本", "大分", "宮崎", "鹿児島", "沖縄",
+]
+
+AREAS = ["北海道", "東北", "関東", "中部", "近畿", "中国", "四国", "九州"]
+
+AREA_PREFECTURES = {
+    "北海道": ["北海道"],
+    "東北": ["青森", "岩手", "宮城", "秋田", "山形", "福島"],
+    "関東": ["茨城", "栃木", "群馬", "埼玉", "千葉", "東京", "神奈川"],
+    "中部": ["新潟", "富山", "石川", "福井", "山梨", "長野", "岐阜", "静岡", "愛知"],
+    "近畿": ["三重", "滋賀", "京都", "大阪", "兵庫", "奈良", "和歌山"],
+    "中国": ["鳥取", "島根", "岡山", "広島", "山口"],
+    "四国": ["徳島", "香川", "愛媛", "高知"],
+    "九州": ["福岡", "佐賀", "長崎", "熊本", "大分", "宮崎", "鹿児島", "沖縄"],
+}
+
+
+def prefecture_of(address):
+    """住所の先頭から都道府県名を判定（該当なしはNone）"""
+    if not address:
+        return None
+    for pref in PREFECTURES:
+        if address.startswith(pref):
+            return pref
+    return None
+
+
+# 都市名から都道府県へのマッピング（cityに市名だけが入っている店舗用）
+CITY_TO_PREFECTURE = {
+    "東京": "東京",
+    "神奈川": "神奈川",
+    "千葉": "千葉",
+    "埼玉": "埼玉",
+    "大阪": "大阪",
+    "神戸": "兵庫",
+    "京都": "京都",
+    "横浜": "神奈川",
+    "川崎": "神奈川",
+    "相模原": "神奈川",
+    "さいたま": "埼玉",
+    "川口": "埼玉",
+    "船橋": "千葉",
+    "市川": "千葉",
+    "松山": "愛媛",
+    "高知": "高知",
+    "福島": "福島",
+    "金沢": "石川",
+    "宮崎": "宮崎",
+    "鳥取": "鳥取",
+}
+
+_STATION_DISTANCE = re.compile(r'[^都府県市区町村]*駅\s*\d+m\s*/?')
+_TRAILING_CATEGORY = re.compile(r'/\s*[^/]+$')
+_CITY = re.compile(r'([^都府県市区町村]+[市区町村])')
+_DISTRICT_TOWN = re.compile(r'([^都府県市区町村]+郡[^市区町村]+[町村])')
+
+
+def extract_city_from_address(address):
+    """住所から市区町村を抽出（抽出できなければNone）"""
+    if not address:
+        return None
+
+    addr = address
+    # 都道府県名を除去
+    for pref in PREFECTURES:
+        if addr.startswith(pref):
+            addr = addr[len(pref):].lstrip('都府県')
+            break
+
+    # 駅名と距離情報を除去（例: "池袋駅 396m"）
+    addr = _STATION_DISTANCE.sub('', addr)
+
+    # カテゴリー情報を除去（例: "/ カテゴリー"）
+    addr = _TRAILING_CATEGORY.sub('', addr)
+
+    # パターン1: "XX区", "XX市", "XX町", "XX村"（都道府県名の後）
+    match = _CITY.search(addr)
+    if match:
+        city = match.group(1).strip()
+        # 余分な文字を除去
+        city = re.sub(r'^\s*[、,]\s*', '', city)
+        if city and len(city) > 1 and not city.startswith('駅'):
+            return city
+
+    # パターン2: "XX郡XX町", "XX郡XX村"
+    match = _DISTRICT_TOWN.search(addr)
+    if match:
+        city = match.group(1).strip()
+        if city and len(city) > 1:
+            return city
+
+    return None
@@ -0,0 +1,303 @@
+"""APIレスポンスのキャッシュ
+
+キーは「名前空間:stores_version:正規化したパラメータ」。世代番号（data_version.py）は
+店舗データの書き込みと同じトランザクションで+1されるため、書き込み後に古いレスポンスを
+返すことはない。古い世代のエントリはLRUから押し出される（Redisは有効期限で消える）。
+
+- 1段目: プロセス内のLRU（RESPONSE_CACHE_SIZE件、0で無効）
+- 2段目: Redis（RESPONSE_CACHE_REDIS=1 のとき REDIS_URL を使用。ワーカー間で共有）
+
+JSONはシリアライズ済みのバイト列で保持し、ヒット時はそのまま返す。
+negotiate=True のルートは Accept: application/msgpack にMessagePackで応える（msgpackがある場合）。
+レスポンスにはETag（世代番号＋パラメータ）とLast-Modified（世代番号の更新日時）を付け、
+条件付きリクエストには304を返す。ヒット・ミス・304の数は /api/cache/stats で確認できる。
+キャッシュミス時、同じキーの計算が実行中ならその結果を共有する（singleflight.py、X-Cache: SHARED）。
+同時実行数の制限（admission.py）の枠は、実際に計算するときだけ取る（ヒット・304・結果の共有では取らない）。
+キーとETagの作成・条件付きリクエストの判定・形式の選択は、非同期API（async_api.py）と共有する。
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timezone
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+_REDIS_PREFIX = 'list-tool:response:'
+
+
+class ResponseCache:
+    """プロセス内LRU＋任意のRedis"""
+
+    def __init__(self, max_entries=1024, redis_client=None, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._redis = redis_client
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0, 'redis_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'redis_errors': 0,
+            'not_modified': 0,
+        }
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return value
+
+        if self._redis is not None:
+            try:
+                value = self._redis.get(_REDIS_PREFIX + key)
+            except Exception as e:
+                self._redis_failed(e)
+                value = None
+            if value is not None:
+                self._put_local(key, value)
+                with self._lock:
+                    self._stats['redis_hits'] += 1
+                return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key, value):
+        self._put_local(key, value)
+        if self._redis is not None:
+            try:
+                self._redis.set(_REDIS_PREFIX + key, value, ex=self.ttl)
+            except Exception as e:
+                self._redis_failed(e)
+        with self._lock:
+            self._stats['sets'] += 1
+
+    def _put_local(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    @property
+    def remote(self):
+        """Redisを使うか（get/set がネットワークを待つか）"""
+        return self._redis is not None
+
+    def record(self, name):
+        """キャッシュ以外で応答できた回数（304など）を数える"""
+        with self._lock:
+            self._stats[name] = self._stats.get(name, 0) + 1
+
+    def _redis_failed(self, e):
+        with self._lock:
+            self._stats['redis_errors'] += 1
+        logger.warning(f"Redisキャッシュへのアクセスに失敗しました: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['redis_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['redis_hits']) / lookups if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['redis'] = self._redis is not None
+        return stats
+
+
+def create_response_cache(get):
+    """設定から ResponseCache を作る（get(キー, 既定値) で設定値を返す関数を渡す）"""
+    redis_client = None
+    if get('RESPONSE_CACHE_REDIS', False):
+        if redis is None:
+            logger.warning("redisライブラリがないため、Redisキャッシュを無効化しました")
+        else:
+            try:
+                redis_client = redis.Redis.from_url(get('REDIS_URL', None), socket_timeout=0.5)
+                redis_client.ping()
+            except Exception as e:
+                logger.warning(f"Redisに接続できないため、Redisキャッシュを無効化しました: {e}")
+                redis_client = None
+
+    return ResponseCache(
+        max_entries=get('RESPONSE_CACHE_SIZE', 1024),
+        redis_client=redis_client,
+        ttl=get('RESPONSE_CACHE_TTL', 3600),
+    )
+
+
+def init_response_cache(app):
+    """設定に従ってキャッシュを作成し、app.extensions['response_cache'] に登録する"""
+    cache = create_response_cache(app.config.get)
+    app.extensions['response_cache'] = cache
+    return cache
+
+
+def cache_key_for(namespace, info, key, encoding='json'):
+    """(キャッシュのキー, ETag)。info は data_version.get_version_info() の値"""
+    from data_version import version_key
+
+    cache_key = f"{namespace}:{version_key(info)}:{key}"
+    if encoding != 'json':
+        cache_key += f":{encoding}"
+    return cache_key, hashlib.sha1(cache_key.encode('utf-8')).hexdigest()
+
+
+def is_not_modified(if_none_match, if_modified_since, etag, last_modified):
+    """条件付きリクエストの検証（If-None-Match を優先し、なければ If-Modified-Since）
+
+    if_none_match は werkzeug の ETags、if_modified_since は datetime（どちらもヘッダーがなければ空・None）。
+    """
+    if if_none_match:
+        # 圧縮したレスポンスは弱いETag（W/"..."）になるため弱い比較で判定する
+        return if_none_match.contains_weak(etag)
+    if if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= if_modified_since
+    return False
+
+
+def _not_modified(request, etag, last_modified):
+    return is_not_modified(request.if_none_match, request.if_modified_since, etag, last_modified)
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # 毎回再検証させる（データ更新後に古い内容を使わせないため）。再検証は304で済む
+    response.cache_control.no_cache = True
+    return response
+
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+_MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+
+def negotiate_encoding(accept_mimetypes):
+    """Accept（werkzeug の MIMEAccept）からレスポンスの形式を決める（'json' または 'msgpack'）
+
+    Accept が */* や未指定ならJSON。msgpackライブラリがなければ常にJSON。
+    """
+    if msgpack is None:
+        return 'json'
+    best = accept_mimetypes.best_match(('application/json',) + _MSGPACK_MIMETYPES)
+    return 'msgpack' if best in _MSGPACK_MIMETYPES else 'json'
+
+
+def _negotiate(request):
+    return negotiate_encoding(request.accept_mimetypes)
+
+
+def encode_msgpack(payload):
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def _encode(payload, encoding):
+    from flask import current_app
+
+    if encoding == 'msgpack':
+        return encode_msgpack(payload), MSGPACK_MIMETYPE
+    return current_app.json.response(payload).get_data(), current_app.json.mimetype
+
+
+def cached_json_response(namespace, key, build, negotiate=False):
+    """世代番号付きのキーでJSONレスポンスをキャッシュする
+
+    build() はレスポンスにする辞書を返す関数（キャッシュミス時のみ呼ばれる）。
+    ETagは世代番号とパラメータから作るため、If-None-Match / If-Modified-Since が一致すれば
+    DBにもキャッシュにも触れずに304を返す。
+    世代番号が取れない場合（data_versionsテーブルがない等）はキャッシュしない。
+    negotiate=True なら Accept に応じてMessagePackでも返す（形式ごとに別のキャッシュ・ETag）。
+    """
+    from flask import current_app, request
+
+    from admission import AdmissionRejected, rejection_response, run_admitted
+    from data_version import get_version_info
+    from extensions import db
+
+    encoding = _negotiate(request) if negotiate else 'json'
+
+    def finish(response):
+        if negotiate:
+            response.vary.add('Accept')
+        return response
+
+    def encoded():
+        # 計算とシリアライズの間だけ同時実行数の枠を使う（admission.py）
+        return run_admitted(lambda: _encode(build(), encoding))
+
+    info = get_version_info(db.session)
+    if info is None:
+        try:
+            body, mimetype = encoded()
+        except AdmissionRejected as e:
+            return finish(rejection_response(e.limiter))
+        return finish(current_app.response_class(body, mimetype=mimetype))
+
+    cache = current_app.extensions.get('response_cache')
+    cache_key, etag = cache_key_for(namespace, info, key, encoding)
+    last_modified = info[1]
+
+    if _not_modified(request, etag, last_modified):
+        if cache is not None:
+            cache.record('not_modified')
+        response = current_app.response_class(status=304)
+        return finish(_set_validators(response, etag, last_modified))
+
+    body = cache.get(cache_key) if cache is not None else None
+    status = 'HIT'
+    if body is None:
+        def compute():
+            value, _ = encoded()
+            if cache is not None:
+                cache.set(cache_key, value)
+            return value
+
+        # 同じキーの計算が実行中なら、その結果を待って共有する（singleflight.py）
+        single_flight = current_app.extensions.get('single_flight')
+        try:
+            if single_flight is not None:
+                body, shared = single_flight.do(cache_key, compute)
+            else:
+                body, shared = compute(), False
+        except AdmissionRejected as e:
+            return finish(rejection_response(e.limiter))
+        status = 'SHARED' if shared else 'MISS'
+
+    mimetype = MSGPACK_MIMETYPE if encoding == 'msgpack' else current_app.json.mimetype
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.headers['X-Cache'] = status
+    return finish(_set_validators(response, etag, last_modified))
+
+
+def static_json_response(payload, max_age=86400):
+    """定数データ（エリア・都道府県など）のJSONレスポンス
+
+    内容のハッシュをETagにし、Cache-Controlで一定時間ブラウザ・プロキシにキャッシュさせる。
+    """
+    from flask import current_app, request
+
+    response = current_app.json.response(payload)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
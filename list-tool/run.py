@@ -1,17 +1,10 @@
-"""アプリケーション起動スクリプト"""
-import os
-from app import create_app
-
-# ローカル環境ではSQLite3を使用
-config_name = os.getenv('FLASK_ENV', 'local')
+"""アプリケーション起動スクリプト（開発用）
 
-# ローカル設定を登録
-if config_name == 'local':
-    import config_local
-    import config
-    config.config['local'] = config_local.LocalConfig
-
-app = create_app(config_name)
+本番環境では gunicorn を使う:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+from wsgi import app, config_name
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))  # 環境変数PORTが設定されていればそれを使用、なければ5000
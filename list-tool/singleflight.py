@@ -0,0 +1,312 @@
+"""同じ計算の同時実行をまとめる（シングルフライト）
+
+データ更新の直後にダッシュボードが一斉に開かれると、同じ /api/stats や /api/categories の計算
+（全件走査）が並行して何十回も走る。キー（エンドポイント・正規化したパラメータ・世代番号）が同じ
+計算が実行中なら、後から来たリクエストはその完了を待って結果を共有する。
+
+- プロセス内: 最初のリクエストだけが計算し、同じキーの他のスレッドは threading.Event で待つ
+- ワーカー間（SINGLE_FLIGHT_REDIS=1）: Redisのロック（SET NX PX）を取れたワーカーだけが計算し、
+  結果（バイト列）をRedisに短時間置く。取れなかったワーカーは結果が置かれるまでポーリングで待つ
+
+計算が SINGLE_FLIGHT_WAIT_MS 以内に終わらない・計算したワーカーが落ちた場合は、待っていた側が自分で計算する。
+計算が例外で失敗した場合は、プロセス内で待っていたリクエストにも同じ例外を返す。
+response_cache.cached_json_response から使われる（stats・categories・cities・facets・brands・stores）。
+非同期API（async_api.py）は do_async を使う（プロセス内は asyncio.Future で待ち、Redisへのアクセスはスレッドで行う）。
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_REDIS_LOCK_PREFIX = 'list-tool:singleflight:lock:'
+_REDIS_RESULT_PREFIX = 'list-tool:singleflight:result:'
+
+# 自分のトークンのときだけロックを消す
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    """実行中の計算（プロセス内）"""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """キーごとに計算を1つにまとめる"""
+
+    def __init__(self, redis_client=None, lock_timeout=60.0, wait_timeout=30.0, result_ttl=30.0,
+                 poll_interval=0.05):
+        self._redis = redis_client
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._async_calls = {}  # キー -> asyncio.Future（イベントループのスレッドからだけ使う）
+        self._lock = threading.Lock()
+        self._stats = {
+            'leaders': 0, 'shared': 0, 'redis_shared': 0, 'wait_timeouts': 0, 'redis_fallbacks': 0,
+            'redis_errors': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def do(self, key, compute):
+        """compute() の結果を返す。同じキーの計算が実行中ならその結果を共有する
+
+        戻り値は (結果, 共有したか)。Redisを使う場合、compute() はバイト列を返すこと。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(self.wait_timeout):
+                self._count('shared')
+                if call.error is not None:
+                    raise call.error
+                return call.value, True
+            # 計算が終わらない場合は自分で計算する（まとめずに実行する）
+            self._count('wait_timeouts')
+            return compute(), False
+
+        self._count('leaders')
+        try:
+            if self._redis is not None:
+                call.value, shared = self._do_redis(key, compute)
+            else:
+                call.value, shared = compute(), False
+            return call.value, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key, compute):
+        """do() の asyncio 版（compute は結果を返すコルーチン関数）"""
+        future = self._async_calls.get(key)
+        if future is not None:
+            try:
+                value = await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+            except asyncio.TimeoutError:
+                # 計算が終わらない場合は自分で計算する（まとめずに実行する）
+                self._count('wait_timeouts')
+                return await compute(), False
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # 計算していたリクエストが切断された場合は自分で計算する
+                return await compute(), False
+            self._count('shared')
+            return value, True
+
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        # 待っているリクエストがなくても「例外が取り出されなかった」警告を出さない
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._count('leaders')
+        try:
+            if self._redis is not None:
+                value, shared = await self._do_redis_async(key, compute)
+            else:
+                value, shared = await compute(), False
+            future.set_result(value)
+            return value, shared
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._async_calls.pop(key, None)
+
+    def _do_redis(self, key, compute):
+        """ワーカー間でまとめる（Redisのロックを取れなければ、他のワーカーの結果を待つ）"""
+        token = uuid.uuid4().hex
+        state, value = self._redis_claim(key, token)
+        if state == 'value':
+            return value, True
+        if state == 'compute':
+            return compute(), False
+        if state == 'leader':
+            try:
+                value = compute()
+                self._redis_publish(key, value)
+                return value, False
+            finally:
+                self._redis_unlock(key, token)
+
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            state, value = self._redis_poll(key)
+            if state == 'value':
+                return value, True
+            if state == 'gone':
+                break
+            time.sleep(self.poll_interval)
+        self._count('redis_fallbacks')
+        return compute(), False
+
+    async def _do_redis_async(self, key, compute):
+        """_do_redis の asyncio 版（Redisへのアクセスはスレッドで行う）"""
+        token = uuid.uuid4().hex
+        state, value = await asyncio.to_thread(self._redis_claim, key, token)
+        if state == 'value':
+            return value, True
+        if state == 'compute':
+            return await compute(), False
+        if state == 'leader':
+            try:
+                value = await compute()
+                await asyncio.to_thread(self._redis_publish, key, value)
+                return value, False
+            finally:
+                await asyncio.to_thread(self._redis_unlock, key, token)
+
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            state, value = await asyncio.to_thread(self._redis_poll, key)
+            if state == 'value':
+                return value, True
+            if state == 'gone':
+                break
+            await asyncio.sleep(self.poll_interval)
+        self._count('redis_fallbacks')
+        return await compute(), False
+
+    def _redis_claim(self, key, token):
+        """直前の結果があれば ('value', 結果)、ロックを取れれば ('leader', None)、
+        他のワーカーが計算中なら ('wait', None)、Redisに失敗したら ('compute', None)
+        """
+        try:
+            # 直前に他のワーカーが計算し終えていればその結果を使う
+            value = self._redis.get(_REDIS_RESULT_PREFIX + key)
+            if value is not None:
+                self._count('redis_shared')
+                return 'value', value
+            acquired = self._redis.set(_REDIS_LOCK_PREFIX + key, token, nx=True,
+                                       px=int(self.lock_timeout * 1000))
+        except Exception as e:
+            self._redis_failed(e)
+            return 'compute', None
+        return ('leader' if acquired else 'wait'), None
+
+    def _redis_publish(self, key, value):
+        try:
+            self._redis.set(_REDIS_RESULT_PREFIX + key, value, px=int(self.result_ttl * 1000))
+        except Exception as e:
+            self._redis_failed(e)
+
+    def _redis_unlock(self, key, token):
+        try:
+            self._redis.eval(_RELEASE_SCRIPT, 1, _REDIS_LOCK_PREFIX + key, token)
+        except Exception as e:
+            self._redis_failed(e)
+
+    def _redis_poll(self, key):
+        """結果が置かれていれば ('value', 結果)、計算中なら ('wait', None)、
+        計算したワーカーが結果を置かずに終わった（失敗・停止）・Redisに失敗したら ('gone', None)
+        """
+        result_key = _REDIS_RESULT_PREFIX + key
+        try:
+            value = self._redis.get(result_key)
+            if value is None and not self._redis.exists(_REDIS_LOCK_PREFIX + key):
+                value = self._redis.get(result_key)
+                if value is None:
+                    return 'gone', None
+        except Exception as e:
+            self._redis_failed(e)
+            return 'gone', None
+        if value is None:
+            return 'wait', None
+        self._count('redis_shared')
+        return 'value', value
+
+    def _redis_failed(self, e):
+        self._count('redis_errors')
+        logger.warning(f"シングルフライトのRedisへのアクセスに失敗しました: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls) + len(self._async_calls)
+        stats['redis'] = self._redis is not None
+        return stats
+
+
+def _metric_samples(single_flight):
+    stats = single_flight.stats()
+    events = ('leaders', 'shared', 'redis_shared', 'wait_timeouts', 'redis_fallbacks', 'redis_errors')
+    return [
+        ('single_flight_events_total', 'counter', '計算したリクエスト・結果を共有したリクエストなどの件数',
+         [((('event', name),), stats[name]) for name in events]),
+        ('single_flight_in_flight', 'gauge', '実行中の計算の数', [((), stats['in_flight'])]),
+    ]
+
+
+def create_single_flight(get):
+    """設定から SingleFlight を作る（SINGLE_FLIGHT_ENABLED=False ならNone）
+
+    get(キー, 既定値) で設定値を返す関数を渡す（app.config.get など）。
+    """
+    if not get('SINGLE_FLIGHT_ENABLED', True):
+        return None
+
+    redis_client = None
+    if get('SINGLE_FLIGHT_REDIS', False):
+        if redis is None:
+            logger.warning("redisライブラリがないため、ワーカー間のシングルフライトを無効化しました")
+        else:
+            try:
+                redis_client = redis.Redis.from_url(get('REDIS_URL', None), socket_timeout=0.5)
+                redis_client.ping()
+            except Exception as e:
+                logger.warning(f"Redisに接続できないため、ワーカー間のシングルフライトを無効化しました: {e}")
+                redis_client = None
+
+    return SingleFlight(
+        redis_client=redis_client,
+        lock_timeout=get('SINGLE_FLIGHT_LOCK_TIMEOUT_MS', 60000) / 1000,
+        wait_timeout=get('SINGLE_FLIGHT_WAIT_MS', 30000) / 1000,
+    )
+
+
+def init_single_flight(app):
+    """設定に従って SingleFlight を作成し、app.extensions['single_flight'] に登録する
+
+    SINGLE_FLIGHT_ENABLED=False なら None を登録する（cached_json_response は毎回計算する）。
+    """
+    single_flight = create_single_flight(app.config.get)
+    app.extensions['single_flight'] = single_flight
+    if single_flight is None:
+        return None
+
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.add_collector(lambda: _metric_samples(single_flight))
+    return single_flight
@@ -0,0 +1,281 @@
+"""遅いクエリの記録（SQL・パラメータ・呼び出し元・実行計画）
+
+SLOW_QUERY_MS 以上かかったSQLについて、以下をログファイル（1行1件のJSON、ローテーションあり）と
+プロセス内の直近 SLOW_QUERY_KEEP 件に記録する。直近の記録は /api/admin/slow-queries で確認できる。
+    - SQL と バインドパラメータ（文字列は伏せ字。LIKE の % の位置だけ残す）
+    - 呼び出し元（エンドポイント or スクリプト名と、list-tool内のファイル:行）
+    - 実行計画（PostgreSQL: EXPLAIN、SQLite: EXPLAIN QUERY PLAN）。SELECT のみ
+
+実行計画は同じ接続で取得するため、遅いクエリ1件ごとにSQLが1回増える。
+LIKE '%…%' による全件走査やインデックスの不足を本番環境で確認するためのもの。
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_STARTED_KEY = 'list_tool_slow_query_started'
+
+# 実行計画を取るSQL（更新系は EXPLAIN でも副作用の心配があるため対象外）
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+_MAX_SQL_LENGTH = 10000
+_MAX_PARAMETERS = 20
+
+
+def redact(value):
+    """パラメータの伏せ字（数値・日付・None はそのまま、文字列は % の位置だけ残す）"""
+    if isinstance(value, str):
+        return re.sub(r'[^%]+', '***', value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # selectinload の IN (...) などは先頭だけ
+        items = [redact(item) for item in value[:_MAX_PARAMETERS]]
+        if len(value) > _MAX_PARAMETERS:
+            items.append(f"…（全{len(value)}件）")
+        return items
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def _caller():
+    """呼び出し元（Flaskのリクエスト中ならエンドポイント、それ以外はスクリプト名）"""
+    try:
+        from flask import has_request_context, request
+        if has_request_context():
+            rule = request.url_rule.rule if request.url_rule is not None else request.path
+            return f"{request.method} {rule}"
+    except ImportError:
+        pass
+    return os.path.basename(sys.argv[0]) or 'python'
+
+
+def _source():
+    """SQLを発行したlist-tool内のコード（ファイル:行 関数名）"""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(BASE_DIR) and filename != os.path.abspath(__file__):
+            return f"{os.path.relpath(filename, BASE_DIR)}:{frame.lineno} {frame.name}"
+    return None
+
+
+def explain(connection, dialect_name, statement, parameters):
+    """実行計画を文字列の行のリストで返す（対応していないDBならNone）
+
+    SQLAlchemyのイベントを発生させないよう、同じ接続のDBAPIのカーソルで直接実行する。
+    PostgreSQLでは失敗するとトランザクションが中断されるため、SAVEPOINTの中で実行する。
+    """
+    if dialect_name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect_name == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+
+    raw = connection.connection.cursor()
+    try:
+        if dialect_name == 'postgresql':
+            raw.execute('SAVEPOINT list_tool_explain')
+        try:
+            raw.execute(prefix + statement, parameters)
+            rows = raw.fetchall()
+        finally:
+            if dialect_name == 'postgresql':
+                raw.execute('ROLLBACK TO SAVEPOINT list_tool_explain')
+                raw.execute('RELEASE SAVEPOINT list_tool_explain')
+    finally:
+        raw.close()
+
+    if dialect_name == 'sqlite':
+        # (id, parent, notused, detail) → 親子関係をインデントで表す
+        depth = {0: -1}
+        lines = []
+        for row in rows:
+            level = depth.get(row[1], -1) + 1
+            depth[row[0]] = level
+            lines.append('  ' * level + str(row[3]))
+        return lines
+    return [str(row[0]) for row in rows]
+
+
+class SlowQueryLog:
+    """遅いクエリの記録"""
+
+    def __init__(self, threshold_ms, keep=200, explain_plans=True, log_file=None,
+                 max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.threshold = threshold_ms / 1000
+        self.keep = keep
+        self.explain_plans = explain_plans
+        self.log_file = log_file
+        self._records = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self.total = 0
+        self._file_logger = None
+        if log_file:
+            self._file_logger = self._open_log(log_file, max_bytes, backup_count)
+
+    @staticmethod
+    def _open_log(log_file, max_bytes, backup_count):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"遅いクエリのログファイルを開けません（メモリのみに記録します）: {e}")
+            return None
+        file_logger = logging.getLogger(f"{__name__}.file.{os.path.abspath(log_file)}")
+        file_logger.propagate = False
+        file_logger.setLevel(logging.INFO)
+        if not file_logger.handlers:
+            file_logger.addHandler(handler)
+        else:
+            handler.close()
+        return file_logger
+
+    # -- SQLAlchemyのイベント ----------------------------------------------
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_STARTED_KEY, []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get(_STARTED_KEY)
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if elapsed < self.threshold:
+            return
+        try:
+            self.record(conn, statement, parameters, executemany, elapsed)
+        except Exception as e:
+            # 記録の失敗で本来のクエリを失敗させない
+            logger.warning(f"遅いクエリを記録できませんでした: {e}")
+
+    def instrument(self, engine):
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    # -- 記録 --------------------------------------------------------------
+
+    def record(self, conn, statement, parameters, executemany, elapsed):
+        plan = None
+        plan_error = None
+        if self.explain_plans and not executemany and _EXPLAINABLE.match(statement):
+            try:
+                plan = explain(conn, conn.dialect.name, statement, parameters)
+            except Exception as e:
+                plan_error = str(e)
+
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(elapsed * 1000, 1),
+            'caller': _caller(),
+            'source': _source(),
+            'sql': statement if len(statement) <= _MAX_SQL_LENGTH else statement[:_MAX_SQL_LENGTH] + '…',
+            # executemany は先頭の数件のみ
+            'parameters': redact(parameters[:3] if executemany else parameters),
+            'executemany': executemany,
+            'plan': plan,
+        }
+        if plan_error:
+            entry['plan_error'] = plan_error
+
+        with self._lock:
+            self.total += 1
+            self._records.append(entry)
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+        return entry
+
+    def recent(self, limit=None):
+        """新しい順の記録"""
+        with self._lock:
+            records = list(self._records)
+        records.reverse()
+        return records[:limit] if limit else records
+
+    def summary(self):
+        """同じSQLごとの件数・最大・合計時間（合計時間の大きい順）"""
+        groups = {}
+        for entry in self.recent():
+            group = groups.get(entry['sql'])
+            if group is None:
+                group = groups[entry['sql']] = {
+                    'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'callers': [], 'plan': entry['plan'],
+                }
+            group['count'] += 1
+            group['total_ms'] = round(group['total_ms'] + entry['duration_ms'], 1)
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            if entry['caller'] not in group['callers']:
+                group['callers'].append(entry['caller'])
+        return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+
+
+def from_config(get):
+    """設定から SlowQueryLog を作る（SLOW_QUERY_MS が0以下ならNone）
+
+    get(キー, 既定値) で設定値を返す関数を渡す（app.config.get など）。
+    """
+    threshold = get('SLOW_QUERY_MS', 0)
+    if not threshold or threshold <= 0:
+        return None
+    return SlowQueryLog(
+        threshold,
+        keep=get('SLOW_QUERY_KEEP', 200),
+        explain_plans=get('SLOW_QUERY_EXPLAIN', True),
+        log_file=get('SLOW_QUERY_LOG_FILE', None),
+        max_bytes=get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backup_count=get('SLOW_QUERY_LOG_BACKUP_COUNT', 5),
+    )
+
+
+def init_slow_query_log(app, register_view=True):
+    """db.engine に遅いクエリの記録を仕掛け、/api/admin/slow-queries を登録する
+
+    バッチスクリプト（bootstrap.create_cli_app）からは register_view=False で呼ぶ。
+    """
+    slow_queries = from_config(app.config.get)
+    app.extensions['slow_queries'] = slow_queries
+    if slow_queries is None:
+        return None
+
+    from extensions import db
+
+    with app.app_context():
+        slow_queries.instrument(db.engine)
+
+    if register_view:
+        from flask import jsonify, request
+
+        @app.route("/api/admin/slow-queries")
+        def admin_slow_queries():
+            """遅いクエリの一覧（このプロセスの直近分。全ワーカー分はログファイルを参照）"""
+            try:
+                limit = min(int(request.args.get('limit', 50)), slow_queries.keep)
+            except ValueError:
+                return jsonify({"error": "limitは整数で指定してください"}), 400
+            return jsonify({
+                "threshold_ms": slow_queries.threshold * 1000,
+                "total": slow_queries.total,
+                "log_file": slow_queries.log_file,
+                "summary": slow_queries.summary(),
+                "recent": slow_queries.recent(limit),
+            })
+
+    return slow_queries
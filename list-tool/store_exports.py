@@ -0,0 +1,296 @@
+"""店舗エクスポートの書き出し（CSV / JSON / Excel / Parquet）
+
+全件を読み込んでから文字列を組み立てるのではなく、BATCH_SIZE 件ずつ読み込みながら
+チャンク（str）を返すジェネレーター。Flaskのストリーミングレスポンスにそのまま渡せ、
+compression.py がチャンクごとに圧縮して送る。出力内容は従来の一括生成と同じ。
+Excel（write_excel）はファイル全体を組み立てる必要があるため、書き出し先のファイルオブジェクトに保存する。
+Parquet（iter_parquet）はORMオブジェクトを作らずに列の値だけを PARQUET_ROW_GROUP_SIZE 件ずつ読み込み、
+1回分を1つの行グループとして書き出すたびにそのバイト列を返す（pyarrowが必要）。
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from models import DeliveryService, Store
+from regions import prefecture_of
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+BATCH_SIZE = 1000
+# Parquetの1行グループの件数（小さすぎると圧縮率と読み込み速度が落ちる）
+PARQUET_ROW_GROUP_SIZE = 20000
+
+CSV_HEADERS = [
+    '店舗ID', '店舗名', '電話番号', 'ウェブサイト', '住所', 'カテゴリ',
+    '評価', '都市', '開店日', '定休日', '交通アクセス', '営業時間',
+    '公式アカウント', 'データソース'
+]
+
+
+def export_row(store):
+    """CSV/Excelの1行（CSV_HEADERS の順）"""
+    return [
+        store.store_id, store.name, store.phone, store.website,
+        store.address, store.category, store.rating, store.city,
+        store.opening_date, store.closed_day, store.transport,
+        store.business_hours, store.official_account, store.data_source
+    ]
+
+
+def iter_stores(query, batch_size=BATCH_SIZE):
+    """query の店舗を batch_size 件ずつ読み込む
+
+    実行は呼び出した時点で行うため、テーブルがない等のエラーはここで発生する。
+    """
+    return iter(query.yield_per(batch_size))
+
+
+def iter_csv(stores, batch_size=BATCH_SIZE):
+    """店舗のCSV（ヘッダー付き）を batch_size 行ずつのチャンクで返す"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADERS)
+    for i, store in enumerate(stores, 1):
+        writer.writerow(export_row(store))
+        if i % batch_size == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+
+def iter_json(stores):
+    """{"stores": [...]} のJSON（indent=2）を店舗ごとのチャンクで返す
+
+    json.dumps({"stores": [...]}, ensure_ascii=False, indent=2) と同じ文字列になる。
+    """
+    first = True
+    for store in stores:
+        item = json.dumps(store.to_dict(), ensure_ascii=False, indent=2).replace('\n', '\n    ')
+        if first:
+            yield '{\n  "stores": [\n    ' + item
+            first = False
+        else:
+            yield ',\n    ' + item
+    yield '{\n  "stores": []\n}' if first else '\n  ]\n}'
+
+
+def json_export_query(query):
+    """JSONエクスポート用（デリバリーサービスをまとめて読み込む）"""
+    return query.options(selectinload(Store.delivery_services))
+
+
+def write_excel(stores, output):
+    """店舗のExcel（ヘッダー付き、列幅は内容に合わせて最大50）を output に保存する（openpyxlが必要）"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "店舗一覧"
+
+    ws.append(CSV_HEADERS)
+
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    for cell in ws[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+
+    for store in stores:
+        ws.append(export_row(store))
+
+    for column in ws.columns:
+        max_length = 0
+        column_letter = get_column_letter(column[0].column)
+        for cell in column:
+            if cell.value:
+                max_length = max(max_length, len(str(cell.value)))
+        ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
+
+    wb.save(output)
+
+
+# ---------------------------------------------------------------------------
+# Parquet
+# ---------------------------------------------------------------------------
+
+# 読み込む列（location は緯度・経度に分ける。delivery_services は行グループごとにまとめて読み込む）
+_PARQUET_SOURCE_COLUMNS = (
+    Store.store_id, Store.name, Store.phone, Store.website, Store.address, Store.category,
+    Store.rating, Store.city, Store.place_id, Store.url, Store.is_franchise, Store.brand_key,
+    Store.location, Store.opening_date, Store.closed_day, Store.transport, Store.business_hours,
+    Store.official_account, Store.data_source, Store.collected_at, Store.updated_at,
+)
+
+# 値の種類が少ない列は辞書エンコードする（pandasではcategory型として読み込まれる）
+PARQUET_DICTIONARY_COLUMNS = ('prefecture', 'city', 'category', 'data_source')
+
+
+def parquet_schema():
+    """Parquetの列（Store.to_dict() の項目 + 住所から判定した prefecture）"""
+    string = pa.string()
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('store_id', string), ('name', string), ('phone', string), ('website', string),
+        ('address', string), ('prefecture', category), ('category', category), ('rating', pa.float64()),
+        ('city', category), ('place_id', string), ('url', string), ('is_franchise', pa.bool_()),
+        ('brand_key', string), ('location_lat', pa.float64()), ('location_lng', pa.float64()),
+        ('opening_date', string), ('closed_day', string), ('transport', string),
+        ('business_hours', string), ('official_account', string), ('data_source', category),
+        ('collected_at', pa.timestamp('us')), ('updated_at', pa.timestamp('us')),
+        ('delivery_services', pa.list_(string)),
+    ])
+
+
+def _location_of(location):
+    """(緯度, 経度)。Store.location_lat / location_lng と同じ判定"""
+    if not location:
+        return None, None
+    try:
+        return location.y, location.x
+    except (AttributeError, TypeError):
+        try:
+            loc_data = json.loads(location)
+            return loc_data.get('lat'), loc_data.get('lng')
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            return None, None
+
+
+def _timestamp(value):
+    # SQLiteのraw文字列などは datetime に変換する
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def iter_store_columns(query, batch_size=PARQUET_ROW_GROUP_SIZE):
+    """query の店舗を列の値のタプルで batch_size 件ずつ（リストで）返す
+
+    iter_stores と同じく、実行は呼び出した時点で行う。
+    """
+    rows = iter(query.with_entities(*_PARQUET_SOURCE_COLUMNS).yield_per(batch_size))
+    session = query.session
+
+    def batches():
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch, _active_delivery_services(session, [row[0] for row in batch])
+
+    return batches()
+
+
+def _active_delivery_services(session, store_ids, chunk_size=500):
+    """{store_id: [サービス名, ...]}（有効なものだけ。selectinload と同じく500件ずつのIN）
+
+    is_active はPythonで絞り込む（条件に含めると、SQLiteが store_id ではなく
+    is_active のインデックスを使ってしまい大幅に遅くなる）。
+    """
+    services = {}
+    for i in range(0, len(store_ids), chunk_size):
+        stmt = select(
+            DeliveryService.store_id, DeliveryService.service_name, DeliveryService.is_active,
+        ).where(DeliveryService.store_id.in_(store_ids[i:i + chunk_size]))
+        for store_id, service_name, is_active in session.execute(stmt):
+            if is_active:
+                services.setdefault(store_id, []).append(service_name)
+    return services
+
+
+def _parquet_table(schema, batch, services):
+    (store_id, name, phone, website, address, category, rating, city, place_id, url, is_franchise,
+     brand_key, location, opening_date, closed_day, transport, business_hours, official_account,
+     data_source, collected_at, updated_at) = (list(column) for column in zip(*batch))
+    locations = [_location_of(value) for value in location]
+    columns = {
+        'store_id': store_id, 'name': name, 'phone': phone, 'website': website, 'address': address,
+        'prefecture': [prefecture_of(value) for value in address], 'category': category,
+        'rating': rating, 'city': city, 'place_id': place_id, 'url': url,
+        'is_franchise': [bool(value) if value is not None else None for value in is_franchise],
+        'brand_key': brand_key,
+        'location_lat': [lat for lat, _ in locations], 'location_lng': [lng for _, lng in locations],
+        'opening_date': opening_date, 'closed_day': closed_day, 'transport': transport,
+        'business_hours': business_hours, 'official_account': official_account,
+        'data_source': data_source,
+        'collected_at': [_timestamp(value) for value in collected_at],
+        'updated_at': [_timestamp(value) for value in updated_at],
+        'delivery_services': [services.get(value, []) for value in store_id],
+    }
+    arrays = []
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(columns[field.name], type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(columns[field.name], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """書き込まれたバイト列を溜めておき、take() で取り出す（ParquetWriterの書き出し先）"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_parquet(batches, compression='zstd', on_batch=None):
+    """iter_store_columns のバッチをParquet（行グループ = 1バッチ）にして、書き出したバイト列を順に返す
+
+    on_batch を指定すると、行グループを書き出すたびにその件数で呼び出す（進捗の表示用）。
+    """
+    if pa is None:
+        raise ImportError("pyarrowライブラリがインストールされていません。")
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(
+        sink, schema, compression=compression, use_dictionary=list(PARQUET_DICTIONARY_COLUMNS),
+    )
+    try:
+        for batch, services in batches:
+            writer.write_table(_parquet_table(schema, batch, services))
+            if on_batch is not None:
+                on_batch(len(batch))
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.take()
@@ -0,0 +1,129 @@
+"""店舗の絞り込み条件（一覧・件数・ファセット・全エクスポートで共有）
+
+クエリパラメータを正規化した FilterSpec（ハッシュ可能・不変）に変換し、
+SQLの条件式へのコンパイルは FilterSpec ごとに一度だけ行う（LRUキャッシュ）。
+FilterSpec.cache_key はプロセスをまたいで安定なので、結果や件数のキャッシュキーに使える。
+
+対応パラメータ:
+    search / search_mode (AND|OR) / match_type (partial|exact)
+    prefectures / cities / categories / data_sources / brands（いずれも複数指定可）
+"""
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Tuple
+
+from sqlalchemy import or_
+
+from models import Store
+
+# 複数指定できるパラメータ
+LIST_PARAMS = ('prefectures', 'cities', 'categories', 'data_sources', 'brands')
+
+
+def _canonical_list(values):
+    """空値を除き、重複を取り除いて並べ替える（指定順は結果に影響しないため）
+
+    値はすべて空でないので、各条件で「NULLや空文字でない」判定を別に付ける必要はない。
+    """
+    return tuple(sorted({v.strip() for v in values if v and v.strip()}))
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    """正規化された絞り込み条件"""
+    search_terms: Tuple[str, ...] = ()
+    search_mode: str = 'AND'
+    match_type: str = 'partial'
+    prefectures: Tuple[str, ...] = ()
+    cities: Tuple[str, ...] = ()
+    categories: Tuple[str, ...] = ()
+    data_sources: Tuple[str, ...] = ()
+    brands: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_args(cls, args):
+        """request.args（MultiDict）や starlette の QueryParams から作成"""
+        search_terms = _canonical_list((args.get('search') or '').split())
+        search_mode = (args.get('search_mode') or 'AND').upper()
+        # キーワードが1つ以下ならAND/ORは結果に影響しない
+        if search_mode != 'OR' or len(search_terms) < 2:
+            search_mode = 'AND'
+        match_type = 'partial' if (args.get('match_type') or 'partial') == 'partial' else 'exact'
+        if not search_terms:
+            match_type = 'partial'
+
+        return cls(
+            search_terms=search_terms,
+            search_mode=search_mode,
+            match_type=match_type,
+            **{name: _canonical_list(args.getlist(name)) for name in LIST_PARAMS},
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return self == FilterSpec()
+
+    @property
+    def cache_key(self) -> str:
+        """プロセスをまたいで安定なキー（Pythonのhash()はプロセスごとに異なるため使わない）"""
+        payload = json.dumps(asdict(self), ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def conditions(self) -> tuple:
+        """SQLの条件式（select(...).where(*spec.conditions()) で使う）"""
+        return compile_filters(self)
+
+    def without(self, *names) -> 'FilterSpec':
+        """指定した条件を外したFilterSpec（ファセットの件数計算用）"""
+        return FilterSpec(**{**asdict(self), **{name: () for name in names}})
+
+
+@lru_cache(maxsize=512)
+def compile_filters(spec: FilterSpec) -> tuple:
+    """FilterSpec をSQLAlchemyの条件式のタプルにコンパイルする"""
+    conditions = []
+
+    # キーワード検索（店舗名・住所・カテゴリ）
+    if spec.search_terms:
+        keyword_conditions = []
+        for kw in spec.search_terms:
+            pattern = f"%{kw}%" if spec.match_type == 'partial' else kw
+            keyword_conditions.append(
+                or_(
+                    Store.name.ilike(pattern),
+                    Store.address.ilike(pattern),
+                    Store.category.ilike(pattern),
+                )
+            )
+        if spec.search_mode == 'OR':
+            conditions.append(or_(*keyword_conditions))
+        else:
+            conditions.extend(keyword_conditions)
+
+    # 都道府県フィルター（住所の先頭に都道府県名が含まれている前提）
+    if spec.prefectures:
+        conditions.append(or_(*[Store.address.like(f"{pref}%") for pref in spec.prefectures]))
+
+    # 市区町村フィルター
+    if spec.cities:
+        conditions.append(Store.city.in_(spec.cities))
+
+    # カテゴリフィルター（完全一致、またはカテゴリー値に選択値が含まれる）
+    # 例：「居酒屋」を選択した場合、「居酒屋」「松山市 / 居酒屋」などがマッチする
+    if spec.categories:
+        conditions.append(or_(*[
+            or_(Store.category == category, Store.category.contains(category))
+            for category in spec.categories
+        ]))
+
+    # データソースフィルター
+    if spec.data_sources:
+        conditions.append(Store.data_source.in_(spec.data_sources))
+
+    # チェーン（ブランド）フィルター
+    if spec.brands:
+        conditions.append(Store.brand_key.in_(spec.brands))
+
+    return tuple(conditions)
@@ -0,0 +1,551 @@
+"""店舗の読み取りクエリ（Flaskのルートと非同期API（async_api.py）で共有）
+
+クエリパラメータからSQLAlchemyの select 文を組み立てる部分と、
+取得した行をレスポンス用の辞書にまとめる部分だけを持ち、実行はしない。
+同期版は db.session.execute()、非同期版は AsyncSession.execute() で同じ文を実行する。
+
+args は request.args（werkzeugのMultiDict）または starlette の QueryParams。
+どちらも get() / getlist() を持つ。絞り込み条件は store_filters.FilterSpec から作る。
+"""
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.orm import load_only, selectinload
+
+from models import DeliveryService, Store
+from regions import AREA_PREFECTURES, CITY_TO_PREFECTURE, PREFECTURES, extract_city_from_address
+
+
+# ---------------------------------------------------------------------------
+# /api/stores
+# ---------------------------------------------------------------------------
+
+def store_count_statement(conditions):
+    return select(func.count()).select_from(Store).where(*conditions)
+
+
+# fields= で指定できる項目（Store.to_dict() のキー）→ 読み込む列
+_FIELD_COLUMNS = {
+    'store_id': (Store.store_id,),
+    'name': (Store.name,),
+    'phone': (Store.phone,),
+    'website': (Store.website,),
+    'address': (Store.address,),
+    'category': (Store.category,),
+    'rating': (Store.rating,),
+    'city': (Store.city,),
+    'place_id': (Store.place_id,),
+    'url': (Store.url,),
+    'is_franchise': (Store.is_franchise,),
+    'brand_key': (Store.brand_key,),
+    'location_lat': (Store.location,),
+    'location_lng': (Store.location,),
+    'opening_date': (Store.opening_date,),
+    'closed_day': (Store.closed_day,),
+    'transport': (Store.transport,),
+    'business_hours': (Store.business_hours,),
+    'official_account': (Store.official_account,),
+    'data_source': (Store.data_source,),
+    'collected_at': (Store.collected_at,),
+    'updated_at': (Store.updated_at,),
+    'delivery_services': (),  # selectinloadで別に読み込む
+}
+STORE_FIELDS = tuple(_FIELD_COLUMNS)
+
+# そのまま属性を返さない項目
+_FIELD_GETTERS = {
+    'collected_at': lambda store: store.collected_at.isoformat() if store.collected_at else None,
+    'updated_at': lambda store: store.updated_at.isoformat() if store.updated_at else None,
+    'delivery_services': lambda store: [ds.service_name for ds in store.delivery_services if ds.is_active],
+}
+
+
+def parse_fields(args):
+    """fields=（カンマ区切り・複数指定可）を項目のタプルにする（未指定ならNone＝全項目）
+
+    順序は STORE_FIELDS に揃え、store_id は常に含める。未知の項目は ValueError。
+    """
+    requested = {
+        name.strip()
+        for value in args.getlist('fields')
+        for name in value.split(',')
+        if name.strip()
+    }
+    if not requested:
+        return None
+    unknown = requested - set(STORE_FIELDS)
+    if unknown:
+        raise ValueError(f"未対応のfieldsです: {', '.join(sorted(unknown))}")
+    requested.add('store_id')
+    return tuple(name for name in STORE_FIELDS if name in requested)
+
+
+def store_page_statement(conditions, page, per_page, fields=None):
+    """1ページ分の店舗
+
+    fields を指定するとその項目の列だけを読み込む（デリバリーサービスは指定時のみ一括で読み込む）。
+    """
+    stmt = (
+        select(Store)
+        .where(*conditions)
+        .order_by(Store.store_id)
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+    )
+    if fields is None or 'delivery_services' in fields:
+        stmt = stmt.options(selectinload(Store.delivery_services))
+    if fields is not None:
+        columns = {column for name in fields for column in _FIELD_COLUMNS[name]}
+        stmt = stmt.options(load_only(*sorted(columns, key=lambda c: c.key)))
+    return stmt
+
+
+def store_fields(store, fields):
+    """店舗を指定項目だけの辞書にする（fields=None なら to_dict() と同じ）"""
+    if fields is None:
+        return store.to_dict()
+    return {
+        name: _FIELD_GETTERS[name](store) if name in _FIELD_GETTERS else getattr(store, name)
+        for name in fields
+    }
+
+
+def store_page_response(stores, total_count, page, per_page, fields=None, layout='rows'):
+    """/api/stores のレスポンス
+
+    layout='columns' のときは項目名を繰り返さない列指向の形（"columns": {項目: [値, ...]}）で返す。
+    """
+    rows = [store_fields(store, fields) for store in stores]
+    if layout == 'columns':
+        response = {"columns": {name: [row[name] for row in rows] for name in fields or STORE_FIELDS}}
+    else:
+        response = {"stores": rows}
+    response.update({
+        "total": total_count,
+        "page": page,
+        "per_page": per_page,
+        "total_pages": (total_count + per_page - 1) // per_page if total_count > 0 else 0,
+    })
+    return response
+
+
+# ---------------------------------------------------------------------------
+# /api/stores/facets
+# ---------------------------------------------------------------------------
+
+# 住所の先頭何文字で都道府県を判定するか（最長の都道府県名「神奈川」「和歌山」「鹿児島」が3文字）
+_PREFECTURE_PREFIX_LENGTH = max(len(pref) for pref in PREFECTURES)
+
+# 件数を返すファセット（都道府県・データソース・デリバリーサービスは全件、他は上位 limit 件）
+FACETS = ('prefectures', 'cities', 'categories', 'data_sources', 'delivery_services')
+
+
+def _category_tail(dialect_name):
+    """カテゴリー値の「/」より後ろ（駅名・距離を除いた部分）
+
+    食べログのカテゴリー値は「駅 100m / カフェ」のように店舗ごとに異なるため、
+    そのままGROUP BYすると店舗数に近い行数になる。SQLiteは最初の「/」以降を返すが、
+    残りはPython側の extract_category_names が最後の「/」で分けるので結果は同じになる。
+    """
+    if dialect_name == 'postgresql':
+        return func.regexp_replace(Store.category, '^.*/', '')
+    return func.substr(Store.category, func.instr(Store.category, '/') + 1)
+
+
+def facet_statements(spec, dialect_name='sqlite'):
+    """ファセットの集計文のリスト [(名前のタプル, 文), ...]
+
+    各文は (名前ごとの値..., 件数) の行を返す。各ファセットは自分自身の条件だけを外して数える
+    （例: 東京を選択中でも他の都道府県の件数が出る）。外した結果の条件が同じファセットは
+    1つのGROUP BYにまとめ、条件による店舗テーブルの走査を1回で済ませる。
+    名前に 'total' を含む文は現在の条件そのままの集計で、件数の合計が総件数になる。
+    """
+    columns = {
+        # 都道府県は住所の先頭数文字でまとめ、Pythonで都道府県名に寄せる（47通りのCASEより速い）
+        'prefectures': func.substr(Store.address, 1, _PREFECTURE_PREFIX_LENGTH),
+        'cities': Store.city,
+        'categories': _category_tail(dialect_name),
+        'data_sources': Store.data_source,
+    }
+    groups = {spec: ['total']}
+    for name in columns:
+        groups.setdefault(spec.without(name), []).append(name)
+
+    statements = []
+    for group_spec, names in groups.items():
+        # 条件がなければ列ごとに分けたほうが速い（インデックスだけで集計でき、複数列の並べ替えが要らない）
+        for group in ([[name] for name in names] if group_spec.is_empty else [names]):
+            group_columns = [columns[name] for name in group if name != 'total']
+            stmt = select(*group_columns, func.count()).select_from(Store).where(*group_spec.conditions())
+            if group_columns:
+                stmt = stmt.group_by(*group_columns)
+            statements.append((tuple(group), stmt))
+
+    # デリバリーサービスの絞り込み条件はないため、現在の条件のまま店舗数を数える
+    # （条件がなければstoresとの結合は不要）
+    delivery = (
+        select(DeliveryService.service_name, func.count(func.distinct(DeliveryService.store_id)))
+        .where(DeliveryService.is_active.is_(True))
+        .group_by(DeliveryService.service_name)
+    )
+    if not spec.is_empty:
+        delivery = delivery.where(
+            DeliveryService.store_id.in_(select(Store.store_id).where(*spec.conditions()))
+        )
+    statements.append((('delivery_services',), delivery))
+    return statements
+
+
+def _prefecture_of_prefix(prefix):
+    for pref in PREFECTURES:
+        if prefix.startswith(pref):
+            return pref
+    return None
+
+
+def _top(counts, limit):
+    """件数の降順（同数は値の昇順）で上位 limit 件"""
+    items = sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+    return dict(items[:limit] if limit else items)
+
+
+def facet_response(results, limit=100):
+    """facet_statements の実行結果 [(名前のタプル, 行), ...] から /api/stores/facets のレスポンスを作る
+
+    NULL・空文字の値は数えない。カテゴリーは「カフェ、スイーツ」のような値から抽出した名前ごとに数える。
+    """
+    total = 0
+    counts = {name: {} for name in FACETS}
+    for names, rows in results:
+        for row in rows:
+            count = row[-1]
+            values = iter(row[:-1])
+            for name in names:
+                if name == 'total':
+                    total += count
+                    continue
+                value = next(values)
+                if value:
+                    counts[name][value] = counts[name].get(value, 0) + count
+
+    prefectures = {}
+    for prefix, count in counts['prefectures'].items():
+        pref = _prefecture_of_prefix(prefix)
+        if pref:
+            prefectures[pref] = prefectures.get(pref, 0) + count
+    counts['prefectures'] = prefectures
+
+    categories = {}
+    for category_value, count in counts['categories'].items():
+        # 同じ名前が2回書かれていても1店舗として数える
+        for name in set(extract_category_names(category_value)):
+            categories[name] = categories.get(name, 0) + count
+    counts['categories'] = categories
+
+    return facet_payload(total, counts, limit)
+
+
+def facet_payload(total, counts, limit=100):
+    """ファセットごとの件数 {ファセット: {値: 件数}} から /api/stores/facets のレスポンスを作る
+
+    prefectures は都道府県名、categories は抽出したカテゴリー名ごとの件数（0件の値は含めない）。
+    """
+    prefectures = counts['prefectures']
+    return {
+        "total": total,
+        "facets": {
+            "prefectures": {pref: prefectures[pref] for pref in PREFECTURES if pref in prefectures},
+            "cities": _top(counts['cities'], limit),
+            "categories": _top(counts['categories'], limit),
+            "data_sources": _top(counts['data_sources'], None),
+            "delivery_services": _top(counts['delivery_services'], None),
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# /api/cities, /api/categories
+# ---------------------------------------------------------------------------
+
+def cities_statement(prefecture):
+    """1つの都道府県（または任意の住所の先頭文字列）の市区町村"""
+    stmt = select(Store.city).where(Store.city.isnot(None), Store.city != "")
+
+    # 住所の先頭に都道府県名が含まれている前提でフィルタ
+    if prefecture:
+        stmt = stmt.where(
+            Store.address.isnot(None),
+            Store.address != "",
+            Store.address.like(f"{prefecture}%"),
+        )
+    return stmt.distinct()
+
+
+def prefecture_expression():
+    """住所の先頭から判定した都道府県名（どれにも当てはまらなければNULL）"""
+    return case(*[(Store.address.like(f"{pref}%"), pref) for pref in PREFECTURES], else_=None)
+
+
+def cities_by_prefecture_statement():
+    """全都道府県分の (都道府県, 市区町村) の組み合わせを1回のGROUP BYで取得する"""
+    prefecture = prefecture_expression().label('prefecture')
+    return select(prefecture, Store.city).where(_not_blank(Store.city)).group_by(prefecture, Store.city)
+
+
+def cities_index(rows):
+    """(都道府県, 市区町村) の行から ({都道府県: ソート済み市区町村}, 全市区町村) を作る
+
+    都道府県を判定できない住所の市区町村は、全市区町村にだけ含める。
+    """
+    by_prefecture = {}
+    all_cities = set()
+    for prefecture, city in rows:
+        all_cities.add(city)
+        if prefecture:
+            by_prefecture.setdefault(prefecture, set()).add(city)
+    return (
+        {pref: tuple(sorted(by_prefecture[pref])) for pref in PREFECTURES if pref in by_prefecture},
+        tuple(sorted(all_cities)),
+    )
+
+
+def cities_response(by_prefecture, all_cities, prefectures):
+    """/api/cities のレスポンス
+
+    prefectures を指定すると、その都道府県の市区町村（和集合）と都道府県ごとの一覧を返す。
+    指定がなければ全市区町村と全都道府県分の一覧（ツリー）を返す。
+    """
+    if not prefectures:
+        selected = by_prefecture
+        cities = all_cities
+    else:
+        selected = {pref: by_prefecture.get(pref, ()) for pref in prefectures}
+        cities = sorted(set().union(*selected.values()))
+    return {
+        "cities": list(cities),
+        "by_prefecture": {pref: list(values) for pref, values in selected.items()},
+    }
+
+
+def categories_statement():
+    return (
+        select(Store.category)
+        .distinct()
+        .where(Store.category.isnot(None), Store.category != "")
+        .order_by(Store.category)
+    )
+
+
+def extract_category_names(category_value):
+    """カテゴリー値から純粋なカテゴリー名を抽出
+    例: 'あざみ野駅 100m / ドーナツ' -> ['ドーナツ']
+    例: 'あびこ駅 313m / カフェ、スイーツ' -> ['カフェ', 'スイーツ']
+    """
+    if not category_value:
+        return []
+
+    # 「/」で分割して、最後の部分（カテゴリー名部分）を取得
+    if '/' in category_value:
+        category_part = category_value.split('/')[-1].strip()
+    else:
+        category_part = category_value.strip()
+
+    # 「、」区切り → さらにカンマでも分割（「カフェ, スイーツ」形式に対応）
+    result = []
+    for cat in category_part.split('、'):
+        result.extend(c.strip() for c in cat.split(',') if c.strip())
+    return result
+
+
+def categories_response(category_values):
+    extracted = set()
+    for category_value in category_values:
+        if category_value:
+            extracted.update(extract_category_names(category_value))
+    return categories_payload(extracted)
+
+
+def categories_payload(names):
+    """抽出済みのカテゴリー名から /api/categories のレスポンスを作る"""
+    return {
+        "categories": sorted(names),
+        "category_groups": {},  # グループ化は不要なので空オブジェクト
+    }
+
+
+# ---------------------------------------------------------------------------
+# /api/stats
+# ---------------------------------------------------------------------------
+
+EMPTY_STATS = {
+    'total_stores': 0,
+    'total_with_opening': 0,
+    'with_opening_date_count': 0,
+    'remaining': 0,
+    'completed': 0,
+    'completion_rate': 0,
+    'with_phone': 0,
+    'with_website': 0,
+    'fully_completed': 0,
+    'fully_completed_with_opening': 0,
+    'latest_update': None,
+}
+
+
+def _not_blank(column):
+    return and_(column.isnot(None), column != "")
+
+
+def _blank(column):
+    return or_(column.is_(None), column == "")
+
+
+def stats_scalar_statements():
+    """集計値ごとの select 文（名前 → 文）"""
+    distinct_stores = func.count(func.distinct(Store.store_id))
+    return {
+        # 全店舗数
+        'total_stores': select(distinct_stores),
+        # 最終更新日時（最も新しいupdated_at）
+        'latest_update': select(func.max(Store.updated_at)),
+        # 開店日ありの店舗数
+        'total_with_opening': select(distinct_stores).where(Store.opening_date.isnot(None)),
+        # 補完が必要な件数
+        'remaining': select(distinct_stores).where(
+            Store.opening_date.isnot(None),
+            _not_blank(Store.url),
+            or_(
+                _blank(Store.phone),
+                _blank(Store.closed_day),
+                _blank(Store.business_hours),
+                _blank(Store.transport),
+                _blank(Store.official_account),
+            ),
+        ),
+        # 電話番号あり
+        'with_phone': select(distinct_stores).where(_not_blank(Store.phone)),
+        # ウェブサイトあり
+        'with_website': select(distinct_stores).where(_not_blank(Store.website)),
+        # 全項目完了
+        'fully_completed': select(distinct_stores).where(
+            Store.opening_date.isnot(None),
+            _not_blank(Store.phone),
+            _not_blank(Store.closed_day),
+            _not_blank(Store.business_hours),
+            _not_blank(Store.transport),
+        ),
+        # 都市数（重複除く）
+        'cities': select(func.count(func.distinct(Store.city))).where(_not_blank(Store.city)),
+    }
+
+
+def stats_location_statement():
+    """都道府県・市区町村別集計に使う (address, city)"""
+    return select(Store.address, Store.city).where(
+        or_(Store.address.isnot(None), Store.city.isnot(None)),
+        or_(Store.address != "", Store.city != ""),
+    )
+
+
+def stats_response(scalars, location_rows):
+    """集計値と (address, city) の行から /api/stats のレスポンスを作る"""
+    city_stats = {}
+    prefecture_stats = {p: 0 for p in PREFECTURES}
+    for addr, city in location_rows:
+        # 市区町村別: 住所から抽出し、できなければcity（都道府県名は除く）を使う
+        if addr:
+            extracted_city = extract_city_from_address(addr)
+            if not extracted_city and city and city not in PREFECTURES:
+                extracted_city = city
+            if extracted_city:
+                city_stats[extracted_city] = city_stats.get(extracted_city, 0) + 1
+
+        # 都道府県別: まず都市名から判定し、だめなら住所の先頭から判定
+        if city in prefecture_stats:
+            prefecture_stats[city] += 1
+        elif city in CITY_TO_PREFECTURE:
+            prefecture_stats[CITY_TO_PREFECTURE[city]] += 1
+        elif addr:
+            for pref in PREFECTURES:
+                if addr.startswith(pref):
+                    prefecture_stats[pref] += 1
+                    break
+
+    return stats_payload(scalars, city_stats, prefecture_stats)
+
+
+def stats_payload(scalars, city_stats, prefecture_stats):
+    """集計値と市区町村別・都道府県別の件数から /api/stats のレスポンスを作る
+
+    city_stats は出現順の辞書（同数の市区町村は先に出たものを上位にする）。
+    """
+    total_stores = scalars['total_stores'] or 0
+    total_with_opening = scalars['total_with_opening'] or 0
+    remaining = scalars['remaining'] or 0
+    with_phone = scalars['with_phone'] or 0
+    with_website = scalars['with_website'] or 0
+    fully_completed = scalars['fully_completed'] or 0
+    latest_update = scalars['latest_update']
+
+    # 補完完了件数
+    completed = total_with_opening - remaining if total_with_opening > 0 else 0
+    completion_rate = (completed / total_with_opening * 100) if total_with_opening > 0 else 0
+
+    # 店舗数の降順で上位20市区町村
+    city_stats = dict(sorted(city_stats.items(), key=lambda x: x[1], reverse=True)[:20])
+
+    # エリア別に集計
+    area_stats = {
+        area: sum(prefecture_stats.get(p, 0) for p in prefs)
+        for area, prefs in AREA_PREFECTURES.items()
+    }
+
+    return {
+        "total_stores": total_stores,
+        "total_with_opening": total_with_opening,
+        "with_opening_date_count": total_with_opening,
+        "remaining": remaining,
+        "completed": completed,
+        "completion_rate": completion_rate,
+        "with_phone": with_phone,
+        "with_website": with_website,
+        "fully_completed": fully_completed,
+        "fully_completed_with_opening": fully_completed,
+        "cities": scalars['cities'] or 0,
+        "phone_rate": (with_phone / total_stores * 100) if total_stores > 0 else 0,
+        "website_rate": (with_website / total_stores * 100) if total_stores > 0 else 0,
+        "city_stats": city_stats,
+        "prefecture_stats": prefecture_stats,
+        "area_stats": area_stats,
+        "latest_update": latest_update.isoformat() if latest_update else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 列指向スナップショット（store_snapshot.py）
+# ---------------------------------------------------------------------------
+
+def snapshot_statement():
+    """スナップショットに読み込む列
+
+    文字列のまま使う列（住所・市区町村・カテゴリー・データソース・brand_key）以外は、
+    /api/stats の条件に使う「空でないか」の判定だけをSQLで行い、真偽値で受け取る。
+    """
+    return select(
+        Store.store_id, Store.address, Store.city, Store.category, Store.data_source, Store.brand_key,
+        Store.opening_date.isnot(None),
+        _not_blank(Store.phone),
+        _not_blank(Store.website),
+        _not_blank(Store.url),
+        _not_blank(Store.closed_day),
+        _not_blank(Store.business_hours),
+        _not_blank(Store.transport),
+        _not_blank(Store.official_account),
+    )
+
+
+def snapshot_delivery_statement():
+    """有効なデリバリーサービスの (store_id, サービス名)"""
+    return (
+        select(DeliveryService.store_id, DeliveryService.service_name)
+        .where(DeliveryService.is_active.is_(True))
+        .distinct()
+    )
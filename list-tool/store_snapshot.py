@@ -0,0 +1,520 @@
+"""店舗テーブルの列指向スナップショット（集計用・プロセス内）
+
+/api/stats・/api/stores/facets・/api/categories・/api/brands は、リクエストのたびに（条件ごとに）
+店舗テーブルを全件走査し、Pythonで1行ずつ数えている。STORE_SNAPSHOT_ENABLED=1 のとき、
+集計に使う列だけをNumPyの配列としてプロセス内に持ち、集計は配列のマスクと np.bincount で行う。
+
+- 文字列の列はカテゴリー型（値の一覧 + int32のコード、NULL・空文字は -1）で持つ
+- データの世代番号（data_version.py）が変わったら作り直す。世代番号からは何が変わったか分からないため
+  列はすべて読み直すが、住所からの市区町村の抽出（正規表現）とカテゴリー名の抽出は前回の結果を値ごとに
+  使い回し、新しい値だけを計算する（作り直しの時間の大半はこの抽出）
+- キーワード検索（search）や、LIKEのワイルドカード・英字（SQLiteでは大文字・小文字を区別しない）を含む
+  条件など、SQLと同じ結果になると言えない場合は None を返し、呼び出し側は従来どおりSQLで集計する
+- numpyがなければ無効（常にSQLで集計する）
+
+結果は従来のSQLでの集計と同じになる（同数の市区町村の順序も、読み込んだ順の出現順で揃える）。
+"""
+import logging
+import sys
+import threading
+import time
+
+from data_version import get_version_info, version_key
+from regions import CITY_TO_PREFECTURE, PREFECTURES, extract_city_from_address, prefecture_of
+from store_queries import (
+    categories_payload, extract_category_names, facet_payload, snapshot_delivery_statement, snapshot_statement,
+    stats_payload, stats_scalar_statements,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 住所の先頭何文字を持つか（都道府県の絞り込みと /api/brands の集計に使う。/api/brands の SUBSTR と同じ長さ）
+ADDRESS_PREFIX_LENGTH = 4
+
+_PREFECTURE_INDEX = {pref: i for i, pref in enumerate(PREFECTURES)}
+_MISSING = object()
+
+
+def _like_safe(value):
+    """LIKE（前方一致・部分一致）を Python の startswith / in で同じ結果にできる値か
+
+    ワイルドカード（%・_）やエスケープ文字、SQLiteでは大文字・小文字を区別しない英字を含む値は対象外。
+    """
+    return not any(ch in '%_\\' or (ch.isascii() and ch.isalpha()) for ch in value)
+
+
+def _encode(values, keep_empty=False):
+    """文字列の列をカテゴリー型にする。戻り値は (値の一覧（出現順）, コードの配列)
+
+    NULLは -1。keep_empty=False なら空文字も -1 にする。
+    """
+    index = {}
+    if keep_empty:
+        codes = (index.setdefault(v, len(index)) if v is not None else -1 for v in values)
+    else:
+        codes = (index.setdefault(v, len(index)) if v else -1 for v in values)
+    codes = np.fromiter(codes, dtype=np.int32, count=len(values))
+    return list(index), codes
+
+
+def _bincount(codes, size, mask=None):
+    """コードごとの件数（-1 は数えない）"""
+    if mask is not None:
+        codes = codes[mask]
+    return np.bincount(codes[codes >= 0], minlength=size)
+
+
+def _nonzero_counts(values, counts):
+    """{値: 件数}（0件の値は含めない。順序は values の順）"""
+    return {values[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+
+def _codes_of(values, wanted):
+    """wanted の値のコードの配列（存在しない値は無視）"""
+    index = {value: i for i, value in enumerate(values)}
+    return np.array([index[value] for value in wanted if value in index], dtype=np.int32)
+
+
+class StoreSnapshot:
+    """ある世代の店舗データの集計用の列（作成後は変更しない）"""
+
+    def __init__(self, version):
+        self.version = version
+        self.rows = 0
+        self.built_at = None
+        self.build_seconds = 0.0
+        # 抽出を計算し直した値の数・前回の結果を使い回した値の数
+        self.derived_values = 0
+        self.reused_values = 0
+        self.memory_bytes = 0
+
+    # -- 作成 ----------------------------------------------------------------
+
+    @classmethod
+    def build(cls, session, version, previous=None):
+        """session から読み込んで作成する（previous があれば抽出結果を使い回す）"""
+        started = time.perf_counter()
+        snapshot = cls(version)
+        # ORMの行の組み立てを通さないよう、接続で直接実行する
+        rows = session.connection().execute(snapshot_statement()).all()
+        columns = list(zip(*rows)) if rows else [()] * 14
+        (store_ids, addresses, cities, categories, data_sources, brand_keys, has_opening, phone, website, url,
+         closed_day, business_hours, transport, official_account) = columns
+        del rows
+        snapshot.rows = len(store_ids)
+
+        # 真偽値の列（/api/stats の条件）
+        flags = {
+            'has_opening': has_opening, 'phone': phone, 'website': website, 'url': url,
+            'closed_day': closed_day, 'business_hours': business_hours, 'transport': transport,
+            'official_account': official_account,
+        }
+        snapshot.flags = {name: np.array(values, dtype=bool) for name, values in flags.items()}
+        snapshot.latest_update = session.execute(stats_scalar_statements()['latest_update']).scalar()
+
+        # 住所の先頭（都道府県の判定・絞り込み用。空文字の住所も LIKE '%' には一致するので残す）
+        snapshot.prefix_values, snapshot.prefix_codes = _encode(
+            [address[:ADDRESS_PREFIX_LENGTH] if address is not None else None for address in addresses],
+            keep_empty=True,
+        )
+        prefix_prefectures = {
+            prefix: _PREFECTURE_INDEX.get(prefecture_of(prefix), -1) for prefix in snapshot.prefix_values
+        }
+        # 末尾の -1 は住所がNULLの行（コード -1）用
+        snapshot.prefecture_codes = np.array(list(prefix_prefectures.values()) + [-1], dtype=np.int8)[
+            snapshot.prefix_codes
+        ]
+
+        snapshot.city_values, snapshot.city_codes = _encode(cities)
+        snapshot.data_source_values, snapshot.data_source_codes = _encode(data_sources)
+        snapshot.brand_values, snapshot.brand_codes = _encode(brand_keys, keep_empty=True)
+        snapshot.category_values, snapshot.category_codes = _encode(categories)
+
+        previous_cities = previous._address_cities if previous is not None else {}
+        previous_names = previous._category_names_by_value() if previous is not None else {}
+        snapshot._build_stats_locations(addresses, cities, prefix_prefectures, previous_cities)
+        snapshot._build_category_names(previous_names)
+        snapshot._build_delivery_services(session, store_ids)
+
+        snapshot.built_at = time.time()
+        snapshot.build_seconds = time.perf_counter() - started
+        snapshot.memory_bytes = snapshot._memory_bytes()
+        return snapshot
+
+    def _build_stats_locations(self, addresses, cities, prefix_prefectures, previous_cities):
+        """/api/stats の市区町村別・都道府県別の判定（stats_response と同じ判定）"""
+        address_cities = {}
+        stats_cities = []
+        stats_prefectures = []
+        derived = reused = 0
+        for address, city in zip(addresses, cities):
+            # 市区町村別: 住所から抽出し、できなければcity（都道府県名は除く）を使う
+            extracted = None
+            if address:
+                extracted = address_cities.get(address, _MISSING)
+                if extracted is _MISSING:
+                    extracted = previous_cities.get(address, _MISSING)
+                    if extracted is _MISSING:
+                        extracted = extract_city_from_address(address)
+                        # 同じ市区町村名は1つの文字列を共有する（住所ごとに別の文字列を持たない）
+                        if extracted:
+                            extracted = sys.intern(extracted)
+                        derived += 1
+                    else:
+                        reused += 1
+                    address_cities[address] = extracted
+                if not extracted and city and city not in _PREFECTURE_INDEX:
+                    extracted = city
+            stats_cities.append(extracted)
+
+            # 都道府県別: まず都市名から判定し、だめなら住所の先頭から判定
+            if city in _PREFECTURE_INDEX:
+                stats_prefectures.append(_PREFECTURE_INDEX[city])
+            elif city in CITY_TO_PREFECTURE:
+                stats_prefectures.append(_PREFECTURE_INDEX[CITY_TO_PREFECTURE[city]])
+            elif address:
+                stats_prefectures.append(prefix_prefectures[address[:ADDRESS_PREFIX_LENGTH]])
+            else:
+                stats_prefectures.append(-1)
+
+        self._address_cities = address_cities
+        self.stats_city_values, self.stats_city_codes = _encode(stats_cities)
+        self.stats_prefecture_codes = np.array(stats_prefectures, dtype=np.int8)
+        self.derived_values += derived
+        self.reused_values += reused
+
+    def _build_category_names(self, previous_names):
+        """カテゴリー値ごとの抽出したカテゴリー名（値のコード → 名前のコードの組）"""
+        name_index = {}
+        pair_categories = []
+        pair_names = []
+        for code, value in enumerate(self.category_values):
+            names = previous_names.get(value)
+            if names is None:
+                # 同じ名前が2回書かれていても1店舗として数える
+                names = tuple(dict.fromkeys(extract_category_names(value)))
+                self.derived_values += 1
+            else:
+                self.reused_values += 1
+            for name in names:
+                pair_categories.append(code)
+                pair_names.append(name_index.setdefault(name, len(name_index)))
+
+        self.category_name_values = list(name_index)
+        self.category_pair_categories = np.array(pair_categories, dtype=np.int32)
+        self.category_pair_names = np.array(pair_names, dtype=np.int32)
+
+    def _category_names_by_value(self):
+        """{カテゴリー値: 抽出したカテゴリー名のタプル}（次の世代で使い回す）"""
+        names = [[] for _ in self.category_values]
+        for code, name in zip(self.category_pair_categories.tolist(), self.category_pair_names.tolist()):
+            names[code].append(self.category_name_values[name])
+        return dict(zip(self.category_values, map(tuple, names)))
+
+    def _build_delivery_services(self, session, store_ids):
+        """有効なデリバリーサービスの (行, サービス) の組
+
+        店舗テーブルにない store_id の行は、条件なしのファセットでだけ数える（SQLと同じ）。
+        """
+        rows_of = {store_id: i for i, store_id in enumerate(store_ids)}
+        service_index = {}
+        pair_rows = []
+        pair_services = []
+        orphans = {}
+        for store_id, service_name in session.connection().execute(snapshot_delivery_statement()):
+            if not service_name:
+                continue
+            row = rows_of.get(store_id)
+            if row is None:
+                orphans[service_name] = orphans.get(service_name, 0) + 1
+                continue
+            pair_rows.append(row)
+            pair_services.append(service_index.setdefault(service_name, len(service_index)))
+
+        self.service_values = list(service_index)
+        self.service_pair_rows = np.array(pair_rows, dtype=np.int32)
+        self.service_pair_services = np.array(pair_services, dtype=np.int32)
+        self.orphan_services = orphans
+
+    def _memory_bytes(self):
+        """おおよそのメモリ使用量（バイト）: 配列 + 値の一覧の文字列 + 抽出結果の辞書（キーの文字列）"""
+        total = 0
+        for value in vars(self).values():
+            if isinstance(value, np.ndarray):
+                total += value.nbytes
+            elif isinstance(value, list):
+                total += sys.getsizeof(value) + sum(map(sys.getsizeof, value))
+            elif isinstance(value, dict):
+                total += sys.getsizeof(value) + sum(map(sys.getsizeof, value))
+                total += sum(item.nbytes for item in value.values() if isinstance(item, np.ndarray))
+        return total
+
+    # -- 絞り込み ------------------------------------------------------------
+
+    def _match_prefixes(self, values):
+        """住所がいずれかの値で始まる行のマスク（LIKE 'value%' と同じ。扱えなければNone）"""
+        if any(len(value) > ADDRESS_PREFIX_LENGTH or not _like_safe(value) for value in values):
+            return None
+        matched = np.array([
+            i for i, prefix in enumerate(self.prefix_values)
+            if any(prefix.startswith(value) for value in values)
+        ], dtype=np.int32)
+        return np.isin(self.prefix_codes, matched)
+
+    def filter_masks(self, spec):
+        """FilterSpec の条件ごとのマスク {条件名: マスク}（条件がなければ含めない。扱えなければNone）"""
+        if spec.search_terms:
+            return None
+        masks = {}
+        if spec.prefectures:
+            mask = self._match_prefixes(spec.prefectures)
+            if mask is None:
+                return None
+            masks['prefectures'] = mask
+        if spec.cities:
+            masks['cities'] = np.isin(self.city_codes, _codes_of(self.city_values, spec.cities))
+        if spec.categories:
+            # 完全一致、またはカテゴリー値に選択値が含まれる（LIKE '%value%'）
+            if not all(_like_safe(category) for category in spec.categories):
+                return None
+            matched = np.array([
+                i for i, value in enumerate(self.category_values)
+                if any(category == value or category in value for category in spec.categories)
+            ], dtype=np.int32)
+            masks['categories'] = np.isin(self.category_codes, matched)
+        if spec.data_sources:
+            masks['data_sources'] = np.isin(self.data_source_codes, _codes_of(self.data_source_values, spec.data_sources))
+        if spec.brands:
+            masks['brands'] = np.isin(self.brand_codes, _codes_of(self.brand_values, spec.brands))
+        return masks
+
+    def _combine(self, masks, exclude=None):
+        mask = np.ones(self.rows, dtype=bool)
+        for name, component in masks.items():
+            if name != exclude:
+                mask &= component
+        return mask
+
+    # -- 集計 ----------------------------------------------------------------
+
+    def stats(self):
+        """/api/stats のレスポンス"""
+        flags = self.flags
+        completed_fields = flags['phone'] & flags['closed_day'] & flags['business_hours'] & flags['transport']
+        scalars = {
+            'total_stores': self.rows,
+            'latest_update': self.latest_update,
+            'total_with_opening': int(flags['has_opening'].sum()),
+            'remaining': int((
+                flags['has_opening'] & flags['url'] & ~(completed_fields & flags['official_account'])
+            ).sum()),
+            'with_phone': int(flags['phone'].sum()),
+            'with_website': int(flags['website'].sum()),
+            'fully_completed': int((flags['has_opening'] & completed_fields).sum()),
+            'cities': len(self.city_values),
+        }
+        city_counts = _bincount(self.stats_city_codes, len(self.stats_city_values))
+        prefecture_counts = _bincount(self.stats_prefecture_codes, len(PREFECTURES))
+        return stats_payload(
+            scalars,
+            _nonzero_counts(self.stats_city_values, city_counts),
+            {pref: int(count) for pref, count in zip(PREFECTURES, prefecture_counts)},
+        )
+
+    def categories(self):
+        """/api/categories のレスポンス"""
+        return categories_payload(self.category_name_values)
+
+    def facets(self, spec, limit=100):
+        """/api/stores/facets のレスポンス（扱えない条件ならNone）
+
+        各ファセットは自分自身の条件だけを外して数える（facet_statements と同じ）。
+        """
+        masks = self.filter_masks(spec)
+        if masks is None:
+            return None
+        total_mask = self._combine(masks)
+
+        prefecture_counts = _bincount(self.prefecture_codes, len(PREFECTURES),
+                                      self._combine(masks, 'prefectures'))
+        category_counts = _bincount(self.category_codes, len(self.category_values),
+                                    self._combine(masks, 'categories'))
+        name_counts = np.bincount(
+            self.category_pair_names, weights=category_counts[self.category_pair_categories],
+            minlength=len(self.category_name_values),
+        ).astype(np.int64)
+        service_counts = np.bincount(
+            self.service_pair_services[total_mask[self.service_pair_rows]], minlength=len(self.service_values),
+        )
+        delivery_services = _nonzero_counts(self.service_values, service_counts)
+        if spec.is_empty:
+            for service_name, count in self.orphan_services.items():
+                delivery_services[service_name] = delivery_services.get(service_name, 0) + count
+
+        counts = {
+            'prefectures': _nonzero_counts(PREFECTURES, prefecture_counts),
+            'cities': _nonzero_counts(
+                self.city_values,
+                _bincount(self.city_codes, len(self.city_values), self._combine(masks, 'cities')),
+            ),
+            'categories': _nonzero_counts(self.category_name_values, name_counts),
+            'data_sources': _nonzero_counts(
+                self.data_source_values,
+                _bincount(self.data_source_codes, len(self.data_source_values), self._combine(masks, 'data_sources')),
+            ),
+            'delivery_services': delivery_services,
+        }
+        return facet_payload(int(total_mask.sum()), counts, limit)
+
+    def brands(self, q, prefectures, min_stores, limit):
+        """/api/brands のレスポンス（扱えない条件ならNone）"""
+        mask = self.brand_codes >= 0
+        if q:
+            if not _like_safe(q):
+                return None
+            matched = np.array([i for i, brand in enumerate(self.brand_values) if brand.startswith(q)],
+                               dtype=np.int32)
+            mask &= np.isin(self.brand_codes, matched)
+        if prefectures:
+            prefecture_mask = self._match_prefixes(prefectures)
+            if prefecture_mask is None:
+                return None
+            mask &= prefecture_mask
+
+        store_counts = _bincount(self.brand_codes, len(self.brand_values), mask)
+        results = [
+            (self.brand_values[i], int(store_counts[i]))
+            for i in np.flatnonzero(store_counts)
+            if store_counts[i] >= min_stores
+        ]
+        results.sort(key=lambda b: (-b[1], b[0]))
+        selected = results[:limit]
+
+        # 返すチェーンについてだけ都道府県別に数える
+        brand_rows = np.full(len(self.brand_values), -1, dtype=np.int32)
+        brand_index = {brand: i for i, brand in enumerate(self.brand_values)}
+        for row, (brand, _) in enumerate(selected):
+            brand_rows[brand_index[brand]] = row
+        rows = brand_rows[self.brand_codes[mask]]
+        prefectures_of_rows = self.prefecture_codes[mask].astype(np.int32)
+        keep = (rows >= 0) & (prefectures_of_rows >= 0)
+        pair_counts = np.bincount(
+            rows[keep] * len(PREFECTURES) + prefectures_of_rows[keep], minlength=len(selected) * len(PREFECTURES),
+        ).reshape(len(selected), len(PREFECTURES))
+
+        brands = [
+            {"brand": brand, "store_count": count, "prefectures": _nonzero_counts(PREFECTURES, pair_counts[row])}
+            for row, (brand, count) in enumerate(selected)
+        ]
+        return {"brands": brands, "total": len(results)}
+
+    def info(self):
+        return {
+            'version': self.version,
+            'rows': self.rows,
+            'build_seconds': round(self.build_seconds, 3),
+            'derived_values': self.derived_values,
+            'reused_values': self.reused_values,
+            'memory_bytes': self.memory_bytes,
+        }
+
+
+class StoreSnapshotManager:
+    """世代番号ごとに作り直すスナップショット（DB URLごとに1つ、city_index.CityIndex と同じ仕組み）"""
+
+    def __init__(self):
+        self._entries = {}  # DB URL -> StoreSnapshot
+        self._lock = threading.Lock()
+        self.builds = {'full': 0, 'incremental': 0}
+
+    def get(self, session):
+        """現在の世代のスナップショット（世代番号が取れない場合はNone＝SQLで集計する）"""
+        info = get_version_info(session)
+        if info is None:
+            return None
+        key = version_key(info)
+        url = str(session.get_bind().url)
+
+        snapshot = self._entries.get(url)
+        if snapshot is not None and snapshot.version == key:
+            return snapshot
+
+        # 同時に来たリクエストで何度も作り直さないようにする
+        with self._lock:
+            snapshot = self._entries.get(url)
+            if snapshot is not None and snapshot.version == key:
+                return snapshot
+            rebuilt = StoreSnapshot.build(session, key, previous=snapshot)
+            self.builds['full' if snapshot is None else 'incremental'] += 1
+            self._entries[url] = rebuilt
+            logger.info(
+                f"集計用スナップショットを作成しました: {rebuilt.rows}件 {rebuilt.build_seconds:.2f}秒 "
+                f"{rebuilt.memory_bytes / 1024 / 1024:.1f}MB（抽出 {rebuilt.derived_values}件・"
+                f"使い回し {rebuilt.reused_values}件）"
+            )
+            return rebuilt
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'builds': dict(self.builds),
+            'snapshots': [snapshot.info() for snapshot in list(self._entries.values())],
+        }
+
+
+def _metric_samples(manager):
+    snapshots = list(manager._entries.values())
+    return [
+        ('store_snapshot_builds_total', 'counter', '集計用スナップショットの作成回数（full: 初回、incremental: 作り直し）',
+         [((('kind', kind),), count) for kind, count in manager.builds.items()]),
+        ('store_snapshot_rows', 'gauge', 'スナップショットの店舗数', [((), sum(s.rows for s in snapshots))]),
+        ('store_snapshot_memory_bytes', 'gauge', 'スナップショットのおおよそのメモリ使用量',
+         [((), sum(s.memory_bytes for s in snapshots))]),
+        ('store_snapshot_build_seconds', 'gauge', '直近のスナップショットの作成時間',
+         [((), max((s.build_seconds for s in snapshots), default=0.0))]),
+    ]
+
+
+def create_store_snapshot_manager(get):
+    """設定から StoreSnapshotManager を作る（STORE_SNAPSHOT_ENABLED=False またはnumpyがなければNone）
+
+    get(キー, 既定値) で設定値を返す関数を渡す（app.config.get など）。
+    """
+    if not get('STORE_SNAPSHOT_ENABLED', False):
+        return None
+    if np is None:
+        logger.warning("numpyがないため、集計用のスナップショットを無効化しました")
+        return None
+    return StoreSnapshotManager()
+
+
+def init_store_snapshot(app):
+    """設定に従って StoreSnapshotManager を作成し、app.extensions['store_snapshot'] に登録する
+
+    STORE_SNAPSHOT_ENABLED=False またはnumpyがなければ None を登録する（集計は従来どおりSQL）。
+    """
+    manager = create_store_snapshot_manager(app.config.get)
+    app.extensions['store_snapshot'] = manager
+    if manager is None:
+        return None
+
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.add_collector(lambda: _metric_samples(manager))
+    return manager
+
+
+def get_snapshot(session):
+    """現在のアプリで使うスナップショット（無効・世代番号が取れない場合はNone）"""
+    from flask import current_app
+
+    manager = current_app.extensions.get('store_snapshot')
+    return manager.get(session) if manager is not None else None
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""店名からチェーンのブランドキー（brand_key）を導出して反映するスクリプト。"""
+
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bootstrap import create_cli_app  # noqa: E402
+from extensions import db  # noqa: E402
+from brands import MIN_BRAND_STORES, assign_brand_keys, ensure_brand_key_column  # noqa: E402
+
+
+def main(min_stores: int = MIN_BRAND_STORES, batch_size: int = 1000):
+    app = create_cli_app("local")
+
+    with app.app_context():
+        ensure_brand_key_column(db.engine)
+
+        scanned, updated = assign_brand_keys(db.engine, min_stores=min_stores, batch_size=batch_size)
+
+        print(f"対象店舗数: {scanned}件")
+        print(f"brand_keyを更新した店舗数: {updated}件")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="店名からbrand_keyを導出してstoresに反映")
+    parser.add_argument(
+        "--min-stores", type=int, default=MIN_BRAND_STORES, help="ブランドとみなす最小店舗数"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000, help="1回のUPDATEで更新する最大件数")
+    args = parser.parse_args()
+
+    main(min_stores=args.min_stores, batch_size=args.batch_size)
@@ -4,19 +4,12 @@
 import sys
 from pathlib import Path
 
-from sqlalchemy import or_
-
 # プロジェクトルートをパスに追加
 sys.path.insert(0, str(Path(__file__).parent))
 
-from app import create_app  # noqa: E402
+from bootstrap import create_cli_app  # noqa: E402
 from extensions import db  # noqa: E402
-from models import Store  # noqa: E402
-import config_local  # noqa: E402
-import config  # noqa: E402
-
-# ローカル設定をマッピング
-config.config["local"] = config_local.LocalConfig
+from franchise import detect_franchise_by_name, tag_franchise_stores  # noqa: E402,F401
 
 
 def ensure_is_franchise_column():
@@ -35,50 +28,17 @@ def ensure_is_franchise_column():
         conn.commit()
 
 
-def detect_franchise_by_name(name: str) -> bool:
-    """店名からフランチャイズらしさを判定する簡易ロジック。"""
-    if not name:
-        return False
-
-    # 本店は除外
-    if "本店" in name:
-        return False
-
-    keywords = ["支店", "号店", "チェーン"]
-    if any(k in name for k in keywords):
-        return True
-
-    # 末尾が「店」で終わるものもフランチャイズ候補とみなす（例: ○○羽生店）
-    if name.endswith("店"):
-        return True
-
-    return False
-
-
-def main(limit: int | None = None):
-    app = create_app("local")
+def main(limit: int | None = None, batch_size: int = 1000):
+    app = create_cli_app("local")
 
     with app.app_context():
         ensure_is_franchise_column()
 
-        query = db.session.query(Store)
-        # まだフラグが決まっていない、もしくはFalseになっているものを対象
-        query = query.filter(or_(Store.is_franchise.is_(None), Store.is_franchise.is_(False)))
-
-        if limit:
-            stores = query.limit(limit).all()
-        else:
-            stores = query.all()
-
-        print(f"対象店舗数: {len(stores)}件")
+        # まだフラグが決まっていない、もしくはFalseになっているものを対象に
+        # store_id順にストリーミングで判定し、バッチごとに一括UPDATEする
+        scanned, updated = tag_franchise_stores(db.engine, batch_size=batch_size, limit=limit)
 
-        updated = 0
-        for store in stores:
-            if detect_franchise_by_name(store.name):
-                store.is_franchise = True
-                updated += 1
-
-        db.session.commit()
+        print(f"対象店舗数: {scanned}件")
         print(f"フランチャイズと判定された店舗数: {updated}件")
 
 
@@ -87,8 +47,7 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="既存storesデータにis_franchiseフラグを付与")
     parser.add_argument("--limit", type=int, default=None, help="処理する最大件数（省略時は全件）")
+    parser.add_argument("--batch-size", type=int, default=1000, help="1回のUPDATEで更新する最大件数")
     args = parser.parse_args()
 
-    main(limit=args.limit)
-
-
+    main(limit=args.limit, batch_size=args.batch_size)
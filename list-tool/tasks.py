@@ -26,6 +26,17 @@ def make_celery(app):
     return celery
 
 
+def get_celery(app):
+    """アプリに紐づくCeleryを返す（初回呼び出し時に作成してタスクを登録）"""
+    celery_app = app.extensions.get('celery')
+    if celery_app is None:
+        celery_app = make_celery(app)
+        register_tasks(celery_app)
+        register_enrichment_tasks(celery_app)
+        app.extensions['celery'] = celery_app
+    return celery_app
+
+
 def register_tasks(celery_app):
     """スクレイピングタスクを登録"""
     pass
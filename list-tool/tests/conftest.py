@@ -0,0 +1,19 @@
+"""テストの共通設定
+
+使用方法（pip install pytest）:
+    python -m pytest tests/ [--test-postgres-url postgresql+psycopg2://...]
+
+- PostgreSQLのテストは、専用の空のDB（--test-postgres-url または環境変数 TEST_POSTGRES_URL）を指定した場合のみ実行する
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def pytest_addoption(parser):
+    parser.getgroup('list-tool tests').addoption(
+        '--test-postgres-url', default=os.getenv('TEST_POSTGRES_URL'),
+        help='テスト用のPostgreSQL（専用の空のDB。環境変数 TEST_POSTGRES_URL でも指定可）',
+    )
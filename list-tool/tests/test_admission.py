@@ -0,0 +1,70 @@
+"""admission.ConcurrencyLimiter の asyncio 版の枠の取得
+
+待っている間にキャンセルされたリクエスト（クライアントの切断など）が枠を減らさないこと、
+Flaskのスレッドが返した枠を非同期APIのリクエストが取れることを確かめる。
+"""
+import asyncio
+import threading
+import time
+
+from admission import AdmissionRejected, ConcurrencyLimiter, run_admitted_async
+
+
+def test_cancelled_waiters_do_not_leak_slots():
+    limiter = ConcurrencyLimiter('stats', limit=1, queue_size=4, queue_timeout=5.0)
+    assert limiter.acquire()
+
+    async def compute():
+        return 'computed'
+
+    async def scenario():
+        waiters = [
+            asyncio.create_task(run_admitted_async(compute, (limiter, time.perf_counter()))) for _ in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        assert limiter.stats()['waiting'] == 3
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        limiter.release()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    stats = limiter.stats()
+    assert stats['active'] == 0
+    assert stats['waiting'] == 0
+    assert limiter.acquire(timeout=0)
+
+
+def test_async_waiter_takes_slot_released_by_thread():
+    limiter = ConcurrencyLimiter('search', limit=1, queue_size=1, queue_timeout=2.0)
+    assert limiter.acquire()
+    timer = threading.Timer(0.1, limiter.release)
+    timer.start()
+
+    async def compute():
+        return 'computed'
+
+    started = time.perf_counter()
+    result = asyncio.run(run_admitted_async(compute, (limiter, started)))
+    timer.join()
+    assert result == 'computed'
+    assert time.perf_counter() - started < 1.0
+    assert limiter.stats()['active'] == 0
+
+
+def test_run_admitted_async_rejects_after_remaining_budget():
+    limiter = ConcurrencyLimiter('stats', limit=1, queue_size=1, queue_timeout=0.2)
+    assert limiter.acquire()
+
+    async def compute():
+        raise AssertionError('枠を取れないリクエストは計算しない')
+
+    try:
+        asyncio.run(run_admitted_async(compute, (limiter, time.perf_counter())))
+    except AdmissionRejected as e:
+        assert e.limiter is limiter
+    else:
+        raise AssertionError('AdmissionRejected が送出されていません')
+    assert limiter.stats()['timed_out'] == 1
+    limiter.release()
@@ -0,0 +1,84 @@
+"""非同期読み取りAPI（async_api.py）の /api/cities の同時リクエスト
+
+市区町村のインデックスの作り直し中に同じイベントループで別のリクエストが来ても止まらず、
+どのリクエストもFlaskのルートと同じインデックスから応答することを確かめる。
+"""
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+
+pytest.importorskip('starlette')
+pytest.importorskip('aiosqlite')
+httpx = pytest.importorskip('httpx')
+
+import bootstrap  # noqa: E402
+from city_index import city_index  # noqa: E402
+from data_version import bump_version  # noqa: E402
+from models import DataVersion, Store  # noqa: E402
+
+PREFECTURE_CITIES = {
+    '東京都': ['千代田区', '新宿区', '渋谷区'],
+    '大阪府': ['大阪市北区', '堺市'],
+    '北海道': ['札幌市中央区'],
+    '福岡県': ['福岡市博多区', '北九州市'],
+}
+
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'async_api.db'}"
+    engine = create_engine(url)
+    Store.metadata.create_all(engine, tables=[Store.__table__, DataVersion.__table__])
+    with engine.begin() as conn:
+        rows = [
+            {'store_id': f"{pref}-{city}", 'name': f"{city}の店舗", 'address': f"{pref}{city}1-1", 'city': city}
+            for pref, cities in PREFECTURE_CITIES.items() for city in cities
+        ]
+        conn.execute(Store.__table__.insert(), rows)
+        bump_version(conn)
+    engine.dispose()
+
+    monkeypatch.setenv('FLASK_ENV', 'local')
+    monkeypatch.setattr(bootstrap.get_config('local'), 'SQLALCHEMY_DATABASE_URI', url)
+    monkeypatch.setattr(bootstrap, '_apps', {})
+    return url
+
+
+def _run_with_deadline(coro, seconds):
+    """イベントループが止まっても戻るよう、別スレッドで実行して待つ"""
+    result = {}
+
+    def run():
+        result['value'] = asyncio.run(coro)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), f"{seconds}秒以内に応答しませんでした（イベントループが止まっている）"
+    return result['value']
+
+
+def test_cities_concurrent_requests(database_url):
+    import async_api
+
+    app = async_api.create_asgi_app('local', mount_flask=False)
+    rebuilds = city_index.rebuilds
+
+    async def fetch_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            responses = await asyncio.gather(*[
+                client.get('/api/cities', params={'prefecture': pref})
+                for pref in list(PREFECTURE_CITIES) * 3
+            ])
+        await app.state.engine.dispose()
+        return responses
+
+    responses = _run_with_deadline(fetch_all(), 30)
+    for pref, response in zip(list(PREFECTURE_CITIES) * 3, responses):
+        assert response.status_code == 200
+        assert response.json()['by_prefecture'] == {pref: sorted(PREFECTURE_CITIES[pref])}
+    # 同時に来たリクエストでインデックスを作り直すのは1回だけ
+    assert city_index.rebuilds == rebuilds + 1
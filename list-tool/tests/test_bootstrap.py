@@ -0,0 +1,30 @@
+"""bootstrap.create_cli_app（バッチスクリプト用のアプリ）
+
+brand_key 列が追加される前のDB（Webアプリで一度も起動していないもの）でも、
+テーブル作成なしで Store を読めることを確かめる。
+"""
+import sqlite3
+
+import bootstrap
+from extensions import db
+from models import Store
+
+
+def test_create_cli_app_adds_brand_key_column(tmp_path, monkeypatch):
+    path = tmp_path / 'old_schema.db'
+    with sqlite3.connect(path) as conn:
+        columns = [column.name for column in Store.__table__.columns if column.name != 'brand_key']
+        conn.execute(f"CREATE TABLE stores ({', '.join(columns)})")
+        conn.execute("INSERT INTO stores (store_id, name) VALUES ('old-001', '既存の店舗')")
+
+    monkeypatch.setattr(bootstrap.get_config('local'), 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{path}")
+    monkeypatch.setattr(bootstrap, '_apps', {})
+    app = bootstrap.create_cli_app('local')
+    with app.app_context():
+        try:
+            store = db.session.query(Store).one()
+        finally:
+            db.session.remove()
+            db.engine.dispose()
+    assert store.name == '既存の店舗'
+    assert store.brand_key is None
@@ -0,0 +1,112 @@
+"""bulk_loader.load_stores の不正な行の切り出し
+
+DBで失敗する行（トリガーで拒否する店舗名）を1行だけ混ぜ、残りの行はすべてロードされ、
+リジェクトがちょうど1件書き出されることを確かめる。
+"""
+import json
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+import bulk_loader
+from models import DataVersion, DeliveryService, Store
+
+ROWS = 50
+BAD_NAME = '拒否される店舗'
+
+_REJECT_TRIGGERS = {
+    'sqlite': [
+        f"CREATE TRIGGER reject_bad_store BEFORE INSERT ON stores WHEN NEW.name = '{BAD_NAME}' "
+        f"BEGIN SELECT RAISE(ABORT, 'bad store'); END",
+    ],
+    'postgresql': [
+        f"CREATE OR REPLACE FUNCTION reject_bad_store() RETURNS trigger AS $$ BEGIN "
+        f"IF NEW.name = '{BAD_NAME}' THEN RAISE EXCEPTION 'bad store'; END IF; RETURN NEW; END $$ LANGUAGE plpgsql",
+        "CREATE TRIGGER reject_bad_store BEFORE INSERT ON stores FOR EACH ROW EXECUTE FUNCTION reject_bad_store()",
+    ],
+}
+
+
+def _records():
+    records = [
+        {'store_id': f"test-{i:03d}", 'name': f"テスト店舗{i}", 'address': '東京都千代田区1-1',
+         'delivery_services': ['ubereats']}
+        for i in range(ROWS)
+    ]
+    records[ROWS // 2]['name'] = BAD_NAME
+    return records
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def engine(request, tmp_path):
+    if request.param == 'sqlite':
+        url = f"sqlite:///{tmp_path / 'bulk_loader.db'}"
+    else:
+        url = request.config.getoption('test_postgres_url')
+        if not url:
+            pytest.skip('--test-postgres-url（TEST_POSTGRES_URL）が指定されていません')
+    engine = create_engine(url)
+    tables = [Store.__table__, DeliveryService.__table__, DataVersion.__table__]
+    Store.metadata.drop_all(engine, tables=tables)
+    Store.metadata.create_all(engine, tables=tables)
+    with engine.begin() as conn:
+        for sql in _REJECT_TRIGGERS[engine.dialect.name]:
+            conn.exec_driver_sql(sql)
+    yield engine
+    Store.metadata.drop_all(engine, tables=tables)
+    engine.dispose()
+
+
+def _count(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model.__table__)).scalar()
+
+
+def _assert_isolated(engine, result, reject_path):
+    assert result.loaded == ROWS - 1
+    assert result.rejected == 1
+    assert _count(engine, Store) == ROWS - 1
+    assert _count(engine, DeliveryService) == ROWS - 1
+
+    with open(reject_path, encoding='utf-8') as f:
+        rejects = [json.loads(line) for line in f]
+    assert len(rejects) == 1
+    assert rejects[0]['store_id'] == f"test-{ROWS // 2:03d}"
+    assert rejects[0]['reason'].startswith('DBエラー')
+
+
+def test_load_stores_isolates_bad_row(engine, tmp_path):
+    reject_path = tmp_path / 'rejects.jsonl'
+    result = bulk_loader.load_stores(engine, _records(), batch_size=16, reject_path=str(reject_path),
+                                     progress=False)
+    _assert_isolated(engine, result, reject_path)
+
+
+def _driver_cursor_write(conn, chunk):
+    """PostgreSQLの書き込みと同じく、ドライバーのカーソルで直接書き込む（例外はドライバーのもの）"""
+    columns = ', '.join(bulk_loader.STORE_COLUMNS)
+    placeholders = ', '.join('?' for _ in bulk_loader.STORE_COLUMNS)
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        cursor.executemany(
+            f"INSERT INTO stores ({columns}) VALUES ({placeholders})",
+            [tuple(v.isoformat(' ') if hasattr(v, 'isoformat') else v for v in row) for row, _, _ in chunk],
+        )
+    finally:
+        cursor.close()
+    return 0
+
+
+def test_load_stores_isolates_driver_error(engine, tmp_path, monkeypatch):
+    """SQLAlchemyを通さないドライバーの例外でも、二分割して不正な行だけを切り出す"""
+    if engine.dialect.name != 'sqlite':
+        pytest.skip('PostgreSQLは test_load_stores_isolates_bad_row がドライバーのカーソルで書き込む')
+    monkeypatch.setitem(bulk_loader._WRITERS, 'sqlite', (None, _driver_cursor_write))
+    reject_path = tmp_path / 'rejects.jsonl'
+    result = bulk_loader.load_stores(engine, _records(), batch_size=16, reject_path=str(reject_path),
+                                     progress=False)
+    assert result.loaded == ROWS - 1
+    assert result.rejected == 1
+    assert _count(engine, Store) == ROWS - 1
+    with open(reject_path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 1
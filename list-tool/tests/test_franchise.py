@@ -0,0 +1,46 @@
+"""franchise.FranchiseMatcher の店名の判定
+
+短いブランド名（ガスト・松屋・一蘭・笑笑など）が別の語の一部として現れる店名を
+チェーン店と判定しないことを確かめる。
+"""
+import pytest
+
+from franchise import detect_franchise_by_name, get_matcher
+
+
+@pytest.mark.parametrize('name, brand', [
+    ('ガスト', 'ガスト'),
+    ('ガスト 渋谷店', 'ガスト'),
+    ('ガスト渋谷駅前店', 'ガスト'),
+    ('松屋 羽生店', '松屋'),
+    ('松屋羽生店', '松屋'),
+    ('一蘭 新宿中央東口店', '一蘭'),
+    ('【笑笑】池袋東口駅前店', '笑笑'),
+    ('ステーキガスト 川越店', 'ステーキガスト'),
+    ('マクドナルド新宿南口', 'マクドナルド'),
+])
+def test_known_brand(name, brand):
+    assert get_matcher().match(name) == (True, brand)
+
+
+@pytest.mark.parametrize('name', [
+    'ガストロノミー銀座',
+    '松屋銀座 レストラン街 寿司',
+    'ビストロ一蘭亭',
+    '笑笑亭 ダイニング',
+    'トラットリア ガストーネ',
+])
+def test_brand_inside_another_word(name):
+    assert detect_franchise_by_name(name) is False
+    assert get_matcher().brand_of(name) is None
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('元祖ラーメン 本店', False),
+    ('ガスト 本店', False),
+    ('焼肉ひろし 2号店', True),
+    ('ラーメン太郎 羽生店', True),
+    ('ラーメン太郎', False),
+])
+def test_keywords_and_branch_suffix(name, expected):
+    assert detect_franchise_by_name(name) is expected
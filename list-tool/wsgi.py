@@ -0,0 +1,18 @@
+"""WSGIエントリポイント
+
+本番環境では gunicorn から読み込む:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+from app import create_app
+
+# ローカル環境ではSQLite3を使用
+config_name = os.getenv('FLASK_ENV', 'local')
+
+# ローカル設定を登録
+if config_name == 'local':
+    import config_local
+    import config
+    config.config['local'] = config_local.LocalConfig
+
+app = create_app(config_name)